@@ -23,13 +23,13 @@ from nova import baserpc
 from nova import exception
 
 
+from nova.openstack.common import excutils
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova.openstack.common import importutils
 from nova.openstack.common.rpc import common as rpc_common
 from nova.openstack.common import uuidutils
 
-from nova import utils
 from nova.android import rb_status
 from nova.android import task_status 
 
@@ -41,7 +41,8 @@ android_opts = [
                default='nova.android.manager.AndroidManager',
                help='full class name for the Manager for nova android project'),
     cfg.IntOpt('workers',
-               help='Number of workers for OpenStack Conductor service'),
+               help='Number of worker processes for the android agent. '
+                    'Each android is always handled by the same worker'),
 ]
 android_group = cfg.OptGroup(name='android',
                                title='android Options')
@@ -49,6 +50,7 @@ CONF = cfg.CONF
 CONF.register_group(android_group)
 CONF.register_opts(android_opts, android_group)
 
+from nova.android.agent import loader
 from nova.android.agent import manager
 from nova.android.agent import rpcapi
 from nova import conductor
@@ -57,11 +59,18 @@ LOG = logging.getLogger(__name__)
 
 
 def check_instance_state(android_state=None, task_state=(None,),
-                         must_have_launched=False):
+                         must_have_launched=False, new_task_state=None):
     """Decorator to check VM and/or task state before entry to API functions.
 
     If the instance is in the wrong state, or has not been successfully
     started at least once the wrapper will raise an exception.
+
+    With new_task_state, the instance is moved to it by a compare-and-swap
+    in the database once the instance passed the check, so that of two
+    concurrent requests only one gets to start its transition.  The swap
+    also requires that no other transition is under way, even with
+    task_state None.  If the wrapped function then fails, the task_state
+    is swapped back.
     """
 
     if android_state is not None and not isinstance(android_state, set):
@@ -71,19 +80,10 @@ def check_instance_state(android_state=None, task_state=(None,),
     def outer(f):
         @functools.wraps(f)
         def inner(self, context, instance, *args, **kw):
-            if android_state is not None and instance['android_state'] not in android_state:
-                raise exception.InstanceInvalidState(
-                    attr='android_state',
-                    instance_uuid=instance['uuid'],
-                    state=instance['android_state'],
-                    method=f.__name__)
-            if (task_state is not None and
-                    instance['task_state'] not in task_state):
-                raise exception.InstanceInvalidState(
-                    attr='task_state',
-                    instance_uuid=instance['uuid'],
-                    state=instance['task_state'],
-                    method=f.__name__)
+            _check_state(instance, android_state, task_state, f.__name__)
+            if new_task_state is not None:
+                self._transition(context, instance, android_state,
+                                 task_state, new_task_state, f.__name__)
 #            if must_have_launched and not instance['launched_at']:
 #                raise exception.InstanceInvalidState(
 #                    attr='Launched_at',
@@ -92,10 +92,65 @@ def check_instance_state(android_state=None, task_state=(None,),
 #                    state=instance['launched_at'],
 #                    method=f.__name__)
 
-            return f(self, context, instance, *args, **kw)
+            if new_task_state is None:
+                return f(self, context, instance, *args, **kw)
+            try:
+                return f(self, context, instance, *args, **kw)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._transition_back(context, instance, new_task_state)
+        # NOTE: expose the allowed states so batch callers can apply the
+        # same rules without going through the per-instance wrapper.
+        inner.android_state = android_state
+        inner.task_state = task_state
+        inner.new_task_state = new_task_state
         return inner
     return outer
 
+
+def _check_state(instance, android_state, task_state, method):
+    if (android_state is not None and
+            instance['android_state'] not in android_state):
+        raise exception.InstanceInvalidState(
+            attr='android_state',
+            instance_uuid=instance['uuid'],
+            state=instance['android_state'],
+            method=method)
+    if (task_state is not None and
+            instance['task_state'] not in task_state):
+        raise exception.InstanceInvalidState(
+            attr='task_state',
+            instance_uuid=instance['uuid'],
+            state=instance['task_state'],
+            method=method)
+
+def _expected_states(android_state, task_state):
+    """Return the states a transition swaps from, as lists for RPC.
+
+    A transition never starts while another one is under way, even when
+    the task_state is not checked otherwise.
+    """
+    if android_state is not None:
+        android_state = list(android_state)
+    if task_state is not None:
+        task_state = list(task_state)
+    else:
+        task_state = [None]
+    return android_state, task_state
+
+
+def _transition_lost(instance_uuid, android_state, task_state, method):
+    # NOTE: another request changed the state since the instance was read.
+    # Any state read now could be stale (slave, result cache), so report
+    # the states that were expected.
+    return exception.InstanceInvalidState(
+        attr='android_state/task_state',
+        instance_uuid=instance_uuid,
+        state=_('outside %(android_state)s/%(task_state)s') %
+              {'android_state': android_state, 'task_state': task_state},
+        method=method)
+
+
 class API(object):
     """A local version of the conductor API that does database updates
     locally instead of via RPC.
@@ -104,21 +159,119 @@ class API(object):
     def __init__(self, plugin_class_name = None):
         self._rpcapi = rpcapi.AndroidAPI()
         self.conductor = conductor.API()
+        self.loader = loader.get_loader()
+
+    def get(self, context, instance_id, req=None):
+        """Get a single instance with the given instance_id.
 
-    def get(self, context, instance_id):
-        """Get a single instance with the given instance_id."""
+        Lookups go through the shared AndroidLoader, which batches them
+        with those of concurrent requests and caches the result in req.
+        """
         # NOTE(ameade): we still need to support integer ids for ec2
+        if uuidutils.is_uuid_like(instance_id):
+            return self.loader.load(context, instance_id, req=req)
+        ## TODO: not support search by id
+        raise exception.AndroidNotFound(uuid=instance_id)
+
+    def get_many(self, context, uuids, req=None):
+        """Get all androids with the given uuids in one conductor call."""
+        return self.loader.load_many(context, uuids, req=req)
+
+    def _transition(self, context, instance, android_state, task_state,
+                    new_task_state, method):
+        """Move instance to new_task_state if it still is in the states
+        android_state and task_state allow, or raise InstanceInvalidState.
+        """
+        android_state, task_state = _expected_states(android_state,
+                                                     task_state)
+        # NOTE: instance was read under context, which allowed the caller
+        # to see it; writes take an admin context.
+        count = self.conductor.android_transition(
+                context.elevated(), instance['uuid'], android_state,
+                task_state, {'task_state': new_task_state})
+        if not count:
+            raise _transition_lost(instance['uuid'], android_state,
+                                   task_state, method)
+        instance['task_state'] = new_task_state
+
+    def _transition_back(self, context, instance, new_task_state):
+        """Undo _transition() for a request that failed to go through."""
         try:
-            if uuidutils.is_uuid_like(instance_id):
-                instance = self.conductor.android_get_by_uid(context, instance_id)
-            elif utils.is_int_like(instance_id):
-                ## TODO: not support search by id
-                raise exception.AndroidNotFound(uuid=instance_id) 
+            self.conductor.android_transition(
+                    context.elevated(), instance['uuid'], None,
+                    [new_task_state], {'task_state': None})
+            instance['task_state'] = None
+        except Exception:
+            LOG.exception(_('Failed to reset task_state %(task_state)s of '
+                            'android %(uuid)s'),
+                          {'task_state': new_task_state,
+                           'uuid': instance['uuid']})
+
+    def _transition_many(self, context, checked, instances, cast):
+        """Batch variant of a method decorated with new_task_state.
+
+        The instances checked allows are moved to its new_task_state with
+        one android_transition_many, and only those that moved are cast;
+        the others, with the ones in the wrong state, are rejected.
+        """
+        accepted, rejected = self._filter_state(checked, instances)
+        if not accepted:
+            return accepted, rejected
+        android_state, task_state = _expected_states(checked.android_state,
+                                                     checked.task_state)
+        new_task_state = checked.new_task_state
+        moved = set(self.conductor.android_transition_many(
+                context.elevated(),
+                [instance['uuid'] for instance in accepted],
+                android_state, task_state, {'task_state': new_task_state}))
+        started = []
+        for instance in accepted:
+            if instance['uuid'] in moved:
+                instance['task_state'] = new_task_state
+                started.append(instance)
+            else:
+                e = _transition_lost(instance['uuid'], android_state,
+                                     task_state, checked.__name__)
+                rejected.append({'uuid': instance['uuid'],
+                                 'reason': e.format_message()})
+        if not started:
+            return started, rejected
+        try:
+            cast(context, started)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._transition_back_many(context, started, new_task_state)
+        return started, rejected
+
+    def _transition_back_many(self, context, instances, new_task_state):
+        """Undo _transition_many() for a batch that failed to go through."""
+        try:
+            self.conductor.android_transition_many(
+                    context.elevated(),
+                    [instance['uuid'] for instance in instances], None,
+                    [new_task_state], {'task_state': None})
+            for instance in instances:
+                instance['task_state'] = None
+        except Exception:
+            LOG.exception(_('Failed to reset task_state %(task_state)s of '
+                            '%(count)d androids'),
+                          {'task_state': new_task_state,
+                           'count': len(instances)})
+
+    def _filter_state(self, checked, instances):
+        """Split instances into the ones checked allows and the rest."""
+        accepted = []
+        rejected = []
+        for instance in instances:
+            try:
+                _check_state(instance, checked.android_state,
+                             checked.task_state, checked.__name__)
+            except exception.InstanceInvalidState as e:
+                rejected.append({'uuid': instance['uuid'],
+                                 'reason': e.format_message()})
             else:
-                raise exception.AndroidNotFound(uuid=instance_id)
-        except exception.AndroidNotFound:
-            raise exception.AndroidNotFound(uuid=instance_id)
-        return instance
+                accepted.append(instance)
+        return accepted, rejected
 
     def create(self, context, name, verdor = ''):
         instances = {}
@@ -127,23 +280,35 @@ class API(object):
         instances['android_state'] = rb_status.READY # init variable
         return self._rpcapi.create_android(context,instances)
 
+    def create_many(self, context, androids):
+        instances = []
+        for android in androids:
+            instances.append({'name': android['name'],
+                              'verdor': android.get('verdor', ''),
+                              'android_state': rb_status.READY})
+        return self._rpcapi.create_androids(context, instances)
+
     @check_instance_state(android_state=[rb_status.READY],
-                          task_state=None)
+                          task_state=None,
+                          new_task_state=task_status.ACTIVING)
     def active(self, context, instance):
         self._rpcapi.active_android(context, instance)
 
     @check_instance_state(android_state=[rb_status.ACTIVE,rb_status.WORKING],
-                          task_state=None)
+                          task_state=None,
+                          new_task_state=task_status.DEACTIVING)
     def deactive(self, context, instance):
         self._rpcapi.deactive_android(context, instance)
 
     @check_instance_state(android_state=[rb_status.ACTIVE],
-                          task_state=None)
+                          task_state=None,
+                          new_task_state=task_status.STARTING)
     def start(self, context, instance):
         self._rpcapi.start_android(context, instance)
 
     @check_instance_state(android_state=[rb_status.WORKING],
-                          task_state=None)
+                          task_state=None,
+                          new_task_state=task_status.STOPING)
     def stop(self, context, instance):
         self._rpcapi.stop_android(context, instance)
 
@@ -151,4 +316,20 @@ class API(object):
                           task_state=[None,task_status.DEACTIVING,task_status.STARTING,
                                       task_status.STOPING])
     def destroy(self, context, instance):
-        self._rpcapi.destroy_android(context, instance)
\ No newline at end of file
+        self._rpcapi.destroy_android(context, instance)
+
+    def active_many(self, context, instances):
+        return self._transition_many(context, self.active, instances,
+                                     self._rpcapi.active_androids)
+
+    def deactive_many(self, context, instances):
+        return self._transition_many(context, self.deactive, instances,
+                                     self._rpcapi.deactive_androids)
+
+    def start_many(self, context, instances):
+        return self._transition_many(context, self.start, instances,
+                                     self._rpcapi.start_androids)
+
+    def stop_many(self, context, instances):
+        return self._transition_many(context, self.stop, instances,
+                                     self._rpcapi.stop_androids)
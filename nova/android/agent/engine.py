@@ -0,0 +1,143 @@
+#    Copyright 2013 IBM Corp.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Non-blocking lifecycle engine for the android agent.
+
+Every android transition (READY -- ACTIVING -->> ACTIVE and friends, see
+nova.android.rb_status) is a timed step followed by a completion callback.
+Instead of parking an RPC worker greenthread in greenthread.sleep() for the
+whole step, the manager registers the step here and returns immediately.
+A single scheduler greenthread keeps all in-flight steps on a timer heap and
+hands each due completion to a bounded GreenPool.
+"""
+
+import heapq
+import itertools
+import time
+
+from eventlet import greenpool
+from eventlet import greenthread
+from eventlet import queue
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Transition(object):
+    """One in-flight timed step, ordered on the heap by due time."""
+
+    def __init__(self, key, deadline, callback, args, kwargs):
+        self.key = key
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TransitionEngine(object):
+    """Drive many timed transitions from one scheduler greenthread.
+
+    :param pool_size: number of greenthreads running completion callbacks
+                      concurrently. Completions usually do a conductor RPC
+                      call, so this bounds the load put on the conductor,
+                      not the number of in-flight transitions.
+    """
+
+    def __init__(self, pool_size=64):
+        self._heap = []
+        self._inflight = {}
+        self._counter = itertools.count()
+        self._wakeup = queue.LightQueue()
+        self._pool = greenpool.GreenPool(pool_size)
+        self._thread = None
+        self._running = False
+
+    def __len__(self):
+        return len(self._inflight)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = greenthread.spawn(self._run)
+
+    def stop(self, graceful=False):
+        self._running = False
+        self._wakeup.put(None)
+        if self._thread is not None:
+            self._thread.wait()
+            self._thread = None
+        if graceful:
+            self._pool.waitall()
+
+    def schedule(self, key, delay, callback, *args, **kwargs):
+        """Run callback(*args, **kwargs) once delay seconds have passed.
+
+        key identifies the object in transition (an android uuid). A new
+        step for a key that already has one in flight replaces it, so an
+        android never completes two transitions out of order.
+        """
+        previous = self._inflight.get(key)
+        if previous is not None:
+            LOG.debug(_('Replacing in-flight transition for %s'), key)
+            previous.cancel()
+
+        step = Transition(key, time.time() + delay, callback, args, kwargs)
+        self._inflight[key] = step
+        entry = (step.deadline, next(self._counter), step)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            # NOTE: The new step is due before everything else, wake the
+            # scheduler so it does not oversleep.
+            self._wakeup.put(None)
+        self.start()
+        return step
+
+    def cancel(self, key):
+        step = self._inflight.pop(key, None)
+        if step is not None:
+            step.cancel()
+
+    def _next_timeout(self):
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.time(), 0)
+
+    def _run(self):
+        while self._running:
+            try:
+                self._wakeup.get(timeout=self._next_timeout())
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                step = heapq.heappop(self._heap)[2]
+                if step.cancelled:
+                    continue
+                if self._inflight.get(step.key) is step:
+                    del self._inflight[step.key]
+                self._pool.spawn_n(self._complete, step)
+
+    def _complete(self, step):
+        try:
+            step.callback(*step.args, **step.kwargs)
+        except Exception:
+            LOG.exception(_('Transition callback for %s failed'), step.key)
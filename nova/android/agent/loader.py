@@ -0,0 +1,139 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Request-scoped batching of android lookups by uuid.
+
+The API looks androids up one uuid at a time (every action first does a
+get()).  AndroidLoader sends a lookup right away when no other one of the
+same scope is on its way to the conductor; while one is, it collects the
+uuids asked for by all greenthreads of a WSGI worker during loader_window
+seconds into one android_get_many_by_uuid conductor call.  What it found
+is kept in the wsgi.Request cache so later lookups in the same request
+are free.
+"""
+
+import sys
+
+from eventlet import event
+from eventlet import greenthread
+from oslo.config import cfg
+
+from nova import conductor
+from nova import exception
+
+loader_opts = [
+    cfg.FloatOpt('loader_window',
+                 default=0.002,
+                 help='Seconds the API waits to batch android lookups of '
+                      'concurrent requests into one conductor call, while '
+                      'another lookup is in flight. 0 sends every lookup '
+                      'on its own'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(loader_opts, 'android')
+
+
+class _Batch(object):
+    def __init__(self, context):
+        self.context = context
+        self.uuids = set()
+        self.done = event.Event()
+
+
+class AndroidLoader(object):
+    """Coalesce android lookups into android_get_many_by_uuid calls."""
+
+    def __init__(self, conductor_api, window=None):
+        self.conductor = conductor_api
+        if window is None:
+            window = CONF.android.loader_window
+        self.window = window
+        self._batches = {}
+        self._in_flight = {}
+
+    def load(self, context, uuid, req=None):
+        """Return the android with the given uuid or raise AndroidNotFound."""
+        androids = self.load_many(context, [uuid], req=req)
+        if not androids:
+            raise exception.AndroidNotFound(uuid=uuid)
+        return androids[0]
+
+    def load_many(self, context, uuids, req=None):
+        """Return the androids with the given uuids, skipping missing ones.
+
+        req is the wsgi.Request the lookup is made for, if any. Androids
+        already in its cache are not fetched again.
+        """
+        found = {}
+        missing = []
+        for uuid in uuids:
+            android = req.get_db_android(uuid) if req is not None else None
+            if android is not None:
+                found[uuid] = android
+            elif uuid not in found:
+                missing.append(uuid)
+
+        if missing:
+            fetched = self._fetch(context, missing)
+            if req is not None:
+                req.cache_db_androids(fetched.values())
+            found.update(fetched)
+        return [found[uuid] for uuid in uuids if uuid in found]
+
+    def _fetch(self, context, uuids):
+        if not self.window:
+            androids = self.conductor.android_get_many_by_uuid(context, uuids)
+            return dict((android['uuid'], android) for android in androids)
+
+        # NOTE: only requests that would see the same rows share a batch.
+        scope = (context.project_id, context.is_admin, context.read_deleted)
+        batch = self._batches.get(scope)
+        if batch is None:
+            batch = _Batch(context)
+            self._batches[scope] = batch
+            # NOTE: with nothing in flight there is nothing to wait for;
+            # lookups made before the next switch still join the batch.
+            delay = self.window if self._in_flight.get(scope) else 0
+            greenthread.spawn_after(delay, self._run, scope, batch)
+        batch.uuids.update(uuids)
+        androids = batch.done.wait()
+        return dict((uuid, androids[uuid]) for uuid in uuids
+                    if uuid in androids)
+
+    def _run(self, scope, batch):
+        if self._batches.get(scope) is batch:
+            del self._batches[scope]
+        self._in_flight[scope] = self._in_flight.get(scope, 0) + 1
+        try:
+            androids = self.conductor.android_get_many_by_uuid(
+                    batch.context, list(batch.uuids))
+        except Exception:
+            batch.done.send_exception(*sys.exc_info())
+        else:
+            batch.done.send(dict((android['uuid'], android)
+                                 for android in androids))
+        finally:
+            self._in_flight[scope] -= 1
+            if not self._in_flight[scope]:
+                del self._in_flight[scope]
+
+
+_loader = None
+
+
+def get_loader():
+    """Return the loader shared by every API object of this process."""
+    global _loader
+    if _loader is None:
+        _loader = AndroidLoader(conductor.API())
+    return _loader
@@ -14,8 +14,7 @@
 
 """Handles database requests from other nova services."""
 
-from eventlet import greenthread
-
+import collections
 
 from oslo.config import cfg
 
@@ -29,10 +28,39 @@ from nova.openstack.common.rpc import common as rpc_common
 from nova.openstack.common import periodic_task
 from nova.openstack.common import importutils
 from nova import conductor
+from nova import context as nova_context
+from nova.android.agent import engine
+from nova.android.agent import statebuffer
 from nova.android import rb_status
 from nova.android import task_status
 
+android_manager_opts = [
+    cfg.IntOpt('active_duration',
+               default=10,
+               help='Seconds an android spends in the activing state'),
+    cfg.IntOpt('deactive_duration',
+               default=20,
+               help='Seconds an android spends in the deactiving state'),
+    cfg.IntOpt('start_duration',
+               default=20,
+               help='Seconds an android spends in the starting state'),
+    cfg.IntOpt('stop_duration',
+               default=20,
+               help='Seconds an android spends in the stopping state'),
+    cfg.IntOpt('transition_pool_size',
+               default=64,
+               help='Number of greenthreads that complete android '
+                    'transitions concurrently'),
+    cfg.IntOpt('state_flush_interval',
+               default=100,
+               help='Milliseconds the state updates of androids are '
+                    'buffered, to be sent together with one conductor '
+                    'cast. 0 sends each update with its own conductor '
+                    'call'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(android_manager_opts, 'android')
 
 LOG = logging.getLogger(__name__)
 
@@ -56,6 +84,39 @@ class AndroidManager(manager.Manager):
         super(AndroidManager, self).__init__(service_name='android',
                                                *args, **kwargs)
         self.conductor = conductor.API()
+        self.engine = engine.TransitionEngine(
+                pool_size=CONF.android.transition_pool_size)
+        self.states = None
+        if CONF.android.state_flush_interval > 0:
+            self.states = statebuffer.StateBuffer(
+                    self._flush_states,
+                    CONF.android.state_flush_interval / 1000.0)
+
+    def init_host(self):
+        self.engine.start()
+
+    def cleanup_host(self):
+        # NOTE: completions already running write their state into the
+        # buffer, which is then sent before the process goes away.
+        self.engine.stop(graceful=True)
+        if self.states is not None:
+            self.states.flush()
+
+    def route_message(self, method, kwargs, pick_worker):
+        """Split a message to this host by the worker of each android.
+
+        The transitions of an android live in the engine of one worker
+        process, so every message about it has to go to that worker.
+        """
+        if 'instance' in kwargs:
+            return {pick_worker(kwargs['instance']['uuid']): kwargs}
+        if 'instances' in kwargs:
+            by_worker = collections.defaultdict(list)
+            for instance in kwargs['instances']:
+                by_worker[pick_worker(instance['uuid'])].append(instance)
+            return dict((index, dict(kwargs, instances=instances))
+                        for index, instances in by_worker.iteritems())
+        return None
 
     def create_android(self, context, instance):
         instance['host'] = self.host
@@ -64,51 +125,127 @@ class AndroidManager(manager.Manager):
                          {'instance': instance})
         return android
 
+    def create_androids(self, context, instances):
+        for instance in instances:
+            instance['host'] = self.host
+        androids = self.conductor.android_create_many(context, instances)
+        LOG.debug(_('%(count)d androids have been created'),
+                  {'count': len(androids)})
+        return androids
+
     def destroy_android(self, context, instance):
+        self.engine.cancel(instance['uuid'])
+        if self.states is not None:
+            self.states.discard(instance['uuid'])
         self.conductor.android_destroy(context, instance['uuid'])
         LOG.debug(_('android have been destory %(instance)s'),
                          {'instance': instance})
 
+    def _flush_states(self, updates, seq):
+        # NOTE: android_update_many needs an admin context
+        self.conductor.android_update_many_async(
+                nova_context.get_admin_context(), updates, seq)
+
     def _android_status_update(self, context, instance,
-                               android_status = None, _task_status = None):
+                               android_status = None, _task_status = None,
+                               **values):
+        values['task_state'] = _task_status
         if android_status != None:
-            instance['android_state'] = android_status
-        instance['task_status'] = _task_status
-        self.conductor.android_update(context, instance['uuid'], instance)
+            values['android_state'] = android_status
+        instance.update(values)
+        if self.states is not None:
+            self.states.update(instance['uuid'], values)
+        else:
+            self.conductor.android_update(context, instance['uuid'], instance)
+
+    def _begin_transition(self, context, instance, _task_status, delay,
+                          android_status):
+        """Mark instance as in transition and schedule its completion.
+
+        The RPC worker only pays for the first status update; the step
+        itself lives on the engine's timer heap until it is due.  The API
+        usually set _task_status already, with android_transition.
+        """
+        if instance.get('task_state') != _task_status:
+            self._android_status_update(context, instance, None,
+                                        _task_status)
+        LOG.debug(_('android is %(task)s %(instance)s'),
+                  {'task': _task_status, 'instance': instance})
+        self.engine.schedule(instance['uuid'], delay,
+                             self._finish_transition, context, instance,
+                             android_status)
+
+    def _finish_transition(self, context, instance, android_status):
+        values = {}
+        if android_status == rb_status.WORKING:
+            values['launched_at'] = timeutils.utcnow()
+        self._android_status_update(context, instance, android_status, None,
+                                    **values)
+        LOG.debug(_('android already %(state)s %(instance)s'),
+                  {'state': android_status, 'instance': instance})
+
+    def _begin_transitions(self, context, instances, _task_status, delay,
+                           android_status):
+        """Batch variant of _begin_transition.
+
+        All androids enter _task_status with one conductor call; their
+        completions are then scheduled individually.  The API usually set
+        _task_status already, with android_transition_many.
+        """
+        entering = [instance for instance in instances
+                    if instance.get('task_state') != _task_status]
+        if self.states is not None:
+            for instance in entering:
+                self.states.update(instance['uuid'],
+                                   {'task_state': _task_status})
+        elif entering:
+            updates = dict((instance['uuid'], {'task_state': _task_status})
+                           for instance in entering)
+            self.conductor.android_update_many(context, updates)
+        for instance in instances:
+            instance['task_state'] = _task_status
+            self.engine.schedule(instance['uuid'], delay,
+                                 self._finish_transition, context, instance,
+                                 android_status)
+        LOG.debug(_('%(count)d androids are %(task)s'),
+                  {'count': len(instances), 'task': _task_status})
 
     def active_android(self, context, instance):
-        self._android_status_update(context, instance, None, task_status.ACTIVING)
-        LOG.debug(_('android is activing %(instance)s'),
-                         {'instance': instance})
-        greenthread.sleep(10)
-        self._android_status_update(context, instance, rb_status.ACTIVE, None)
-        LOG.debug(_('android already actived %(instance)s'),
-                         {'instance': instance})
+        self._begin_transition(context, instance, task_status.ACTIVING,
+                               CONF.android.active_duration,
+                               rb_status.ACTIVE)
 
     def deactive_android(self, context, instance):
-        self._android_status_update(context, instance, None, task_status.DEACTIVING)
-        LOG.debug(_('android is DEACTIVING %(instance)s'),
-                         {'instance': instance})
-        greenthread.sleep(20)
-        self._android_status_update(context, instance, rb_status.READY, None)
-        LOG.debug(_('android already deactived %(instance)s'),
-                         {'instance': instance})
+        self._begin_transition(context, instance, task_status.DEACTIVING,
+                               CONF.android.deactive_duration,
+                               rb_status.READY)
 
     def start_android(self, context, instance):
-        self._android_status_update(context, instance, None, task_status.STARTING)
-        LOG.debug(_('android is worked %(instance)s'),
-                         {'instance': instance})
-        greenthread.sleep(20)
-        instance['launched_at'] = timeutils.utcnow
-        self._android_status_update(context, instance, rb_status.WORKING, None)
-        LOG.debug(_('android already working %(instance)s'),
-                         {'instance': instance})
+        self._begin_transition(context, instance, task_status.STARTING,
+                               CONF.android.start_duration,
+                               rb_status.WORKING)
 
     def stop_android(self, context, instance):
-        self._android_status_update(context, instance, None, task_status.STOPING)
-        LOG.debug(_('android is worked %(instance)s'),
-                         {'instance': instance})
-        greenthread.sleep(20)
-        self._android_status_update(context, instance, rb_status.ACTIVE, None)
-        LOG.debug(_('android already working %(instance)s'),
-                         {'instance': instance})
\ No newline at end of file
+        self._begin_transition(context, instance, task_status.STOPING,
+                               CONF.android.stop_duration,
+                               rb_status.ACTIVE)
+
+    def active_androids(self, context, instances):
+        self._begin_transitions(context, instances, task_status.ACTIVING,
+                                CONF.android.active_duration,
+                                rb_status.ACTIVE)
+
+    def deactive_androids(self, context, instances):
+        self._begin_transitions(context, instances, task_status.DEACTIVING,
+                                CONF.android.deactive_duration,
+                                rb_status.READY)
+
+    def start_androids(self, context, instances):
+        self._begin_transitions(context, instances, task_status.STARTING,
+                                CONF.android.start_duration,
+                                rb_status.WORKING)
+
+    def stop_androids(self, context, instances):
+        self._begin_transitions(context, instances, task_status.STOPING,
+                                CONF.android.stop_duration,
+                                rb_status.ACTIVE)
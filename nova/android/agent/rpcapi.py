@@ -14,6 +14,8 @@
 
 """Client side of the conductor RPC API."""
 
+import collections
+
 from oslo.config import cfg
 
 from nova import exception
@@ -79,4 +81,29 @@ class AndroidAPI(rpcclient.RpcProxy):
 
     def stop_android(self, context, instance):
         cctxt = self.client.prepare(server=_instance_host(None, instance))
-        cctxt.cast(context, 'stop_android', instance=instance)
\ No newline at end of file
+        cctxt.cast(context, 'stop_android', instance=instance)
+
+    def create_androids(self, context, instances):
+        cctxt = self.client.prepare(version='1.0')
+        return cctxt.call(context, 'create_androids', instances=instances)
+
+    def _cast_by_host(self, context, method, instances):
+        """Send one message per agent host carrying all of its androids."""
+        by_host = collections.defaultdict(list)
+        for instance in instances:
+            by_host[_instance_host(None, instance)].append(instance)
+        for host, host_instances in by_host.iteritems():
+            cctxt = self.client.prepare(server=host)
+            cctxt.cast(context, method, instances=host_instances)
+
+    def active_androids(self, context, instances):
+        self._cast_by_host(context, 'active_androids', instances)
+
+    def deactive_androids(self, context, instances):
+        self._cast_by_host(context, 'deactive_androids', instances)
+
+    def start_androids(self, context, instances):
+        self._cast_by_host(context, 'start_androids', instances)
+
+    def stop_androids(self, context, instances):
+        self._cast_by_host(context, 'stop_androids', instances)
\ No newline at end of file
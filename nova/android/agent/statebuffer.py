@@ -0,0 +1,89 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Write-behind buffer for the state updates of the android agent.
+
+A transition writes the state of its android twice (task_state when it
+begins, android_state when it completes), and a batch writes it for
+every android of the batch.  Instead of one conductor call per write,
+the agent records the changed fields here.  Updates of the same android
+are merged, and all the pending ones are sent as a single
+android_update_many cast once the flush interval is over.
+"""
+
+import time
+
+from eventlet import greenthread
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class StateBuffer(object):
+    """Merge android updates and flush them together.
+
+    :param flush: callable(updates, seq) sending a {uuid: values} dict.
+    :param interval: seconds an update may wait for others to join it.
+
+    Every flush carries a sequence number taken from the clock, higher
+    than any earlier one of this process.  The conductor does not apply
+    a flush to androids already written by a later one, so casts that
+    overtake each other cannot put an android back in an older state.
+    """
+
+    def __init__(self, flush, interval):
+        self._flush = flush
+        self._interval = interval
+        self._pending = {}
+        self._timer = None
+        self._last_seq = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def update(self, uuid, values):
+        """Record the fields of uuid that changed."""
+        self._pending.setdefault(uuid, {}).update(values)
+        if self._timer is None:
+            self._timer = greenthread.spawn_after(self._interval, self.flush)
+
+    def discard(self, uuid):
+        """Drop the pending updates of uuid, which is going away."""
+        self._pending.pop(uuid, None)
+
+    def _next_seq(self):
+        self._last_seq = max(self._last_seq + 1, int(time.time() * 1000000))
+        return self._last_seq
+
+    def flush(self):
+        """Send the pending updates now."""
+        if self._timer is not None:
+            if self._timer is not greenthread.getcurrent():
+                self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        updates, self._pending = self._pending, {}
+        try:
+            self._flush(updates, self._next_seq())
+        except Exception:
+            LOG.exception(_('Failed to flush the state of %d androids, '
+                            'retrying'), len(updates))
+            # NOTE: updates recorded meanwhile are newer, they win.
+            for uuid, values in updates.iteritems():
+                values.update(self._pending.get(uuid, {}))
+                self._pending[uuid] = values
+            if self._timer is None:
+                self._timer = greenthread.spawn_after(self._interval,
+                                                      self.flush)
@@ -17,6 +17,7 @@
 from oslo.config import cfg
 import webob.exc
 
+from nova.api.openstack import common
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
@@ -25,11 +26,26 @@ from nova.openstack.common.gettextutils import _
 from nova import conductor
 from nova import utils
 from nova import db as db_api
-from nova.openstack.common import jsonutils
+from nova.android import agent as android_api
 from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
 
 ALIAS = "android-metadata"
 CONF = cfg.CONF
+CONF.import_opt('osapi_stream_responses', 'nova.api.openstack.wsgi')
+CONF.import_opt('osapi_stream_batch_size', 'nova.api.openstack.wsgi')
+
+# NOTE: query parameter -> filter understood by android_get_all_by_filters
+_FILTERS = {'state': 'android_state',
+            'android_state': 'android_state',
+            'task_state': 'task_state',
+            'host': 'host',
+            'vendor': 'verdor',
+            'verdor': 'verdor'}
+
+# NOTE: what AndroidsMiniTemplate shows, plus uuid to page with.
+_INDEX_COLUMNS = ['display_name', 'android_state', 'task_state', 'verdor',
+                  'uuid']
 
 LOG = logging.getLogger(__name__)
 
@@ -80,34 +96,88 @@ class AndroidController(object):
 
     def __init__(self):
         self.conductor_api = conductor.API()
+        self._android_api = android_api.API()
 
 
-    def _get_androids(self, req):
+    def _get_androids(self, req, columns=None):
+        """Return the page of androids selected by the query parameters.
+
+        limit/marker page through the androids (newest first, marker is
+        the uuid of the last android seen), state, task_state, host,
+        vendor and changes-since filter them.  A page larger than
+        osapi_stream_batch_size is returned as a generator, so that the
+        response is streamed.
+        """
         context = req.environ['nova.context']
-        androids = self.conductor_api.android_get_all(context)
-        androids = jsonutils.to_primitive(androids)
+        limit, marker = common.get_limit_and_marker(req)
+        limit = limit or CONF.osapi_max_limit
+        filters = {}
+        for param, key in _FILTERS.iteritems():
+            values = req.GET.getall(param)
+            if values and key in filters:
+                msg = _('Only one of %s can be given') % ', '.join(
+                        sorted(p for p, k in _FILTERS.iteritems()
+                               if k == key))
+                raise webob.exc.HTTPBadRequest(explanation=msg)
+            if len(values) == 1:
+                filters[key] = values[0]
+            elif values:
+                filters[key] = values
+        if 'changes-since' in req.GET:
+            try:
+                timeutils.parse_isotime(req.GET['changes-since'])
+            except ValueError:
+                msg = _('Invalid changes-since value')
+                raise webob.exc.HTTPBadRequest(explanation=msg)
+            filters['changes-since'] = req.GET['changes-since']
+        page_size = limit
+        if CONF.osapi_stream_responses:
+            page_size = min(limit, CONF.osapi_stream_batch_size)
+        try:
+            androids = self.conductor_api.android_get_all_by_filters(
+                    context, filters, limit=page_size, marker=marker,
+                    columns=columns)
+        except exception.MarkerNotFound as e:
+            raise webob.exc.HTTPBadRequest(explanation=e.format_message())
+        if page_size < limit and len(androids) == page_size:
+            return self._iter_androids(context, filters, androids,
+                                       limit - page_size, columns)
+        if not columns:
+            req.cache_db_androids(androids)
         return androids
 
+    def _iter_androids(self, context, filters, page, limit, columns):
+        """Yield the first page, then up to limit more androids.
+
+        The rest is streamed from the conductor while the response is
+        written, so the API never holds more than one window of it.
+        """
+        for android in page:
+            yield android
+        androids = self.conductor_api.android_iter_by_filters(
+                context, filters, limit=limit, marker=page[-1]['uuid'],
+                columns=columns)
+        for android in androids:
+            yield android
+
     def _get_android_by_id(self, req, id):
         context = req.environ['nova.context']
-        android = self.conductor_api.android_get_by_uid(context, id)
-        android = jsonutils.to_primitive(android)
-        return android
+        return self._android_api.get(context, id, req=req)
 
-    @extensions.expected_errors(())
+    @extensions.expected_errors(400)
     @wsgi.serializers(xml=AndroidsMiniTemplate)
     def index(self, req):
         """
-        Return a list of all running services. Filter by host & service name.
+        Return a page of androids, only the columns the index shows.
         """
-        services = self._get_androids(req)
+        services = self._get_androids(req, columns=_INDEX_COLUMNS)
         return {'androids': services}
 
-    @extensions.expected_errors(())
+    @extensions.expected_errors(400)
     @wsgi.serializers(xml=AndroidsDetailTemplate)
     def detail(self, req):
         """
-        Return a list of all running services. Filter by host & service name.
+        Return a page of androids with all their columns.
         """
         androids = self._get_androids(req)
         return {'androids': androids}
@@ -119,7 +189,7 @@ class AndroidController(object):
         try:
             android = self._get_android_by_id(req,id)
             return {'android':android}
-        except exception.ServiceNotFound as e:
+        except exception.AndroidNotFound as e:
             raise webob.exc.HTTPNotFound(explanation=e.format_message())
 
 
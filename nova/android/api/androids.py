@@ -28,6 +28,7 @@ from nova import db as db_api
 from nova.android import agent as android_api
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import uuidutils
 from nova.api.openstack.wsgi import Controller as wsgi_controller
 ALIAS = "androids-plant"
 CONF = cfg.CONF
@@ -51,6 +52,25 @@ class AndroidShowTemplate(xmlutil.TemplateBuilder):
         root.set('host')
         return xmlutil.MasterTemplate(root, 1)
 
+class AndroidsBatchTemplate(xmlutil.TemplateBuilder):
+    def construct(self):
+        root = xmlutil.TemplateElement('batch')
+        androids = xmlutil.SubTemplateElement(root, 'androids')
+        elem = xmlutil.SubTemplateElement(androids, 'android',
+                                          selector='androids')
+        elem.set('id')
+        elem.set('android_state')
+        elem.set('task_state')
+        elem.set('display_name')
+        elem.set('uuid')
+        elem.set('verdor')
+        elem.set('host')
+        failed = xmlutil.SubTemplateElement(root, 'failed')
+        elem = xmlutil.SubTemplateElement(failed, 'android', selector='failed')
+        elem.set('uuid')
+        elem.set('reason')
+        return xmlutil.MasterTemplate(root, 1)
+
 class AndroidExtendController(wsgi.Controller):
     def __init__(self):
         self._android_api = android_api.API()
@@ -63,7 +83,7 @@ class AndroidExtendController(wsgi.Controller):
         context = req.environ['nova.context']
         try:
             instance = {}
-            instance = self._android_api.get(context,id)
+            instance = self._android_api.get(context, id, req=req)
             self._android_api.active(context, instance)
         except exception.AndroidNotFound as e:
             raise webob.exc.HTTPNotFound(explanation=e.format_message())
@@ -76,7 +96,7 @@ class AndroidExtendController(wsgi.Controller):
         context = req.environ['nova.context']
         try:
             instance = {}
-            instance = self._android_api.get(context,id)
+            instance = self._android_api.get(context, id, req=req)
             self._android_api.deactive(context, instance)
         except exception.AndroidNotFound as e:
             raise webob.exc.HTTPNotFound(explanation=e.format_message())
@@ -89,7 +109,7 @@ class AndroidExtendController(wsgi.Controller):
         context = req.environ['nova.context']
         try:
             instance = {}
-            instance = self._android_api.get(context,id)
+            instance = self._android_api.get(context, id, req=req)
             self._android_api.start(context, instance)
         except exception.AndroidNotFound as e:
             raise webob.exc.HTTPNotFound(explanation=e.format_message())
@@ -102,7 +122,7 @@ class AndroidExtendController(wsgi.Controller):
         context = req.environ['nova.context']
         try:
             instance = {}
-            instance = self._android_api.get(context,id)
+            instance = self._android_api.get(context, id, req=req)
             self._android_api.stop(context, instance)
         except exception.AndroidNotFound as e:
             raise webob.exc.HTTPNotFound(explanation=e.format_message())
@@ -133,6 +153,63 @@ class AndroidController(object):
         return {'android':service}
 
 
+    @wsgi.serializers(xml=AndroidsBatchTemplate)
+    @extensions.expected_errors(400)
+    @wsgi.response(201)
+    def batch(self, req, body):
+        """Create, active, deactive, start or stop many androids at once.
+
+        Creation is a single RPC call and a single DB transaction; the
+        other actions are one state-checked cast per agent host. Androids
+        that are missing or in the wrong state are reported in 'failed'.
+        """
+        if not wsgi_controller.is_valid_body(body, 'batch'):
+            raise webob.exc.HTTPBadRequest('Invalid request body ')
+        vals = body['batch']
+        action = vals.get('action', None)
+        androids = vals.get('androids', None)
+        if not isinstance(androids, list) or not androids:
+            raise webob.exc.HTTPBadRequest('Invalid request body not set androids')
+        context = req.environ['nova.context']
+
+        if action == 'create':
+            for android in androids:
+                if (not isinstance(android, dict) or
+                        android.get('name') is None or
+                        android.get('verdor') is None):
+                    raise webob.exc.HTTPBadRequest(
+                            'Invalid request body not set name or verdor')
+            created = self._android_api.create_many(context, androids)
+            return {'androids': created, 'failed': []}
+
+        batch_actions = {'active': self._android_api.active_many,
+                         'deactive': self._android_api.deactive_many,
+                         'start': self._android_api.start_many,
+                         'stop': self._android_api.stop_many}
+        if action not in batch_actions:
+            raise webob.exc.HTTPBadRequest('Unknown batch action %s' % action)
+
+        uuids = []
+        seen = set()
+        for uuid in androids:
+            if (not isinstance(uuid, basestring) or
+                    not uuidutils.is_uuid_like(uuid)):
+                raise webob.exc.HTTPBadRequest(
+                        'Invalid request body androids must be uuids')
+            # NOTE: a duplicate would be cast, and transitioned, twice
+            if uuid not in seen:
+                seen.add(uuid)
+                uuids.append(uuid)
+        androids = uuids
+
+        instances = self._android_api.get_many(context, androids, req=req)
+        found = set(instance['uuid'] for instance in instances)
+        missing = [{'uuid': uuid,
+                    'reason': exception.AndroidNotFound(uuid=uuid).format_message()}
+                   for uuid in androids if uuid not in found]
+        accepted, rejected = batch_actions[action](context, instances)
+        return {'androids': accepted, 'failed': missing + rejected}
+
     @wsgi.serializers(xml=AndroidShowTemplate)
     @extensions.expected_errors(404)
     @wsgi.response(204)
@@ -140,7 +217,7 @@ class AndroidController(object):
         context = req.environ['nova.context']
         try:
             instance = {}
-            instance = self._android_api.get(context,id)
+            instance = self._android_api.get(context, id, req=req)
             self._android_api.destroy(context,instance)
         except exception.AndroidNotFound as e:
             raise webob.exc.HTTPNotFound(explanation=e.format_message())
@@ -157,8 +234,10 @@ class Androids(extensions.V3APIExtensionBase):
 
     def get_resources(self):
         member_actions = {'action':'POST'}
+        collection_actions = {'batch': 'POST'}
         resources = [extensions.ResourceExtension(ALIAS,
                                                AndroidController(),
+                                               collection_actions = collection_actions,
                                                member_actions = member_actions)]
         return resources
 
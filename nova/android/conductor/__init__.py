@@ -5,9 +5,15 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova.objects import base as objects_base
 from nova.openstack.common import jsonutils
+from nova.conductor import cache
 from nova.conductor import plugin
 from nova import db as db_api
 from nova import exception
+from nova import utils
+
+CONF = cfg.CONF
+CONF.import_opt('stream_chunk_size', 'nova.conductor.api', group='conductor')
+CONF.import_opt('stream_window', 'nova.conductor.api', group='conductor')
 
 LOG = logging.getLogger(__name__)
 
@@ -20,22 +26,73 @@ class PluginAPI(object):
     def android_get_all(self, context,include_delete=False):
         return self.manager.android_get_all(context,include_delete=include_delete)
 
+    def android_get_all_by_filters(self, context, filters, sort_key='created_at',
+                                   sort_dir='desc', limit=None, marker=None,
+                                   columns=None):
+        return self.manager.android_get_all_by_filters(context,
+                                                       filters=filters,
+                                                       sort_key=sort_key,
+                                                       sort_dir=sort_dir,
+                                                       limit=limit,
+                                                       marker=marker,
+                                                       columns=columns)
+
+    def android_iter_by_filters(self, context, filters, sort_key='created_at',
+                                sort_dir='desc', limit=None, marker=None,
+                                columns=None):
+        return self.manager.android_iter_by_filters(context,
+                                                    filters=filters,
+                                                    sort_key=sort_key,
+                                                    sort_dir=sort_dir,
+                                                    limit=limit,
+                                                    marker=marker,
+                                                    columns=columns)
+
     def android_get_all_by_name(self, context, name):
         return self.manager.android_get_all_by_name(context,name=name)
 
     def android_get_by_uid(self, context, uuid):
         return self.manager.android_get_by_uid(context,uuid=uuid)
 
+    def android_get_many_by_uuid(self, context, uuids):
+        return self.manager.android_get_many_by_uuid(context,uuids=uuids)
+
 
     def android_create(self, context, values):
         return self.manager.android_create(context,values=values)
 
+    def android_create_many(self, context, values_list):
+        return self.manager.android_create_many(context,
+                                                values_list=values_list)
+
     def android_destroy(self, context, uuid):
         return self.manager.android_destroy(context,uuid=uuid)
 
     def android_update(self, context, uuid, values):
         return self.manager.android_update(context,uuid=uuid,values=values)
 
+    def android_update_many(self, context, updates):
+        return self.manager.android_update_many(context,updates=updates)
+
+    def android_update_many_async(self, context, updates, seq=None):
+        return self.manager.android_update_many_async(context,
+                                                      updates=updates,
+                                                      seq=seq)
+
+    def android_transition(self, context, uuid, expected_states,
+                           expected_task_states, new_values):
+        return self.manager.android_transition(
+                context, uuid=uuid, expected_states=expected_states,
+                expected_task_states=expected_task_states,
+                new_values=new_values)
+
+    def android_transition_many(self, context, uuids, expected_states,
+                                expected_task_states, new_values):
+        return self.manager.android_transition_many(
+                context, uuids=uuids, expected_states=expected_states,
+                expected_task_states=expected_task_states,
+                new_values=new_values)
+
 
 
 class RpcApiPlugin(plugin.BaseRpcApi):
@@ -47,6 +104,57 @@ class RpcApiPlugin(plugin.BaseRpcApi):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(context, 'android_get_all', include_delete=include_delete)
 
+    def android_get_all_by_filters(self, context, filters, sort_key,
+                                   sort_dir, limit, marker, columns):
+        cctxt = self.client.prepare(version='1.0')
+        return cctxt.call(context, 'android_get_all_by_filters',
+                          filters=filters, sort_key=sort_key,
+                          sort_dir=sort_dir, limit=limit, marker=marker,
+                          columns=columns)
+
+    def android_iter_by_filters(self, context, filters, sort_key,
+                                sort_dir, limit, marker, columns):
+        """Yield the androids of android_get_all_by_filters() as the
+        conductor streams them.
+
+        Each multicall asks for stream_window chunks of stream_chunk_size
+        androids, and the next one, starting after the last uuid seen, is
+        only sent once the caller consumed those.  The replies waiting for
+        a slow caller are therefore bounded by one window.
+        """
+        chunk_size = CONF.conductor.stream_chunk_size
+        window = chunk_size * CONF.conductor.stream_window
+        strip_uuid = columns and 'uuid' not in columns
+        if strip_uuid:
+            columns = list(columns) + ['uuid']
+        while limit is None or limit > 0:
+            size = window if limit is None else min(window, limit)
+            cctxt = self.client.prepare(version='1.61')
+            chunks = cctxt.multicall(context, 'android_stream_by_filters',
+                                     filters=filters, sort_key=sort_key,
+                                     sort_dir=sort_dir, limit=size,
+                                     marker=marker, columns=columns,
+                                     chunk_size=chunk_size)
+            count = 0
+            try:
+                for chunk in chunks:
+                    count += len(chunk)
+                    marker = chunk[-1]['uuid']
+                    for android in chunk:
+                        if strip_uuid:
+                            del android['uuid']
+                        yield android
+            finally:
+                # NOTE: a caller that stops early must not leave the
+                # waiter registered for the rest of the window.
+                done = getattr(chunks, 'done', None)
+                if done is not None:
+                    done()
+            if count < size:
+                return
+            if limit is not None:
+                limit -= count
+
     def android_get_all_by_name(self, context, name):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(context, 'android_get_all_by_name', name=name)
@@ -55,10 +163,19 @@ class RpcApiPlugin(plugin.BaseRpcApi):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(context, 'android_get_by_uid', uuid=uuid)
 
+    def android_get_many_by_uuid(self, context, uuids):
+        cctxt = self.client.prepare(version='1.0')
+        return cctxt.call(context, 'android_get_many_by_uuid', uuids=uuids)
+
     def android_create(self, context, values):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(context, 'android_create', values=values)
 
+    def android_create_many(self, context, values_list):
+        cctxt = self.client.prepare(version='1.0')
+        return cctxt.call(context, 'android_create_many',
+                          values_list=values_list)
+
     def android_destroy(self, context, uuid):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(context, 'android_destroy', uuid=uuid)
@@ -67,6 +184,30 @@ class RpcApiPlugin(plugin.BaseRpcApi):
         cctxt = self.client.prepare(version='1.0')
         return cctxt.call(context, 'android_update', uuid=uuid,values=values)
 
+    def android_update_many(self, context, updates):
+        cctxt = self.client.prepare(version='1.0')
+        return cctxt.call(context, 'android_update_many', updates=updates)
+
+    def android_update_many_async(self, context, updates, seq):
+        cctxt = self.client.prepare(version='1.62')
+        cctxt.cast(context, 'android_update_many', updates=updates, seq=seq)
+
+    def android_transition(self, context, uuid, expected_states,
+                           expected_task_states, new_values):
+        cctxt = self.client.prepare(version='1.63')
+        return cctxt.call(context, 'android_transition', uuid=uuid,
+                          expected_states=expected_states,
+                          expected_task_states=expected_task_states,
+                          new_values=new_values)
+
+    def android_transition_many(self, context, uuids, expected_states,
+                                expected_task_states, new_values):
+        cctxt = self.client.prepare(version='1.64')
+        return cctxt.call(context, 'android_transition_many', uuids=uuids,
+                          expected_states=expected_states,
+                          expected_task_states=expected_task_states,
+                          new_values=new_values)
+
 
 
 class ConductorManagerPlugin(plugin.BaseConductor):
@@ -75,27 +216,112 @@ class ConductorManagerPlugin(plugin.BaseConductor):
         super(ConductorManagerPlugin, self).__init__()
 
     def android_get_all(self, context,include_delete):
-        result = self.db.android_get_all(context,include_delete)
+        result = self.db.android_get_all(context, include_delete,
+                                         use_slave=True)
         return jsonutils.to_primitive(result)
 
+    @rpc_common.client_exceptions(exception.MarkerNotFound)
+    def android_get_all_by_filters(self, context, filters, sort_key,
+                                   sort_dir, limit, marker, columns):
+        androids = self.db.android_get_all_by_filters(context, filters,
+                                                      sort_key=sort_key,
+                                                      sort_dir=sort_dir,
+                                                      limit=limit,
+                                                      marker=marker,
+                                                      columns=columns,
+                                                      use_slave=True)
+        return [jsonutils.to_primitive(android) for android in androids]
+
+    def android_iter_by_filters(self, context, filters, sort_key,
+                                sort_dir, limit, marker, columns):
+        androids = self.db.android_iter_by_filters(context, filters,
+                                                   sort_key=sort_key,
+                                                   sort_dir=sort_dir,
+                                                   limit=limit,
+                                                   marker=marker,
+                                                   columns=columns,
+                                                   use_slave=True)
+        for android in androids:
+            yield jsonutils.to_primitive(android)
+
+    @rpc_common.client_exceptions(exception.MarkerNotFound)
+    def android_stream_by_filters(self, context, filters, sort_key,
+                                  sort_dir, limit, marker, columns,
+                                  chunk_size):
+        """Return a generator of lists of up to chunk_size androids,
+        which the RPC layer replies one message each.
+
+        The first list is read before returning, so that a bad marker
+        fails the call as it does for android_get_all_by_filters().
+        """
+        androids = self.android_iter_by_filters(context, filters, sort_key,
+                                                sort_dir, limit, marker,
+                                                columns)
+        chunks = utils.batches(androids, chunk_size)
+        first = next(chunks, None)
+
+        def stream():
+            if first is not None:
+                yield first
+            for chunk in chunks:
+                yield chunk
+        return stream()
+
     def android_get_all_by_name(self, context, name):
-        result = self.db.android_get_by_name(context, name)
+        result = self.db.android_get_by_name(context, name,
+                                             use_slave=True)
         return jsonutils.to_primitive(result)
 
+    @cache.cached('android:%(uuid)s')
     def android_get_by_uid(self, context, uuid):
-        result = self.db.android_get_by_uid(context, uuid)
+        result = self.db.android_get_by_uid(context, uuid,
+                                            use_slave=True)
+        return jsonutils.to_primitive(result)
+
+    def android_get_many_by_uuid(self, context, uuids):
+        result = self.db.android_get_many_by_uuid(context, uuids,
+                                                  use_slave=True)
         return jsonutils.to_primitive(result)
 
     def android_create(self, context, values):
         result = self.db.android_create(context, values)
         return jsonutils.to_primitive(result)
 
+    def android_create_many(self, context, values_list):
+        result = self.db.android_create_many(context, values_list)
+        return jsonutils.to_primitive(result)
+
     @rpc_common.client_exceptions(exception.AndroidNotFound)
+    @cache.invalidates('android:%(uuid)s')
     def android_destroy(self, context, uuid):
         self.db.android_destroy(context,uuid)
 
     @rpc_common.client_exceptions(exception.AndroidNotFound)
+    @cache.invalidates('android:%(uuid)s')
     def android_update(self, context, uuid, values):
         result = self.db.android_update(context, uuid, values)
         return result
+
+    @cache.invalidates(lambda callargs: ['android:%s' % uuid
+                                         for uuid in callargs['updates']])
+    def android_update_many(self, context, updates, seq=None):
+        return self.db.android_update_many(context, updates, seq=seq)
+
+    def android_update_many_async(self, context, updates, seq):
+        self.android_update_many(context, updates, seq=seq)
+
+    @cache.invalidates('android:%(uuid)s')
+    def android_transition(self, context, uuid, expected_states,
+                           expected_task_states, new_values):
+        return self.db.android_transition(context, uuid, expected_states,
+                                          expected_task_states, new_values)
+
+    @cache.invalidates(lambda callargs: ['android:%s' % uuid
+                                         for uuid in callargs['uuids']])
+    def android_transition_many(self, context, uuids, expected_states,
+                                expected_task_states, new_values):
+        return self.db.android_transition_many(context, uuids,
+                                               expected_states,
+                                               expected_task_states,
+                                               new_values)
     
\ No newline at end of file
@@ -25,7 +25,6 @@ from nova.openstack.common.gettextutils import _
 from nova import conductor
 from nova import utils
 from nova import db as db_api
-from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 
 ALIAS = "os-services"
@@ -117,25 +116,21 @@ class ServiceController(object):
     def _get_services(self, req):
         context = req.environ['nova.context']
         services = self.conductor_api.service_get_all(context)
-        services = jsonutils.to_primitive(services)
-        
+
         host = ''
         if 'host' in req.GET:
             host = req.GET['host']
         binary = ''
         if 'binary' in req.GET:
             binary = req.GET['binary']
-        if host:
-            services = [s for s in services if s['host'] == host]
-        if binary:
-            services = [s for s in services if s['binary'] == binary]
-        return services
+        return [s for s in services
+                if ((not host or s['host'] == host) and
+                    (not binary or s['binary'] == binary))]
 
     def _get_services_by_id(self, req, id):
         context = req.environ['nova.context']
-        services = self.conductor_api.service_get_by_id(context, id)
-        services = jsonutils.to_primitive(services)
-        return services
+        service = self.conductor_api.service_get_by_id(context, id)
+        return service
 
     def _update_service(self,context, host, binary, status_detail):
         service = self.conductor_api.service_get_by_args(context, host, binary)
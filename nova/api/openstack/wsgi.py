@@ -22,7 +22,9 @@ import re
 import time
 from xml.dom import minidom
 
+from eventlet import greenthread
 from lxml import etree
+from oslo.config import cfg
 import webob
 
 from nova.api.openstack import xmlutil
@@ -31,9 +33,25 @@ from nova.openstack.common import gettextutils
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova import utils
 from nova import wsgi
 
 
+wsgi_opts = [
+    cfg.BoolOpt('osapi_stream_responses',
+                default=True,
+                help='Send large collections with chunked transfer encoding, '
+                     'encoding their items as they are read instead of '
+                     'building the whole response body first'),
+    cfg.IntOpt('osapi_stream_batch_size',
+               default=100,
+               help='Number of items read and encoded at a time when a '
+                    'collection is streamed'),
+]
+CONF = cfg.CONF
+CONF.register_opts(wsgi_opts)
+
+
 XMLNS_V10 = 'http://docs.rackspacecloud.com/servers/api/v1.0'
 XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 
@@ -112,7 +130,7 @@ class Request(webob.Request):
 
         Note that the object data will be slightly stale.
         """
-        return self._extension_data['db_items'][key]
+        return self._extension_data['db_items'].get(key, {})
 
     def get_db_item(self, key, item_key):
         """
@@ -147,6 +165,12 @@ class Request(webob.Request):
     def get_db_flavor(self, flavorid):
         return self.get_db_item('flavors', flavorid)
 
+    def cache_db_androids(self, androids):
+        self.cache_db_items('androids', androids, 'uuid')
+
+    def get_db_android(self, uuid):
+        return self.get_db_item('androids', uuid)
+
     def best_match_content_type(self):
         """Determine the requested response content-type."""
         if 'nova.best_content_type' not in self.environ:
@@ -349,6 +373,16 @@ class DictSerializer(ActionDispatcher):
     def default(self, data):
         return ""
 
+    def serialize_iter(self, data, key, batch_size, action='default'):
+        """Serialize data, whose data[key] is an iterable of items.
+
+        Yields the serialized body in pieces.  This version reads all the
+        items and serializes them at once.
+        """
+        data = dict(data)
+        data[key] = list(data[key])
+        yield self.serialize(data, action=action)
+
 
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
@@ -356,6 +390,38 @@ class JSONDictSerializer(DictSerializer):
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_iter(self, data, key, batch_size, action='default'):
+        """Yield the JSON document of data, encoding data[key] as a list,
+        batch_size items at a time.
+        """
+        if action != 'default':
+            for chunk in super(JSONDictSerializer, self).serialize_iter(
+                    data, key, batch_size, action=action):
+                yield chunk
+            return
+
+        # NOTE: same separators as jsonutils.dumps(), so the pieces join to
+        # the document default() returns.
+        members = []
+        for name, value in data.items():
+            if name == key:
+                members.append(None)
+            else:
+                members.append('%s: %s' % (jsonutils.dumps(name),
+                                           jsonutils.dumps(value)))
+        index = members.index(None)
+
+        yield '{%s%s: [' % (''.join(member + ', '
+                                    for member in members[:index]),
+                            jsonutils.dumps(key))
+        separator = ''
+        for batch in utils.batches(data[key], batch_size):
+            yield separator + ', '.join(jsonutils.dumps(item)
+                                        for item in batch)
+            separator = ', '
+        yield ']%s}' % ''.join(', ' + member
+                               for member in members[index + 1:])
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -625,11 +691,40 @@ class ResponseObject(object):
         for hdr, value in self._headers.items():
             response.headers[hdr] = str(value)
         response.headers['Content-Type'] = content_type
-        if self.obj is not None:
+        if self.obj is None:
+            return response
+
+        key = self._stream_key()
+        if key is not None and hasattr(serializer, 'serialize_iter'):
+            response.app_iter = _stream_body(serializer.serialize_iter(
+                    self.obj, key, CONF.osapi_stream_batch_size))
+        else:
+            if key is not None:
+                self.obj[key] = list(self.obj[key])
             response.body = serializer.serialize(self.obj)
 
         return response
 
+    def _stream_key(self):
+        """Return the key of the collection to stream, if any.
+
+        Controllers stream a collection by returning a generator of its
+        items in place of the list.  Only one collection per response can
+        be streamed; any others are read into lists here.
+        """
+
+        if not isinstance(self.obj, dict):
+            return None
+        keys = [key for key, value in self.obj.items()
+                if inspect.isgenerator(value)]
+        if not keys:
+            return None
+        if len(keys) > 1 or not CONF.osapi_stream_responses:
+            for key in keys:
+                self.obj[key] = list(self.obj[key])
+            return None
+        return keys[0]
+
     @property
     def code(self):
         """Retrieve the response status."""
@@ -643,6 +738,25 @@ class ResponseObject(object):
         return self._headers.copy()
 
 
+def _stream_body(chunks):
+    """Wrap the serialized pieces of a streamed response body.
+
+    The WSGI server writes every piece before asking for the next one, so
+    a slow client holds back the reads feeding the body; sleeping between
+    pieces lets other requests run while a large collection is encoded.
+    """
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+            greenthread.sleep(0)
+    except Exception:
+        # NOTE: the status line has been sent already, all that is left is
+        # to cut the response short.
+        LOG.exception(_('Failed to stream the response body'))
+        raise
+
+
 def action_peek_json(body):
     """Determine action to invoke."""
 
@@ -925,7 +1039,7 @@ class Resource(wsgi.Application):
         # Identify the action, its arguments, and the requested
         # content type
         action_args = self.get_action_args(request.environ)
-        LOG.debug('Request evn is %s '% request.environ)
+        LOG.debug(_('Request environ is %s'), request.environ)
         action = action_args.pop('action', None)
         content_type, body = self.get_body(request)
         accept = request.best_match_content_type()
@@ -959,12 +1073,12 @@ class Resource(wsgi.Application):
             msg = _("Malformed request body")
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
 
-        if body:
+        if body and LOG.isEnabledFor(logging.DEBUG):
             msg = _("Action: '%(action)s', body: "
                     "%(body)s") % {'action': action,
                                    'body': unicode(body, 'utf-8')}
             LOG.debug(sanitize(msg))
-        LOG.debug(_("Calling method %s") % str(meth))
+        LOG.debug(_("Calling method %s"), meth)
 
         # Now, deserialize the request body...
         try:
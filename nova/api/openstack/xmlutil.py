@@ -15,6 +15,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import inspect
+import itertools
 import os.path
 
 from lxml import etree
@@ -518,6 +520,189 @@ def SubTemplateElement(parent, tag, attrib=None, selector=None,
     return elem
 
 
+def _compile_selector(selector):
+    """Return (key, selector) for the render plan.
+
+    A plain Selector of a single key is reduced to that key so the plan
+    can index the object directly; key is None for identity selectors
+    and _GENERIC for anything that has to be called.
+    """
+
+    if type(selector) is Selector:
+        if not selector.chain:
+            return None, selector
+        if len(selector.chain) == 1 and not callable(selector.chain[0]):
+            return selector.chain[0], selector
+    return _GENERIC, selector
+
+
+_GENERIC = object()
+
+
+def _overrides(elem, name):
+    return getattr(type(elem), name).__func__ is not \
+        getattr(TemplateElement, name).__func__
+
+
+class _RenderPlan(object):
+    """A precomputed render plan for a list of sibling template elements.
+
+    Template._serialize() works out, for every rendered element, which
+    children of the master and slave elements belong together and which
+    text and attribute selectors apply.  That only depends on the
+    template, so the plan does it once.  Rendering runs the same etree
+    calls in the same order as _serialize(), so the output is identical.
+    """
+
+    def __init__(self, siblings):
+        self.master = siblings[0]
+        self.patches = siblings[1:]
+
+        # Elements that customize rendering go through their own methods.
+        self.generic = (any(_overrides(self.master, name)
+                            for name in ('render', '_render')) or
+                        any(_overrides(elem, 'apply') for elem in siblings))
+        self.custom_will_render = _overrides(self.master, 'will_render')
+
+        self.key, self.selector = _compile_selector(self.master.selector)
+        self.subselector = self.master.subselector
+        self.tag = self.master.tag
+        self.colon_ns = self.master.colon_ns
+
+        # Text and attributes, in the order apply() sets them
+        self.ops = []
+        for elem in siblings:
+            if elem.text is not None:
+                self.ops.append((None, False) + _compile_selector(elem.text))
+            for name, value in elem.attrib.items():
+                self.ops.append((name, True) + _compile_selector(value))
+
+        # Group the children exactly as _serialize() does
+        self.children = []
+        seen = set()
+        for idx, sibling in enumerate(siblings):
+            for child in sibling:
+                if child.tag in seen:
+                    continue
+                seen.add(child.tag)
+                nieces = [child]
+                for sib in siblings[idx + 1:]:
+                    if child.tag in sib:
+                        nieces.append(sib[child.tag])
+                self.children.append(_RenderPlan(nieces))
+
+    def _apply(self, elem, datum):
+        for name, is_attr, key, selector in self.ops:
+            if key is _GENERIC:
+                if is_attr:
+                    try:
+                        value = selector(datum, True)
+                    except KeyError:
+                        continue
+                else:
+                    value = selector(datum)
+            elif key is None:
+                value = datum
+            else:
+                try:
+                    value = datum[key]
+                except (KeyError, IndexError):
+                    if is_attr:
+                        continue
+                    value = None
+            if is_attr:
+                elem.set(name, unicode(value))
+            else:
+                elem.text = unicode(value)
+
+    def _render_one(self, parent, datum, nsmap):
+        if callable(self.tag):
+            tagname = self.tag(datum)
+        else:
+            tagname = self.tag
+
+        if self.colon_ns:
+            if ':' in tagname:
+                if nsmap is None:
+                    nsmap = {}
+                colon_key, colon_name = tagname.split(':')
+                nsmap[colon_key] = colon_key
+                tagname = '{%s}%s' % (colon_key, colon_name)
+
+        elem = etree.Element(tagname, nsmap=nsmap)
+        if parent is not None:
+            parent.append(elem)
+        if datum is not None:
+            self._apply(elem, datum)
+        return elem
+
+    def _render(self, parent, obj, nsmap):
+        if self.generic:
+            return self.master.render(parent, obj, self.patches, nsmap)
+
+        if obj is None:
+            data = None
+        elif self.key is _GENERIC:
+            data = self.selector(obj)
+        elif self.key is None:
+            data = obj
+        else:
+            try:
+                data = obj[self.key]
+            except (KeyError, IndexError):
+                data = None
+
+        if self.custom_will_render:
+            if not self.master.will_render(data):
+                return []
+        elif data is None:
+            return []
+        if data is None:
+            return [(self._render_one(parent, None, nsmap), None)]
+
+        if not isinstance(data, list):
+            data = [data]
+        elif parent is None:
+            raise ValueError(_('root element selecting a list'))
+
+        subselector = self.subselector
+        render_one = self._render_one
+        elems = []
+        for datum in data:
+            if subselector is not None:
+                datum = subselector(datum)
+            elems.append((render_one(parent, datum, nsmap), datum))
+        return elems
+
+    def serialize(self, parent, obj, nsmap=None):
+        """Same as Template._serialize(parent, obj, siblings, nsmap)."""
+
+        elems = self._render(parent, obj, nsmap)
+        for child in self.children:
+            for elem, datum in elems:
+                child.serialize(elem, datum)
+        if elems:
+            return elems[0][0]
+
+
+# NOTE: keyed by the tuple of sibling root elements.  TemplateBuilder
+# hands out copies of one template, which share their elements, so every
+# copy (with the same slaves attached) finds the same plan.  Templates
+# must not be changed once they have been used for serialization.
+_render_plans = {}
+
+_STREAM_MARKER = 'xmlutil-stream'
+
+
+def _get_render_plan(siblings):
+    key = tuple(siblings)
+    plan = _render_plans.get(key)
+    if plan is None:
+        plan = _RenderPlan(siblings)
+        _render_plans[key] = plan
+    return plan
+
+
 class Template(object):
     """Represent a template."""
 
@@ -598,6 +783,77 @@ class Template(object):
         # Serialize it into XML
         return etree.tostring(elem, *args, **kwargs)
 
+    def serialize_iter(self, obj, key, batch_size=100):
+        """Serialize an object, streaming the items of one collection.
+
+        obj[key] may be any iterable of items; they are rendered
+        batch_size at a time and the XML document is yielded in pieces.
+        Joined, the pieces form the document serialize() returns for the
+        same object with obj[key] as a list.  If the items are not
+        rendered by a direct child of the root element, the whole
+        document is rendered at once instead.
+
+        :param obj: The object to serialize.
+        :param key: The key of the collection in obj.
+        :param batch_size: The number of items rendered at a time.
+        """
+
+        plan = streamed = None
+        if (self.root is not None and
+                type(self)._serialize.__func__ is Template._serialize.__func__):
+            plan = _get_render_plan(self._siblings())
+            children = [child for child in plan.children if child.key == key]
+            if (plan.key is None and not plan.generic and
+                    not plan.custom_will_render and len(children) == 1):
+                streamed = children[0]
+
+        head = dict(obj)
+        if streamed is None:
+            if inspect.isgenerator(head[key]):
+                head[key] = list(head[key])
+            yield self.serialize(head)
+            return
+
+        head[key] = []
+        batches = utils.batches(obj[key], batch_size)
+        first = next(batches, None)
+        if first is None:
+            yield self.serialize(head)
+            return
+
+        # NOTE: '<' is always escaped in text and attribute values, so the
+        # comment standing in for the items cannot occur anywhere else.
+        marker = '<!--%s-->' % _STREAM_MARKER
+
+        def render_root():
+            return plan._render(None, head, self._nsmap())[0][0]
+
+        # Everything before and after the items
+        root = render_root()
+        for child in plan.children:
+            if child is streamed:
+                root.append(etree.Comment(_STREAM_MARKER))
+            else:
+                child.serialize(root, head)
+        prefix, suffix = etree.tostring(
+            root, **self.serialize_options).split(marker)
+
+        # The start and end tags of the root element, to strip from the
+        # rendered batches
+        options = dict(self.serialize_options, xml_declaration=False)
+        root = render_root()
+        root.append(etree.Comment(_STREAM_MARKER))
+        start, end = etree.tostring(root, **options).split(marker)
+
+        yield prefix
+        for batch in itertools.chain([first], batches):
+            root = render_root()
+            datum = dict(head)
+            datum[key] = batch
+            streamed.serialize(root, datum)
+            yield etree.tostring(root, **options)[len(start):-len(end)]
+        yield suffix
+
     def make_tree(self, obj):
         """Create a tree.
 
@@ -616,7 +872,9 @@ class Template(object):
         nsmap = self._nsmap()
 
         # Form the element tree
-        return self._serialize(None, obj, siblings, nsmap)
+        if type(self)._serialize.__func__ is not Template._serialize.__func__:
+            return self._serialize(None, obj, siblings, nsmap)
+        return _get_render_plan(siblings).serialize(None, obj, nsmap)
 
     def _siblings(self):
         """Hook method for computing root siblings.
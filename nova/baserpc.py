@@ -21,6 +21,7 @@ Base RPC client and server common to all services.
 from oslo.config import cfg
 
 from nova.openstack.common import jsonutils
+from nova.openstack.common import lockutils
 from nova import rpcclient
 
 
@@ -40,6 +41,8 @@ class BaseAPI(rpcclient.RpcProxy):
 
         1.0 - Initial version.
         1.1 - Add get_backdoor_port
+        1.2 - Add get_periodic_task_stats
+        1.3 - Add get_lock_stats
     """
 
     #
@@ -74,16 +77,25 @@ class BaseAPI(rpcclient.RpcProxy):
         cctxt = self.client.prepare(server=host, version='1.1')
         return cctxt.call(context, 'get_backdoor_port')
 
+    def get_periodic_task_stats(self, context, host):
+        cctxt = self.client.prepare(server=host, version='1.2')
+        return cctxt.call(context, 'get_periodic_task_stats')
+
+    def get_lock_stats(self, context, host):
+        cctxt = self.client.prepare(server=host, version='1.3')
+        return cctxt.call(context, 'get_lock_stats')
+
 
 class BaseRPCAPI(object):
     """Server side of the base RPC API."""
 
     RPC_API_NAMESPACE = _NAMESPACE
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.3'
 
-    def __init__(self, service_name, backdoor_port):
+    def __init__(self, service_name, backdoor_port, manager=None):
         self.service_name = service_name
         self.backdoor_port = backdoor_port
+        self.manager = manager
 
     def ping(self, context, arg):
         resp = {'service': self.service_name, 'arg': arg}
@@ -91,3 +103,11 @@ class BaseRPCAPI(object):
 
     def get_backdoor_port(self, context):
         return self.backdoor_port
+
+    def get_periodic_task_stats(self, context):
+        if self.manager is None:
+            return {}
+        return jsonutils.to_primitive(self.manager.get_periodic_task_stats())
+
+    def get_lock_stats(self, context):
+        return jsonutils.to_primitive(lockutils.get_lock_stats())
@@ -14,7 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-"""Starter script for Nova Conductor."""
+"""Starter script for Nova Android agent."""
 
 import sys
 
@@ -28,6 +28,7 @@ from nova import utils
 
 CONF = cfg.CONF
 CONF.import_opt('topic', 'nova.android.agent.api', group='android')
+CONF.import_opt('workers', 'nova.android.agent.api', group='android')
 
 
 def main():
@@ -38,5 +39,5 @@ def main():
     server = service.Service.create(binary='nova-android',
                                     topic=CONF.android.topic,
                                     manager='nova.android.agent.manager.AndroidManager')
-    service.serve(server, workers=CONF.conductor.workers)
+    service.serve(server, workers=CONF.android.workers)
     service.wait()
@@ -39,7 +39,42 @@ conductor_opts = [
                help='Number of workers for OpenStack Conductor service'),
     cfg.StrOpt('conductor_plugin_class_name',
                default = 'nova.conductor.plugin',
-               help='this flag will use at conductor.api, conductor.rpcapi, conductor.manager')
+               help='this flag will use at conductor.api, conductor.rpcapi, conductor.manager'),
+    cfg.BoolOpt('heartbeat_aggregate',
+                default=False,
+                help='Have services cast their servicegroup heartbeat to '
+                     'the conductor, which batches the database writes and '
+                     'answers servicegroup queries from memory'),
+    cfg.FloatOpt('heartbeat_flush_interval',
+                 default=1.0,
+                 help='Seconds the conductor buffers heartbeats before '
+                      'writing them to the database'),
+    cfg.IntOpt('heartbeat_refresh_interval',
+               default=10,
+               help='Seconds between reloads of the conductor liveness '
+                    'table from the services table'),
+    cfg.BoolOpt('result_cache',
+                default=False,
+                help='Cache the results of hot conductor read methods'),
+    cfg.DictOpt('result_cache_ttl',
+                default={'android_get_by_uid': '5',
+                         'service_get_all_by': '2'},
+                help='Seconds the result cache keeps the results of each '
+                     'method, as method:seconds pairs. Methods not listed '
+                     'are not cached'),
+    cfg.IntOpt('result_cache_size',
+               default=10000,
+               help='Maximum number of results the result cache keeps'),
+    cfg.IntOpt('stream_chunk_size',
+               default=100,
+               help='Number of rows in each reply of a streamed conductor '
+                    'read'),
+    cfg.IntOpt('stream_window',
+               default=10,
+               help='Number of chunks a streamed conductor read asks for '
+                    'at a time. The next ones are only asked for once the '
+                    'reader consumed these, so a slow reader cannot pile '
+                    'up replies'),
 ]
 conductor_group = cfg.OptGroup(name='conductor',
                                title='Conductor Options')
@@ -119,6 +154,9 @@ class LocalAPI(object):
     def service_update(self, context, service, values):
         return self._manager.service_update(context, service, values)
 
+    def service_heartbeat(self, context, service):
+        return self._manager.service_heartbeat(context, service['id'])
+
 
 class API(LocalAPI):
     """Conductor API that does updates via RPC to the ConductorManager."""
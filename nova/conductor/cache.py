@@ -0,0 +1,225 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Cache the results of hot conductor read methods.
+
+With [conductor] result_cache set, methods decorated with @cached keep
+their results for the number of seconds result_cache_ttl gives them.  The
+results are keyed by method, arguments and the project scope of the
+context.  Every result is tagged (e.g. 'android:<uuid>'), and methods
+decorated with @invalidates drop the results carrying their tags.  They
+do so in this process right away, and through a fanout cast in every
+other conductor worker, since each worker process has its own cache.
+"""
+
+import collections
+import copy
+import functools
+import inspect
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
+
+CONF = cfg.CONF
+CONF.import_opt('result_cache', 'nova.conductor.api', group='conductor')
+CONF.import_opt('result_cache_ttl', 'nova.conductor.api', group='conductor')
+CONF.import_opt('result_cache_size', 'nova.conductor.api', group='conductor')
+
+LOG = logging.getLogger(__name__)
+
+
+class _MethodStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations}
+
+
+class ResultCache(object):
+    """Results by key, expiring after their TTL and dropped by tag.
+
+    Every tag has a generation, bumped when the tag is invalidated.  A
+    result is only stored if none of its tags was invalidated while it was
+    being computed, so a read racing with a write cannot put the old row
+    back in the cache.
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = CONF.conductor.result_cache_size
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._keys_by_tag = collections.defaultdict(set)
+        self._generations = collections.defaultdict(int)
+        self._stats = collections.defaultdict(_MethodStats)
+        self._rpcapi = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_call(self, key, tags, ttl, func):
+        """Return the cached result of key, or what func() returns."""
+        method = key[0]
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result, _tags = entry
+            if expires > timeutils.utcnow_ts():
+                self._stats[method].hits += 1
+                return copy.deepcopy(result)
+            self._remove(key)
+
+        self._stats[method].misses += 1
+        generations = [self._generations[tag] for tag in tags]
+        result = func()
+        if generations == [self._generations[tag] for tag in tags]:
+            self._store(key, tags, timeutils.utcnow_ts() + ttl,
+                        copy.deepcopy(result))
+        return result
+
+    def _store(self, key, tags, expires, result):
+        if key in self._entries:
+            self._remove(key)
+        while self._entries and len(self._entries) >= self.max_size:
+            self._remove(next(iter(self._entries)))
+        self._entries[key] = (expires, result, tags)
+        for tag in tags:
+            self._keys_by_tag[tag].add(key)
+
+    def _remove(self, key):
+        _expires, _result, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def invalidate_local(self, tags):
+        """Drop the results carrying any of tags from this process."""
+        for tag in tags:
+            self._generations[tag] += 1
+            for key in list(self._keys_by_tag.get(tag, ())):
+                self._stats[key[0]].invalidations += 1
+                self._remove(key)
+
+    def invalidate(self, context, tags):
+        """Drop the results carrying any of tags from every conductor."""
+        self.invalidate_local(tags)
+        if self._rpcapi is None:
+            # NOTE: imported here, nova.conductor.api imports the manager
+            # (and so this module) before the rpcapi
+            from nova.conductor import rpcapi
+            self._rpcapi = rpcapi.ConductorAPI()
+        try:
+            self._rpcapi.invalidate_result_cache(context, list(tags))
+        except Exception:
+            # NOTE: the other workers drop the results when they expire
+            LOG.exception(_('Failed to send result cache invalidation of '
+                            '%s'), tags)
+
+    def get_stats(self):
+        """Return hits, misses and invalidations by method."""
+        stats = dict((method, method_stats.to_dict())
+                     for method, method_stats in self._stats.iteritems())
+        return {'size': len(self._entries), 'methods': stats}
+
+
+_cache = None
+
+
+def get_cache():
+    """Return the result cache of this process."""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
+
+
+def _get_ttl(method):
+    if not CONF.conductor.result_cache:
+        return 0
+    return float(CONF.conductor.result_cache_ttl.get(method, 0))
+
+
+def _scope(context):
+    # NOTE: only callers that would see the same rows share results.
+    return (context.project_id, context.is_admin, context.read_deleted)
+
+
+def _make_tags(tags, callargs):
+    result = []
+    for tag in tags:
+        if callable(tag):
+            result.extend(tag(callargs))
+        else:
+            result.append(tag % callargs)
+    return result
+
+
+def cached(*tags):
+    """Cache the results of a conductor method taking (self, context, ...).
+
+    tags are format strings filled in from the call arguments (e.g.
+    'android:%(uuid)s'), or callables taking the call arguments and
+    returning a list of tags.  Calls whose arguments cannot be hashed
+    are not cached.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, context, *args, **kwargs):
+            ttl = _get_ttl(f.__name__)
+            if not ttl:
+                return f(self, context, *args, **kwargs)
+
+            callargs = inspect.getcallargs(f, self, context, *args, **kwargs)
+            arguments = tuple(sorted((name, value)
+                                     for name, value in callargs.iteritems()
+                                     if value is not self and
+                                     value is not context))
+            key = (f.__name__, _scope(context), arguments)
+            try:
+                hash(key)
+            except TypeError:
+                return f(self, context, *args, **kwargs)
+
+            return get_cache().get_or_call(
+                    key, _make_tags(tags, callargs), ttl,
+                    lambda: f(self, context, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags):
+    """Drop the cached results tagged tags once the decorated method
+    returned (or raised).  tags are given as for @cached.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, context, *args, **kwargs):
+            try:
+                return f(self, context, *args, **kwargs)
+            finally:
+                if CONF.conductor.result_cache:
+                    callargs = inspect.getcallargs(f, self, context, *args,
+                                                   **kwargs)
+                    tag_list = _make_tags(tags, callargs)
+                    if tag_list:
+                        get_cache().invalidate(context, tag_list)
+        return wrapper
+    return decorator
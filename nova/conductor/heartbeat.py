@@ -0,0 +1,124 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Coalesce servicegroup heartbeats on the conductor.
+
+With [conductor] heartbeat_aggregate set, the DB servicegroup driver casts
+a heartbeat instead of doing a service_update call.  The conductor counts
+the heartbeats per service and writes them every heartbeat_flush_interval
+seconds with one UPDATE services SET report_count=report_count+N per
+distinct N.  It also keeps the services it has seen in a liveness table so
+that servicegroup get_all()/is_up() are answered from memory.
+"""
+
+from eventlet import greenthread
+from oslo.config import cfg
+
+from nova import context as nova_context
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import jsonutils
+from nova.openstack.common import log as logging
+from nova.openstack.common import timeutils
+
+CONF = cfg.CONF
+CONF.import_opt('heartbeat_flush_interval', 'nova.conductor.api',
+                group='conductor')
+CONF.import_opt('heartbeat_refresh_interval', 'nova.conductor.api',
+                group='conductor')
+
+LOG = logging.getLogger(__name__)
+
+
+class HeartbeatAggregator(object):
+    """Buffer heartbeats and serve service liveness from memory.
+
+    Every conductor worker only sees the heartbeats routed to it, so the
+    liveness table is refreshed from the services table (which all workers
+    flush into) every heartbeat_refresh_interval; a heartbeat seen locally
+    always wins over an older updated_at read back from the database.
+    """
+
+    def __init__(self, db, flush_interval=None, refresh_interval=None):
+        self.db = db
+        if flush_interval is None:
+            flush_interval = CONF.conductor.heartbeat_flush_interval
+        if refresh_interval is None:
+            refresh_interval = CONF.conductor.heartbeat_refresh_interval
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        self._pending = {}
+        self._services = {}
+        self._last_seen = {}
+        self._refreshed_at = None
+        self._thread = None
+
+    def heartbeat(self, service_id):
+        self._pending[service_id] = self._pending.get(service_id, 0) + 1
+        self._last_seen[service_id] = timeutils.utcnow()
+        if self._thread is None:
+            self._thread = greenthread.spawn(self._run)
+
+    def flush(self, context):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            return self.db.service_heartbeat_many(context, pending)
+        except Exception:
+            # NOTE: keep the counts, the next flush writes them.
+            for service_id, count in pending.iteritems():
+                self._pending[service_id] = (
+                    self._pending.get(service_id, 0) + count)
+            LOG.exception(_('Failed to flush %d service heartbeats'),
+                          len(pending))
+            return 0
+
+    def _run(self):
+        context = nova_context.get_admin_context()
+        while True:
+            greenthread.sleep(self.flush_interval)
+            self.flush(context)
+
+    def _refresh(self, context):
+        now = timeutils.utcnow()
+        if (self._refreshed_at is not None and
+                timeutils.delta_seconds(self._refreshed_at, now) <
+                self.refresh_interval):
+            return
+        services = {}
+        for service in self.db.service_get_all(context, use_slave=True):
+            services[service['id']] = jsonutils.to_primitive(service)
+            heartbeat = service['updated_at'] or service['created_at']
+            last_seen = self._last_seen.get(service['id'])
+            if last_seen is None or heartbeat > last_seen:
+                self._last_seen[service['id']] = heartbeat
+        for service_id in set(self._last_seen) - set(services):
+            del self._last_seen[service_id]
+        self._services = services
+        self._refreshed_at = now
+
+    def _with_last_seen(self, service):
+        service = dict(service)
+        service['updated_at'] = timeutils.strtime(
+            self._last_seen[service['id']])
+        return service
+
+    def service_get_all_by_topic(self, context, topic):
+        """Return the enabled services of topic as service_get_all_by would.
+
+        updated_at carries the newest heartbeat known to this conductor.
+        """
+        self._refresh(context)
+        return [self._with_last_seen(service)
+                for service in self._services.itervalues()
+                if (service['topic'] == topic and not service['disabled']
+                    and not service['deleted'])]
@@ -15,6 +15,8 @@
 """Handles database requests from other nova services."""
 from oslo.config import cfg
 
+from nova.conductor import cache
+from nova.conductor import heartbeat
 from nova import exception
 from nova import manager
 from nova.openstack.common.gettextutils import _
@@ -32,6 +34,14 @@ LOG = logging.getLogger(__name__)
 
 
 
+def _service_update_tags(callargs):
+    # NOTE: report_count only updates are the service heartbeats; the
+    # cached service lists may miss them for up to their TTL.
+    if set(callargs['values']) - set(['report_count']):
+        return ['services']
+    return []
+
+
 class ConductorManager(manager.Manager):
     """Mission: Conduct things.
 
@@ -45,7 +55,7 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    RPC_API_VERSION = '1.58'
+    RPC_API_VERSION = '1.64'
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -54,6 +64,7 @@ class ConductorManager(manager.Manager):
         plugin_class_name = '%s.ConductorManagerPlugin' % CONF.conductor.conductor_plugin_class_name
         plugin_class = importutils.import_class(plugin_class_name)
         self.plugin = plugin_class()
+        self.heartbeats = heartbeat.HeartbeatAggregator(self.db)
         LOG.debug(_('Load Plugin at ConductorManager %(plugin_class_name)s'),
                          {'plugin_class_name': plugin_class_name})
 
@@ -63,38 +74,57 @@ class ConductorManager(manager.Manager):
 
 
     @rpc_common.client_exceptions(exception.HostBinaryNotFound)
+    @cache.cached('services')
     def service_get_all_by(self, context, topic=None, host=None, binary=None):
         if not any((topic, host, binary)):
-            result = self.db.service_get_all(context)
+            result = self.db.service_get_all(context, use_slave=True)
         elif all((topic, host)):
             result = self.db.service_get_by_host_and_topic(context,
-                                                               host, topic)
+                                                               host, topic,
+                                                               use_slave=True)
         elif all((host, binary)):
-            result = self.db.service_get_by_args(context, host, binary)
+            result = self.db.service_get_by_args(context, host, binary,
+                                                 use_slave=True)
+        elif topic and CONF.conductor.heartbeat_aggregate:
+            return self.heartbeats.service_get_all_by_topic(context, topic)
         elif topic:
-            result = self.db.service_get_all_by_topic(context, topic)
+            result = self.db.service_get_all_by_topic(context, topic,
+                                                      use_slave=True)
         elif host:
-            result = self.db.service_get_all_by_host(context, host)
+            result = self.db.service_get_all_by_host(context, host,
+                                                     use_slave=True)
 
         return jsonutils.to_primitive(result)
 
     def service_get_by_id(self, context, service_id):
-        svc = self.db.service_get(context, service_id)
+        svc = self.db.service_get(context, service_id, use_slave=True)
         return jsonutils.to_primitive(svc)
 
+    @cache.invalidates('services')
     def service_create(self, context, values):
         svc = self.db.service_create(context, values)
         return jsonutils.to_primitive(svc)
 
     @rpc_common.client_exceptions(exception.ServiceNotFound)
+    @cache.invalidates('services')
     def service_destroy(self, context, service_id):
         self.db.service_destroy(context, service_id)
 
     @rpc_common.client_exceptions(exception.ServiceNotFound)
+    @cache.invalidates(_service_update_tags)
     def service_update(self, context, service, values):
         svc = self.db.service_update(context, service['id'], values)
         return jsonutils.to_primitive(svc)
 
+    def service_heartbeat(self, context, service_id):
+        self.heartbeats.heartbeat(service_id)
+
+    def invalidate_result_cache(self, context, tags):
+        cache.get_cache().invalidate_local(tags)
+
+    def get_result_cache_stats(self, context):
+        return cache.get_cache().get_stats()
+
     # spacing is run interval between DynamicLoopingCall
     # enable is a on-off for one dynamic periodic task
     @periodic_task.periodic_task(spacing=25,                                                         
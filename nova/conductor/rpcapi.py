@@ -86,3 +86,15 @@ class ConductorAPI(rpcclient.RpcProxy):
         cctxt = self.client.prepare(version='1.34')
         return cctxt.call(context, 'service_update',
                           service=service_p, values=values)
+
+    def service_heartbeat(self, context, service_id):
+        cctxt = self.client.prepare(version='1.59')
+        cctxt.cast(context, 'service_heartbeat', service_id=service_id)
+
+    def invalidate_result_cache(self, context, tags):
+        cctxt = self.client.prepare(fanout=True, version='1.60')
+        cctxt.cast(context, 'invalidate_result_cache', tags=tags)
+
+    def get_result_cache_stats(self, context):
+        cctxt = self.client.prepare(version='1.60')
+        return cctxt.call(context, 'get_result_cache_stats')
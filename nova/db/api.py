@@ -41,6 +41,10 @@ these objects be simple dictionaries.
 :enable_new_services:  when adding a new service to the database, is it in the
                        pool of available hardware (Default: True)
 
+Read-only calls accept use_slave=True to run on the database configured by
+`slave_connection`, falling back to the master if the slave fails or has not
+caught up with the requested row yet.
+
 """
 
 from oslo.config import cfg
@@ -110,29 +114,30 @@ def service_destroy(context, service_id):
     return IMPL.service_destroy(context, service_id)
 
 
-def service_get(context, service_id):
+def service_get(context, service_id, use_slave=False):
     """Get a service or raise if it does not exist."""
-    return IMPL.service_get(context, service_id)
+    return IMPL.service_get(context, service_id, use_slave=use_slave)
 
 
-def service_get_by_host_and_topic(context, host, topic):
+def service_get_by_host_and_topic(context, host, topic, use_slave=False):
     """Get a service by host it's on and topic it listens to."""
-    return IMPL.service_get_by_host_and_topic(context, host, topic)
+    return IMPL.service_get_by_host_and_topic(context, host, topic,
+                                              use_slave=use_slave)
 
 
-def service_get_all(context, disabled=None):
+def service_get_all(context, disabled=None, use_slave=False):
     """Get all services."""
-    return IMPL.service_get_all(context, disabled)
+    return IMPL.service_get_all(context, disabled, use_slave=use_slave)
 
 
-def service_get_all_by_topic(context, topic):
+def service_get_all_by_topic(context, topic, use_slave=False):
     """Get all services for a given topic."""
-    return IMPL.service_get_all_by_topic(context, topic)
+    return IMPL.service_get_all_by_topic(context, topic, use_slave=use_slave)
 
 
-def service_get_all_by_host(context, host):
+def service_get_all_by_host(context, host, use_slave=False):
     """Get all services for a given host."""
-    return IMPL.service_get_all_by_host(context, host)
+    return IMPL.service_get_all_by_host(context, host, use_slave=use_slave)
 
 
 def service_get_by_compute_host(context, host):
@@ -143,9 +148,10 @@ def service_get_by_compute_host(context, host):
     return IMPL.service_get_by_compute_host(context, host)
 
 
-def service_get_by_args(context, host, binary):
+def service_get_by_args(context, host, binary, use_slave=False):
     """Get the state of a service by node name and binary."""
-    return IMPL.service_get_by_args(context, host, binary)
+    return IMPL.service_get_by_args(context, host, binary,
+                                    use_slave=use_slave)
 
 
 def service_create(context, values):
@@ -162,27 +168,63 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_heartbeat_many(context, heartbeats):
+    """Add each {service_id: count} to report_count and touch updated_at."""
+    return IMPL.service_heartbeat_many(context, heartbeats)
+
+
 ###################
 
-def android_get_all(context, include_delete=False):
+def android_get_all(context, include_delete=False, use_slave=False):
     """Get all services."""
     if include_delete:
         read_deleted = 'yes'
     else:
         read_deleted = 'no'
-    return IMPL.android_get_all(context, read_deleted)
-
-def android_get_by_name(context, name):
+    return IMPL.android_get_all(context, read_deleted, use_slave=use_slave)
+
+def android_get_all_by_filters(context, filters, sort_key='created_at',
+                               sort_dir='desc', limit=None, marker=None,
+                               columns=None, use_slave=False):
+    """Get one page of androids that match all filters."""
+    return IMPL.android_get_all_by_filters(context, filters,
+                                           sort_key=sort_key,
+                                           sort_dir=sort_dir, limit=limit,
+                                           marker=marker, columns=columns,
+                                           use_slave=use_slave)
+
+def android_iter_by_filters(context, filters, sort_key='created_at',
+                            sort_dir='desc', limit=None, marker=None,
+                            columns=None, use_slave=False, batch_size=100):
+    """Iterate over the androids that match all filters, loading them
+    batch_size at a time.
+    """
+    return IMPL.android_iter_by_filters(context, filters,
+                                        sort_key=sort_key,
+                                        sort_dir=sort_dir, limit=limit,
+                                        marker=marker, columns=columns,
+                                        use_slave=use_slave,
+                                        batch_size=batch_size)
+
+def android_get_by_name(context, name, use_slave=False):
     '''get one android by name'''
-    return IMPL.android_get_by_name(context, name)
-def android_get_by_uid(context, uuid):
+    return IMPL.android_get_by_name(context, name, use_slave=use_slave)
+def android_get_by_uid(context, uuid, use_slave=False):
     '''get one android by name'''
-    return IMPL.android_get_by_uid(context, uuid)
+    return IMPL.android_get_by_uid(context, uuid, use_slave=use_slave)
+
+def android_get_many_by_uuid(context, uuids, use_slave=False):
+    """Get all androids whose uuid is in the given list."""
+    return IMPL.android_get_many_by_uuid(context, uuids, use_slave=use_slave)
 
 def android_create(context, values):
     """Create a service from the values dictionary."""
     return IMPL.android_create(context, values)
 
+def android_create_many(context, values_list):
+    """Create one android per values dictionary in a single transaction."""
+    return IMPL.android_create_many(context, values_list)
+
 
 def android_update(context, uuid, values):
     """Set the given properties on a service and update it.
@@ -192,6 +234,36 @@ def android_update(context, uuid, values):
     """
     return IMPL.android_update(context, uuid, values)
 
+def android_update_many(context, updates, seq=None):
+    """Apply a {uuid: values} mapping in a single transaction.
+
+    With seq, androids already updated with a seq at least as high are
+    skipped. Returns the number of androids updated.
+
+    """
+    return IMPL.android_update_many(context, updates, seq=seq)
+
+def android_transition(context, uuid, expected_states, expected_task_states,
+                       new_values):
+    """Atomically apply new_values if the android is in expected_states
+    and expected_task_states (None skips a check).
+
+    Returns the number of androids updated, 0 or 1.
+
+    """
+    return IMPL.android_transition(context, uuid, expected_states,
+                                   expected_task_states, new_values)
+
+def android_transition_many(context, uuids, expected_states,
+                            expected_task_states, new_values):
+    """android_transition() for many androids in a single transaction.
+
+    Returns the uuids of the androids updated.
+
+    """
+    return IMPL.android_transition_many(context, uuids, expected_states,
+                                        expected_task_states, new_values)
+
 def android_destroy(context, uuid):
     """Destroy the android or raise if it does not exist."""
     return IMPL.android_destroy(context, uuid)
@@ -34,6 +34,7 @@ from sqlalchemy import Boolean
 from sqlalchemy.exc import DataError
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.exc import OperationalError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
 from sqlalchemy import or_
@@ -53,6 +54,7 @@ from nova.db.sqlalchemy import models
 from nova import exception
 from nova.openstack.common.db import exception as db_exc
 from nova.openstack.common.db.sqlalchemy import session as db_session
+from nova.openstack.common.db.sqlalchemy import utils as sqlalchemyutils
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
@@ -154,11 +156,40 @@ def _retry_on_deadlock(f):
     return wrapped
 
 
+def _slave_read(f):
+    """Decorator for read-only DB API calls that may be served by a slave.
+
+    The wrapped function takes a use_slave keyword argument which is passed
+    on to model_query.  It only takes effect when slave_connection is
+    configured.  Replicas can lag behind the master, so when the slave
+    fails or does not know about the requested row yet the call is retried
+    once against the master.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        use_slave = kwargs.pop('use_slave', False)
+        if use_slave and CONF.database.slave_connection:
+            try:
+                return f(*args, use_slave=True, **kwargs)
+            except exception.NotFound:
+                LOG.debug(_("'%(func_name)s' found nothing on the slave, "
+                            "retrying on the master"),
+                          dict(func_name=f.__name__))
+            except (db_exc.DBError, OperationalError):
+                LOG.warn(_("Slave database failed running '%(func_name)s', "
+                           "retrying on the master"),
+                         dict(func_name=f.__name__))
+        return f(*args, use_slave=False, **kwargs)
+    return wrapper
+
+
 def model_query(context, model, *args, **kwargs):
     """Query helper that accounts for context's `read_deleted` field.
 
     :param context: context to query under
     :param session: if present, the session to use
+    :param use_slave: if present and slave_connection is configured, run
+            the query on the slave database. Ignored if session is given.
     :param read_deleted: if present, overrides context's read_deleted field.
     :param project_only: if present and context is user-type, then restrict
             query to match the context's project_id. If set to 'allow_none',
@@ -168,7 +199,11 @@ def model_query(context, model, *args, **kwargs):
             parameter that is a subclass of NovaBase and corresponds to the
             model parameter.
     """
-    session = kwargs.get('session') or get_session()
+    use_slave = kwargs.get('use_slave') or False
+    if CONF.database.slave_connection == '':
+        use_slave = False
+
+    session = kwargs.get('session') or get_session(slave_session=use_slave)
     read_deleted = kwargs.get('read_deleted') or context.read_deleted
     project_only = kwargs.get('project_only', False)
 
@@ -355,8 +390,9 @@ def service_destroy(context, service_id):
 
 
 
-def _service_get(context, service_id, session=None):
-    query = model_query(context, models.Service, session=session).\
+def _service_get(context, service_id, session=None, use_slave=False):
+    query = model_query(context, models.Service, session=session,
+                        use_slave=use_slave).\
                      filter_by(id=service_id)
 
 
@@ -369,13 +405,15 @@ def _service_get(context, service_id, session=None):
 
 
 @require_admin_context
-def service_get(context, service_id):
-    return _service_get(context, service_id)
+@_slave_read
+def service_get(context, service_id, use_slave=False):
+    return _service_get(context, service_id, use_slave=use_slave)
 
 
 @require_admin_context
-def service_get_all(context, disabled=None):
-    query = model_query(context, models.Service)
+@_slave_read
+def service_get_all(context, disabled=None, use_slave=False):
+    query = model_query(context, models.Service, use_slave=use_slave)
 
     if disabled is not None:
         query = query.filter_by(disabled=disabled)
@@ -384,16 +422,20 @@ def service_get_all(context, disabled=None):
 
 
 @require_admin_context
-def service_get_all_by_topic(context, topic):
-    return model_query(context, models.Service, read_deleted="no").\
+@_slave_read
+def service_get_all_by_topic(context, topic, use_slave=False):
+    return model_query(context, models.Service, read_deleted="no",
+                       use_slave=use_slave).\
                 filter_by(disabled=False).\
                 filter_by(topic=topic).\
                 all()
 
 
 @require_admin_context
-def service_get_by_host_and_topic(context, host, topic):
-    return model_query(context, models.Service, read_deleted="no").\
+@_slave_read
+def service_get_by_host_and_topic(context, host, topic, use_slave=False):
+    return model_query(context, models.Service, read_deleted="no",
+                       use_slave=use_slave).\
                 filter_by(disabled=False).\
                 filter_by(host=host).\
                 filter_by(topic=topic).\
@@ -401,8 +443,10 @@ def service_get_by_host_and_topic(context, host, topic):
 
 
 @require_admin_context
-def service_get_all_by_host(context, host):
-    return model_query(context, models.Service, read_deleted="no").\
+@_slave_read
+def service_get_all_by_host(context, host, use_slave=False):
+    return model_query(context, models.Service, read_deleted="no",
+                       use_slave=use_slave).\
                 filter_by(host=host).\
                 all()
 
@@ -422,8 +466,9 @@ def service_get_by_compute_host(context, host):
 
 
 @require_admin_context
-def service_get_by_args(context, host, binary):
-    result = model_query(context, models.Service).\
+@_slave_read
+def service_get_by_args(context, host, binary, use_slave=False):
+    result = model_query(context, models.Service, use_slave=use_slave).\
                      filter_by(host=host).\
                      filter_by(binary=binary).\
                      first()
@@ -461,29 +506,186 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+@require_admin_context
+def service_heartbeat_many(context, heartbeats):
+    """Record a {service_id: count} mapping of buffered heartbeats.
+
+    Services that missed the same number of heartbeats share a single
+    UPDATE services SET report_count=report_count+N ... WHERE id IN (...),
+    so a flush is one statement in the common case. Returns the number of
+    rows updated.
+    """
+    groups = collections.defaultdict(list)
+    for service_id, count in heartbeats.iteritems():
+        groups[count].append(service_id)
+
+    now = timeutils.utcnow()
+    updated = 0
+    session = get_session()
+    with session.begin():
+        for count, service_ids in groups.iteritems():
+            updated += model_query(context, models.Service,
+                                   session=session).\
+                        filter(models.Service.id.in_(service_ids)).\
+                        update({'report_count':
+                                    models.Service.report_count + count,
+                                'updated_at': now},
+                               synchronize_session=False)
+    return updated
+
+
 ###################
-def _android_instance_get(context, uuid, session=None):
-    query = model_query(context, models.Instance, session=session).\
+def _android_instance_get(context, uuid, session=None, use_slave=False):
+    query = model_query(context, models.Instance, session=session,
+                        use_slave=use_slave).\
                      filter_by(uuid=uuid)
     result = query.first()
     if not result:
         raise exception.AndroidNotFound(uuid=uuid)
     return result
 
-def android_get_all(context, read_deleted="no"):
-    query = model_query(context, models.Instance, read_deleted=read_deleted)
+@_slave_read
+def android_get_all(context, read_deleted="no", use_slave=False):
+    query = model_query(context, models.Instance, read_deleted=read_deleted,
+                        use_slave=use_slave)
+    return query.all()
+
+def _android_filters_query(context, filters, sort_key, sort_dir, limit,
+                            marker, columns, use_slave):
+    """Build the query of android_get_all_by_filters().
+
+    filters may hold android_state, task_state, host and verdor (exact
+    match, a list matches any of its values) and changes-since (a datetime
+    or ISO 8601 string, which also returns deleted androids unless
+    'deleted' is given). marker is the uuid of the last android of the
+    previous page. When columns is given only those columns are selected
+    and the rows are returned as dicts instead of Instance objects.
+    """
+    filters = filters.copy()
+    read_deleted = context.read_deleted
+    if 'changes-since' in filters:
+        changes_since = filters.pop('changes-since')
+        if isinstance(changes_since, basestring):
+            changes_since = timeutils.normalize_time(
+                    timeutils.parse_isotime(changes_since))
+        if 'deleted' not in filters:
+            read_deleted = 'yes'
+    else:
+        changes_since = None
+    if 'deleted' in filters:
+        read_deleted = 'yes' if filters.pop('deleted') else 'no'
+
+    if columns:
+        entities = [getattr(models.Instance, column) for column in columns]
+        query = model_query(context, *entities, read_deleted=read_deleted,
+                            base_model=models.Instance, use_slave=use_slave)
+    else:
+        query = model_query(context, models.Instance,
+                            read_deleted=read_deleted, use_slave=use_slave)
+
+    if changes_since is not None:
+        query = query.filter(models.Instance.updated_at >= changes_since)
+    for key in ('android_state', 'task_state', 'host', 'verdor'):
+        if key not in filters:
+            continue
+        value = filters[key]
+        column = getattr(models.Instance, key)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            query = query.filter(column.in_(value))
+        else:
+            query = query.filter(column == value)
+
+    if marker is not None:
+        marker_row = model_query(context, models.Instance,
+                                 read_deleted="yes", use_slave=use_slave).\
+                        filter_by(uuid=marker).\
+                        first()
+        if not marker_row:
+            raise exception.MarkerNotFound(marker=marker)
+        marker = marker_row
+
+    return sqlalchemyutils.paginate_query(query, models.Instance, limit,
+                                          [sort_key, 'id'], marker=marker,
+                                          sort_dir=sort_dir)
+
+
+@_slave_read
+def android_get_all_by_filters(context, filters, sort_key='created_at',
+                               sort_dir='desc', limit=None, marker=None,
+                               columns=None, use_slave=False):
+    """Return one page of androids matching all filters."""
+    query = _android_filters_query(context, filters, sort_key, sort_dir,
+                                   limit, marker, columns, use_slave)
+    if columns:
+        return [dict(zip(columns, row)) for row in query.all()]
     return query.all()
 
-def android_get_by_name(context, name):
-    return model_query(context, models.Instance, read_deleted="no").\
+
+def _iter_android_rows(first, rows, columns):
+    for row in itertools.chain([first], rows):
+        if columns:
+            yield dict(zip(columns, row))
+        else:
+            yield row
+
+
+@_slave_read
+def android_iter_by_filters(context, filters, sort_key='created_at',
+                            sort_dir='desc', limit=None, marker=None,
+                            columns=None, use_slave=False, batch_size=100):
+    """Return an iterator over the androids of android_get_all_by_filters().
+
+    Rows are fetched and turned into Instance objects batch_size at a time
+    (Query.yield_per), so the caller never holds more than one batch of
+    them.  The marker lookup and the query run, and the first row is read,
+    before returning, so those can still be retried on the master when the
+    slave fails or lags; later batches are not.
+    """
+    query = _android_filters_query(context, filters, sort_key, sort_dir,
+                                   limit, marker, columns, use_slave)
+    rows = iter(query.yield_per(batch_size))
+    first = next(rows, None)
+    if first is None:
+        return iter([])
+    return _iter_android_rows(first, rows, columns)
+
+@_slave_read
+def android_get_by_name(context, name, use_slave=False):
+    return model_query(context, models.Instance, read_deleted="no",
+                       use_slave=use_slave).\
                 filter_by(display_name=name).\
                 all()
 
-def android_get_by_uid(context, uuid):
-    return _android_instance_get(context, uuid)
+@_slave_read
+def android_get_by_uid(context, uuid, use_slave=False):
+    return _android_instance_get(context, uuid, use_slave=use_slave)
 
-@require_admin_context
-def android_create(context, values):
+def _android_get_many_by_uuid(context, uuids, use_slave):
+    return model_query(context, models.Instance, read_deleted="no",
+                       use_slave=use_slave).\
+                filter(models.Instance.uuid.in_(uuids)).\
+                all()
+
+@_slave_read
+def android_get_many_by_uuid(context, uuids, use_slave=False):
+    """Return the androids with the given uuids, skipping missing ones.
+
+    A slave that lags behind does not raise NotFound for the androids it
+    does not know yet, it leaves them out; those are read again from the
+    master.
+    """
+    if not uuids:
+        return []
+    result = _android_get_many_by_uuid(context, uuids, use_slave)
+    if use_slave:
+        found = set(android['uuid'] for android in result)
+        missing = [instance_uuid for instance_uuid in set(uuids)
+                   if instance_uuid not in found]
+        if missing:
+            result.extend(_android_get_many_by_uuid(context, missing, False))
+    return result
+
+def _android_prepare_values(context, values):
     if not values.get('uuid'):
         values['uuid'] = str(uuid.uuid4())
     if not values.get('project_id'):
@@ -492,6 +694,23 @@ def android_create(context, values):
         values['user_id'] = context.user_id
     if 'display_name' not in values.keys():
         values['display_name'] = values['name']
+    return values
+
+def _android_column_values(values):
+    """Return only the values that map to columns of the instances table.
+
+    Callers ship whole instance dicts around, so drop the primary key,
+    the uuid used for lookup and anything that is not a real column.
+    """
+    columns = models.Instance.__table__.columns.keys()
+    result = dict((k, v) for k, v in values.iteritems()
+                  if k in columns and k not in ('id', 'uuid'))
+    return convert_datetimes(result, 'created_at', 'updated_at',
+                             'deleted_at', 'launched_at', 'terminated_at')
+
+@require_admin_context
+def android_create(context, values):
+    values = _android_prepare_values(context, values)
     instance_ref = models.Instance()
     instance_ref.update(values)
     session = get_session()
@@ -499,6 +718,32 @@ def android_create(context, values):
         session.add(instance_ref)
     return instance_ref
 
+@require_admin_context
+def android_create_many(context, values_list):
+    """Insert all androids with one multi-row INSERT in one transaction."""
+    if not values_list:
+        return []
+    columns = models.Instance.__table__.columns.keys()
+    rows = []
+    for values in values_list:
+        values = _android_prepare_values(context, values)
+        rows.append(dict((k, v) for k, v in values.iteritems()
+                         if k in columns))
+    # NOTE: executemany() compiles the INSERT from the first row, so every
+    # row has to carry the same keys.
+    keys = set(itertools.chain.from_iterable(rows))
+    for row in rows:
+        for key in keys:
+            row.setdefault(key, None)
+    uuids = [row['uuid'] for row in rows]
+    session = get_session()
+    with session.begin():
+        session.execute(models.Instance.__table__.insert(), rows)
+        result = model_query(context, models.Instance, session=session).\
+                    filter(models.Instance.uuid.in_(uuids)).\
+                    all()
+    return result
+
 @require_admin_context
 def android_update(context, uuid, values):
     if 'display_name' not in values.keys():
@@ -509,6 +754,105 @@ def android_update(context, uuid, values):
         instance_ref.update(values)
     return instance_ref
 
+@require_admin_context
+def android_update_many(context, updates, seq=None):
+    """Apply a {uuid: values} mapping in one transaction.
+
+    Androids that receive identical values share a single
+    UPDATE ... WHERE uuid IN (...), so a batch transition costs one
+    statement. Returns the number of rows updated.
+
+    With seq, androids already updated with a seq at least as high are
+    left alone, and the others record seq, so that batches applied out
+    of order cannot put an android back in an older state.
+    """
+    groups = collections.defaultdict(list)
+    for instance_uuid, values in updates.iteritems():
+        values = _android_column_values(values)
+        if values:
+            if seq is not None:
+                values['state_seq'] = seq
+            groups[tuple(sorted(values.items()))].append(instance_uuid)
+
+    count = 0
+    session = get_session()
+    with session.begin():
+        for values, uuids in groups.iteritems():
+            query = model_query(context, models.Instance, session=session).\
+                        filter(models.Instance.uuid.in_(uuids))
+            if seq is not None:
+                query = query.filter(or_(models.Instance.state_seq == None,
+                                         models.Instance.state_seq < seq))
+            count += query.update(dict(values), synchronize_session=False)
+    return count
+
+def _state_in(column, states):
+    # NOTE: IN (...) never matches NULL, None needs its own clause.
+    states = set(states)
+    clauses = []
+    if None in states:
+        states.discard(None)
+        clauses.append(column == None)
+    if states:
+        clauses.append(column.in_(states))
+    return or_(*clauses)
+
+def _android_states_query(context, session, expected_states,
+                          expected_task_states):
+    query = model_query(context, models.Instance, session=session)
+    if expected_states is not None:
+        query = query.filter(_state_in(models.Instance.android_state,
+                                       expected_states))
+    if expected_task_states is not None:
+        query = query.filter(_state_in(models.Instance.task_state,
+                                       expected_task_states))
+    return query
+
+@require_admin_context
+def android_transition(context, uuid, expected_states, expected_task_states,
+                       new_values):
+    """Apply new_values to the android if it is still in the expected
+    states, with a single UPDATE ... WHERE uuid=? AND android_state IN (...)
+    AND task_state IN (...).
+
+    None for expected_states or expected_task_states skips that check.
+    Returns the number of rows updated, 0 when the android left the
+    expected states (or does not exist).
+    """
+    values = _android_column_values(new_values)
+    session = get_session()
+    with session.begin():
+        query = _android_states_query(context, session, expected_states,
+                                      expected_task_states).\
+                    filter_by(uuid=uuid)
+        return query.update(values, synchronize_session=False)
+
+@require_admin_context
+def android_transition_many(context, uuids, expected_states,
+                            expected_task_states, new_values):
+    """android_transition() for many androids in one transaction.
+
+    The androids still in the expected states are selected FOR UPDATE
+    and then updated, so the uuids returned are exactly the androids
+    moved; the others left the expected states (or do not exist).
+    """
+    if not uuids:
+        return []
+    values = _android_column_values(new_values)
+    session = get_session()
+    with session.begin():
+        rows = _android_states_query(context, session, expected_states,
+                                     expected_task_states).\
+                    filter(models.Instance.uuid.in_(uuids)).\
+                    with_lockmode('update').\
+                    all()
+        moved = [row['uuid'] for row in rows]
+        if moved:
+            model_query(context, models.Instance, session=session).\
+                    filter(models.Instance.uuid.in_(moved)).\
+                    update(values, synchronize_session=False)
+    return moved
+
 @require_admin_context
 def android_destroy(context, uuid):
     session = get_session()
@@ -100,3 +100,7 @@ class Instance(BASE, NovaBase):
     # which node incharge this instances
     # host is hostname, use send rpc msg
     host = Column(String(64))
+
+    # sequence number of the last agent state update written, see
+    # android_update_many()
+    state_seq = Column(BigInteger)
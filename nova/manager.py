@@ -92,7 +92,8 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         apis = []
         if additional_apis:
             apis.extend(additional_apis)
-        base_rpc = baserpc.BaseRPCAPI(self.service_name, backdoor_port)
+        base_rpc = baserpc.BaseRPCAPI(self.service_name, backdoor_port,
+                                      manager=self)
         apis.extend([self, base_rpc])
         serializer = objects_base.NovaObjectSerializer()
         return rpc_dispatcher.RpcDispatcher(apis, serializer)
@@ -110,6 +111,13 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         """
         pass
 
+    def cleanup_host(self):
+        """Hook to do cleanup work when the service shuts down.
+
+        Child classes should override this method.
+        """
+        pass
+
     def pre_start_hook(self):
         """Hook to provide the manager the ability to do additional
         start-up work before any RPC queues/consumers are created. This is
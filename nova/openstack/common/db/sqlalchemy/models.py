@@ -26,9 +26,11 @@ import six
 
 from sqlalchemy import Column, Integer
 from sqlalchemy import DateTime
+from sqlalchemy.orm import class_mapper
 from sqlalchemy.orm import object_mapper
 
 from nova.openstack.common.db.sqlalchemy import session as sa
+from nova.openstack.common import jsonutils
 from nova.openstack.common import timeutils
 
 
@@ -91,6 +93,47 @@ class ModelBase(object):
         local.update(joined)
         return local.iteritems()
 
+    @classmethod
+    def _column_keys(cls):
+        keys = cls.__dict__.get('_cached_column_keys')
+        if keys is None:
+            keys = dict(class_mapper(cls).columns).keys()
+            cls._cached_column_keys = keys
+        return keys
+
+    def to_primitive(self, convert_instances=False, convert_datetime=True,
+                     level=0, max_depth=3):
+        """Return the same dict as jsonutils.to_primitive(self).
+
+        Reads the columns straight off the row instead of going through
+        __iter__/iteritems() and a second, generic walk of the result.
+        """
+        values = dict((key, getattr(self, key))
+                      for key in self._column_keys())
+        if hasattr(self, '_extra_keys'):
+            values.update((key, getattr(self, key))
+                          for key in self._extra_keys())
+        values.update((k, v) for k, v in six.iteritems(self.__dict__)
+                      if not k[0] == '_')
+        level += 1
+        if level > max_depth:
+            return '?'
+        return dict((k, jsonutils.to_primitive(v, convert_instances,
+                                               convert_datetime, level,
+                                               max_depth))
+                    for k, v in six.iteritems(values))
+
+
+def _model_to_primitive(value, convert_instances, convert_datetime,
+                        level, max_depth):
+    if level > max_depth:
+        return '?'
+    return value.to_primitive(convert_instances, convert_datetime,
+                              level, max_depth)
+
+
+jsonutils.register_primitive(ModelBase, _model_to_primitive)
+
 
 class TimestampMixin(object):
     created_at = Column(DateTime, default=timeutils.utcnow)
@@ -30,6 +30,10 @@ This module provides a few things:
 
     3) This sets up anyjson to use the loads() and dumps() wrappers if anyjson
     is available.
+
+dumps() encodes with the first of _DUMPS_BACKENDS that is installed, see
+set_backend().  loads() always uses the stdlib json module so that decoded
+strings stay unicode.
 '''
 
 
@@ -61,6 +65,95 @@ _nasty_type_tests = [inspect.ismodule, inspect.isclass, inspect.ismethod,
 _simple_types = (six.string_types + six.integer_types
                  + (type(None), bool, float))
 
+# NOTE: json modules that accept the stdlib dumps() arguments (default=
+# in particular), fastest first.
+_DUMPS_BACKENDS = ('simplejson', 'json')
+
+
+def _find_backend(names):
+    for name in names:
+        module = importutils.try_import(name)
+        if module is not None:
+            return module
+    return json
+
+
+_dumps_backend = _find_backend(_DUMPS_BACKENDS)
+
+
+def set_backend(name):
+    """Encode with the named json module, e.g. 'json' for the stdlib."""
+    global _dumps_backend
+    _dumps_backend = importutils.import_module(name)
+
+
+def get_backend():
+    return _dumps_backend.__name__
+
+
+def _identity(value, convert_instances, convert_datetime, level, max_depth):
+    return value
+
+
+def _datetime_to_primitive(value, convert_instances, convert_datetime,
+                           level, max_depth):
+    if convert_datetime:
+        return timeutils.strtime(value)
+    return value
+
+
+def _dict_to_primitive(value, convert_instances, convert_datetime,
+                       level, max_depth):
+    if level > max_depth:
+        return '?'
+    return dict((k, v if type(v) in _primitive_types else
+                 to_primitive(v, convert_instances, convert_datetime,
+                              level, max_depth))
+                for k, v in value.iteritems())
+
+
+def _list_to_primitive(value, convert_instances, convert_datetime,
+                       level, max_depth):
+    if level > max_depth:
+        return '?'
+    return [v if type(v) in _primitive_types else
+            to_primitive(v, convert_instances, convert_datetime,
+                         level, max_depth)
+            for v in value]
+
+
+_primitive_types = frozenset(_simple_types)
+
+# NOTE: handlers by type, called as handler(value, convert_instances,
+# convert_datetime, level, max_depth).  A subclass of a registered type
+# uses the handler of its nearest registered base class.
+_handlers = {datetime.datetime: _datetime_to_primitive,
+             dict: _dict_to_primitive,
+             list: _list_to_primitive,
+             tuple: _list_to_primitive}
+_handlers.update((t, _identity) for t in _simple_types)
+
+# NOTE: every type to_primitive() has seen, mapped to its handler or to
+# None when it takes the generic path below.
+_type_handlers = _handlers.copy()
+
+
+def register_primitive(cls, handler):
+    """Convert instances of cls (and its subclasses) with handler."""
+    _handlers[cls] = handler
+    _type_handlers.clear()
+    _type_handlers.update(_handlers)
+
+
+def _find_handler(value_type):
+    handler = None
+    for base in getattr(value_type, '__mro__', ()):
+        handler = _handlers.get(base)
+        if handler is not None:
+            break
+    _type_handlers[value_type] = handler
+    return handler
+
 
 def to_primitive(value, convert_instances=False, convert_datetime=True,
                  level=0, max_depth=3):
@@ -77,27 +170,17 @@ def to_primitive(value, convert_instances=False, convert_datetime=True,
     Therefore, convert_instances=True is lossy ... be aware.
 
     """
-    # handle obvious types first - order of basic types determined by running
-    # full tests on nova project, resulting in the following counts:
-    # 572754 <type 'NoneType'>
-    # 460353 <type 'int'>
-    # 379632 <type 'unicode'>
-    # 274610 <type 'str'>
-    # 199918 <type 'dict'>
-    # 114200 <type 'datetime.datetime'>
-    #  51817 <type 'bool'>
-    #  26164 <type 'list'>
-    #   6491 <type 'float'>
-    #    283 <type 'tuple'>
-    #     19 <type 'long'>
-    if isinstance(value, _simple_types):
-        return value
-
-    if isinstance(value, datetime.datetime):
-        if convert_datetime:
-            return timeutils.strtime(value)
-        else:
-            return value
+    # NOTE: dispatch on the exact type first, the common types (None, int,
+    # unicode, str, dict, datetime, bool, list) never reach the generic
+    # isinstance() walk below.
+    value_type = type(value)
+    try:
+        handler = _type_handlers[value_type]
+    except KeyError:
+        handler = _find_handler(value_type)
+    if handler is not None:
+        return handler(value, convert_instances, convert_datetime,
+                       level, max_depth)
 
     # value of itertools.count doesn't get caught by nasty_type_tests
     # and results in infinite loop when list(value) is called.
@@ -159,7 +242,7 @@ def to_primitive(value, convert_instances=False, convert_datetime=True,
 
 
 def dumps(value, default=to_primitive, **kwargs):
-    return json.dumps(value, default=default, **kwargs)
+    return _dumps_backend.dumps(value, default=default, **kwargs)
 
 
 def loads(s):
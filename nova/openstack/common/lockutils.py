@@ -16,12 +16,13 @@
 #    under the License.
 
 
+import bisect
+import collections
 import contextlib
 import errno
 import functools
 import os
 import time
-import weakref
 
 from eventlet import semaphore
 from oslo.config import cfg
@@ -30,6 +31,7 @@ from nova.openstack.common import fileutils
 from nova.openstack.common.gettextutils import _  # noqa
 from nova.openstack.common import local
 from nova.openstack.common import log as logging
+from nova.openstack.common import uuidutils
 
 
 LOG = logging.getLogger(__name__)
@@ -39,7 +41,12 @@ util_opts = [
     cfg.BoolOpt('disable_process_locking', default=False,
                 help='Whether to disable inter-process locks'),
     cfg.StrOpt('lock_path',
-               help=('Directory to use for lock files.'))
+               help=('Directory to use for lock files.')),
+    cfg.IntOpt('lock_file_cache_size',
+               default=64,
+               help='Number of lock files of unused external locks kept '
+                    'open, so that taking the lock again does not reopen '
+                    'its file'),
 ]
 
 
@@ -69,12 +76,14 @@ class _InterProcessLock(object):
     so lock files must be accessed only using this abstraction.
     """
 
-    def __init__(self, name):
+    def __init__(self, name, keep_open=False):
         self.lockfile = None
         self.fname = name
+        self.keep_open = keep_open
 
     def __enter__(self):
-        self.lockfile = open(self.fname, 'w')
+        if self.lockfile is None:
+            self.lockfile = open(self.fname, 'w')
 
         while True:
             try:
@@ -95,11 +104,18 @@ class _InterProcessLock(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         try:
             self.unlock()
-            self.lockfile.close()
+            if not self.keep_open:
+                self.close()
         except IOError:
             LOG.exception(_("Could not release the acquired lock `%s`"),
                           self.fname)
 
+    def close(self):
+        """Close the lock file; it must not be locked by anyone here."""
+        if self.lockfile is not None:
+            self.lockfile.close()
+            self.lockfile = None
+
     def trylock(self):
         raise NotImplementedError()
 
@@ -130,14 +146,191 @@ else:
     import fcntl
     InterProcessLock = _PosixLock
 
-_semaphores = weakref.WeakValueDictionary()
+class ReaderWriterLock(object):
+    """A lock for green threads that many readers can share.
+
+    A waiting writer keeps new readers out, so a steady stream of readers
+    cannot starve writers.
+    """
+
+    def __init__(self):
+        self._readers = 0
+        self._readers_lock = semaphore.Semaphore()
+        self._turnstile = semaphore.Semaphore()
+        self._write = semaphore.Semaphore()
+
+    @contextlib.contextmanager
+    def read(self):
+        """Hold the lock shared with other readers."""
+        self._turnstile.acquire()
+        self._turnstile.release()
+        with self._readers_lock:
+            self._readers += 1
+            if self._readers == 1:
+                # The first reader takes the lock for all of them
+                self._write.acquire()
+        try:
+            yield self
+        finally:
+            self._readers -= 1
+            if not self._readers:
+                self._write.release()
+
+    @contextlib.contextmanager
+    def write(self):
+        """Hold the lock exclusively."""
+        with self._turnstile:
+            self._write.acquire()
+        try:
+            yield self
+        finally:
+            self._write.release()
+
+
+class _LockRegistry(object):
+    """Reference counted map of names to lock objects.
+
+    A lock lives while somebody holds or waits for it.  When idle_size is
+    given, up to idle_size() unused locks are kept as well and the least
+    recently used ones are dropped first.  close is called on every lock
+    dropped.
+
+    Like the rest of this module, this relies on green threads not
+    switching between the lookups and the updates.
+    """
+
+    def __init__(self, factory, idle_size=None, close=None):
+        self._factory = factory
+        self._idle_size = idle_size
+        self._close = close
+        self._active = {}
+        self._idle = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._active) + len(self._idle)
+
+    def __contains__(self, name):
+        return name in self._active or name in self._idle
+
+    def acquire(self, name):
+        """Return the lock of name, creating it if needed."""
+        entry = self._active.get(name)
+        if entry is None:
+            lock = self._idle.pop(name, None)
+            if lock is None:
+                lock = self._factory(name)
+            entry = self._active[name] = [lock, 0]
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, name):
+        """Drop a reference taken by acquire()."""
+        entry = self._active[name]
+        entry[1] -= 1
+        if entry[1]:
+            return
+        del self._active[name]
+        self._idle[name] = entry[0]
+        idle_size = self._idle_size() if self._idle_size else 0
+        while len(self._idle) > idle_size:
+            _name, lock = self._idle.popitem(last=False)
+            if self._close is not None:
+                self._close(lock)
+
+
+class _Histogram(object):
+    """Durations in seconds, counted in power of ten buckets."""
+
+    BOUNDS = (0.001, 0.01, 0.1, 1.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        """The upper bound of the last bucket is None (unbounded)."""
+        return {'count': sum(self.counts),
+                'total': self.total,
+                'max': self.max,
+                'buckets': zip(self.BOUNDS + (None,), self.counts)}
+
+
+class _LockStats(object):
+    def __init__(self):
+        self.wait = _Histogram()
+        self.hold = _Histogram()
+
+    def to_dict(self):
+        return {'wait': self.wait.to_dict(), 'hold': self.hold.to_dict()}
+
+
+_semaphores = _LockRegistry(lambda name: ReaderWriterLock())
+_lock_files = _LockRegistry(
+    lambda path: InterProcessLock(path, keep_open=True),
+    idle_size=lambda: CONF.lock_file_cache_size,
+    close=lambda lock: lock.close())
+_lock_paths = set()
+_stats = collections.defaultdict(_LockStats)
+_MAX_STATS_KEYS = 256
+
+
+def _stats_key(name):
+    """Locks are counted by name up to the first '-', so that the locks
+    of e.g. every android ('android-<uuid>') add up.  Locks named by a
+    bare uuid share one '<uuid>' entry, and once there are
+    _MAX_STATS_KEYS entries new names are counted under '<other>'.
+    """
+    if uuidutils.is_uuid_like(name):
+        return '<uuid>'
+    key = name.split('-', 1)[0]
+    if key not in _stats and len(_stats) >= _MAX_STATS_KEYS:
+        return '<other>'
+    return key
+
+
+def get_lock_stats():
+    """Return wait and hold time histograms by lock name prefix.
+
+    Wait time runs from asking for a lock until holding it, including the
+    lock file of external locks; hold time until releasing it.
+    """
+    return dict((key, stats.to_dict()) for key, stats in _stats.iteritems())
 
 
 @contextlib.contextmanager
-def lock(name, lock_file_prefix=None, external=False, lock_path=None):
+def _timed(name, requested):
+    stats = _stats[_stats_key(name)]
+    acquired = time.time()
+    stats.wait.add(acquired - requested)
+    try:
+        yield
+    finally:
+        stats.hold.add(time.time() - acquired)
+
+
+@contextlib.contextmanager
+def _semaphore(name, shared):
+    """Hold the in-process lock of name, keeping it registered meanwhile."""
+    sem = _semaphores.acquire(name)
+    try:
+        with (sem.read() if shared else sem.write()):
+            yield sem
+    finally:
+        _semaphores.release(name)
+
+
+@contextlib.contextmanager
+def lock(name, lock_file_prefix=None, external=False, lock_path=None,
+         shared=False):
     """Context based lock
 
-    This function yields a `semaphore.Semaphore` instance unless external is
+    This function yields a `ReaderWriterLock` instance unless external is
     True, in which case, it'll yield an InterProcessLock instance.
 
     :param lock_file_prefix: The lock_file_prefix argument is used to provide
@@ -151,18 +344,18 @@ def lock(name, lock_file_prefix=None, external=False, lock_path=None):
     :param lock_path: The lock_path keyword argument is used to specify a
     special location for external lock files to live. If nothing is set, then
     CONF.lock_path is used as a default.
+
+    :param shared: Whether the lock may be held together with other shared
+    holders of the same name. Only green threads of this process share a
+    lock, external locks are always exclusive.
     """
+    requested = time.time()
+    shared = shared and not (external and not CONF.disable_process_locking)
+
     # NOTE(soren): If we ever go natively threaded, this will be racy.
     #              See http://stackoverflow.com/questions/5390569/dyn
     #              amically-allocating-and-destroying-mutexes
-    sem = _semaphores.get(name, semaphore.Semaphore())
-    if name not in _semaphores:
-        # this check is not racy - we're already holding ref locally
-        # so GC won't remove the item and there was no IO switch
-        # (only valid in greenthreads)
-        _semaphores[name] = sem
-
-    with sem:
+    with _semaphore(name, shared) as sem:
         LOG.debug(_('Got semaphore "%(lock)s"'), {'lock': name})
 
         # NOTE(mikal): I know this looks odd
@@ -180,9 +373,11 @@ def lock(name, lock_file_prefix=None, external=False, lock_path=None):
                 if not local_lock_path:
                     raise cfg.RequiredOptError('lock_path')
 
-                if not os.path.exists(local_lock_path):
-                    fileutils.ensure_tree(local_lock_path)
-                    LOG.info(_('Created lock path: %s'), local_lock_path)
+                if local_lock_path not in _lock_paths:
+                    if not os.path.exists(local_lock_path):
+                        fileutils.ensure_tree(local_lock_path)
+                        LOG.info(_('Created lock path: %s'), local_lock_path)
+                    _lock_paths.add(local_lock_path)
 
                 def add_prefix(name, prefix):
                     if not prefix:
@@ -197,23 +392,27 @@ def lock(name, lock_file_prefix=None, external=False, lock_path=None):
 
                 lock_file_path = os.path.join(local_lock_path, lock_file_name)
 
+                lock = _lock_files.acquire(lock_file_path)
                 try:
-                    lock = InterProcessLock(lock_file_path)
-                    with lock as lock:
+                    with lock:
                         LOG.debug(_('Got file lock "%(lock)s" at %(path)s'),
                                   {'lock': name, 'path': lock_file_path})
-                        yield lock
+                        with _timed(name, requested):
+                            yield lock
                 finally:
+                    _lock_files.release(lock_file_path)
                     LOG.debug(_('Released file lock "%(lock)s" at %(path)s'),
                               {'lock': name, 'path': lock_file_path})
             else:
-                yield sem
+                with _timed(name, requested):
+                    yield sem
 
         finally:
             local.strong_store.locks_held.remove(name)
 
 
-def synchronized(name, lock_file_prefix=None, external=False, lock_path=None):
+def synchronized(name, lock_file_prefix=None, external=False, lock_path=None,
+                 shared=False):
     """Synchronization decorator.
 
     Decorating a method like so::
@@ -235,12 +434,16 @@ def synchronized(name, lock_file_prefix=None, external=False, lock_path=None):
            ...
 
     This way only one of either foo or bar can be executing at a time.
+
+    Methods decorated with shared=True run together, but never while a
+    method holding the lock exclusively runs.
     """
 
     def wrap(f):
         @functools.wraps(f)
         def inner(*args, **kwargs):
-            with lock(name, lock_file_prefix, external, lock_path):
+            with lock(name, lock_file_prefix, external, lock_path,
+                      shared=shared):
                 LOG.debug(_('Got semaphore / lock "%(function)s"'),
                           {'function': f.__name__})
                 return f(*args, **kwargs)
@@ -29,6 +29,8 @@ It also allows setting of formatting information through conf.
 
 """
 
+import atexit
+import collections
 import ConfigParser
 import cStringIO
 import inspect
@@ -40,6 +42,7 @@ import os
 import sys
 import traceback
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from nova.openstack.common.gettextutils import _
@@ -141,6 +144,14 @@ log_opts = [
     cfg.BoolOpt('fatal_deprecations',
                 default=False,
                 help='make deprecations fatal'),
+    cfg.BoolOpt('log_async',
+                default=False,
+                help='Format and write log records in a separate green '
+                     'thread instead of in the caller'),
+    cfg.IntOpt('log_async_max_pending',
+               default=10000,
+               help='Number of log records log_async queues before the '
+                    'caller writes them itself'),
 
     # NOTE(mikal): there are two options here because sometimes we are handed
     # a full instance (and could include more information), and other times we
@@ -167,6 +178,13 @@ CONF.register_opts(log_opts)
 logging.AUDIT = logging.INFO + 1
 logging.addLevelName(logging.AUDIT, 'AUDIT')
 
+CRITICAL = logging.CRITICAL
+ERROR = logging.ERROR
+WARNING = WARN = logging.WARNING
+AUDIT = logging.AUDIT
+INFO = logging.INFO
+DEBUG = logging.DEBUG
+
 
 try:
     NullHandler = logging.NullHandler
@@ -182,6 +200,28 @@ except AttributeError:  # NOTE(jkoelker) NullHandler added in Python 2.7
             self.lock = None
 
 
+def _source_file(path):
+    if path[-4:].lower() in ('.pyc', '.pyo'):
+        path = path[:-4] + '.py'
+    return os.path.normcase(path)
+
+
+# NOTE: frames of these files are skipped when looking for the caller of a
+# log method, like Logger.findCaller() skips the logging module itself.
+_SRCFILES = (logging._srcfile, _source_file(__file__))
+
+
+def _find_caller(self):
+    """Logger.findCaller() that also skips the adapters of this module."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if os.path.normcase(code.co_filename) not in _SRCFILES:
+            return code.co_filename, frame.f_lineno, code.co_name
+        frame = frame.f_back
+    return '(unknown file)', 0, '(unknown function)'
+
+
 def _dictify_context(context):
     if context is None:
         return None
@@ -230,12 +270,41 @@ class LazyAdapter(BaseLoggerAdapter):
 
 
 class ContextAdapter(BaseLoggerAdapter):
-    warn = logging.LoggerAdapter.warning
 
     def __init__(self, logger, project_name, version_string):
         self.logger = logger
         self.project = project_name
         self.version = version_string
+        logger.findCaller = _find_caller.__get__(logger)
+
+    # NOTE: logging.LoggerAdapter builds the extra data of a record before
+    # the logger checks the level; check it first, so that disabled (DEBUG)
+    # calls cost no more than the check.
+    def log(self, level, msg, *args, **kwargs):
+        if self.logger.isEnabledFor(level):
+            msg, kwargs = self.process(msg, kwargs)
+            self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    warn = warning
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs['exc_info'] = 1
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.log(logging.CRITICAL, msg, *args, **kwargs)
 
     @property
     def handlers(self):
@@ -269,10 +338,9 @@ class ContextAdapter(BaseLoggerAdapter):
             if instance_uuid:
                 instance_extra = (CONF.instance_uuid_format
                                   % {'uuid': instance_uuid})
-        extra.update({'instance': instance_extra})
-
-        extra.update({"project": self.project})
-        extra.update({"version": self.version})
+        extra['instance'] = instance_extra
+        extra['project'] = self.project
+        extra['version'] = self.version
         extra['extra'] = extra.copy()
         return msg, kwargs
 
@@ -435,6 +503,13 @@ def _setup_logging_from_conf():
         else:
             handler.setFormatter(ContextFormatter(datefmt=datefmt))
 
+    if CONF.log_async:
+        handler = AsyncHandler(log_root.handlers[:],
+                               max_pending=CONF.log_async_max_pending)
+        for target in handler.handlers:
+            log_root.removeHandler(target)
+        log_root.addHandler(handler)
+
     if CONF.debug:
         log_root.setLevel(logging.DEBUG)
     elif CONF.verbose:
@@ -493,6 +568,25 @@ class ContextFormatter(logging.Formatter):
 
     """
 
+    def __init__(self, fmt=None, datefmt=None):
+        logging.Formatter.__init__(self, fmt, datefmt)
+        self._formats = {}
+        self._exception_prefix = None
+
+    def _get_format(self, context, debug):
+        # NOTE: the format strings are read from CONF once per formatter;
+        # setup() creates new formatters.
+        fmt = self._formats.get((context, debug))
+        if fmt is None:
+            if context:
+                fmt = CONF.logging_context_format_string
+            else:
+                fmt = CONF.logging_default_format_string
+            if debug and CONF.logging_debug_format_suffix:
+                fmt += " " + CONF.logging_debug_format_suffix
+            self._formats[(context, debug)] = fmt
+        return fmt
+
     def format(self, record):
         """Uses contextstring if request_id is set, otherwise default."""
         # NOTE(sdague): default the fancier formating params
@@ -502,14 +596,9 @@ class ContextFormatter(logging.Formatter):
             if key not in record.__dict__:
                 record.__dict__[key] = ''
 
-        if record.__dict__.get('request_id', None):
-            self._fmt = CONF.logging_context_format_string
-        else:
-            self._fmt = CONF.logging_default_format_string
-
-        if (record.levelno == logging.DEBUG and
-                CONF.logging_debug_format_suffix):
-            self._fmt += " " + CONF.logging_debug_format_suffix
+        self._fmt = self._get_format(
+                bool(record.__dict__.get('request_id', None)),
+                record.levelno == logging.DEBUG)
 
         # Cache this on the record, Logger will respect our formated copy
         if record.exc_info:
@@ -527,12 +616,14 @@ class ContextFormatter(logging.Formatter):
         lines = stringbuffer.getvalue().split('\n')
         stringbuffer.close()
 
-        if CONF.logging_exception_prefix.find('%(asctime)') != -1:
+        if self._exception_prefix is None:
+            self._exception_prefix = CONF.logging_exception_prefix
+        if self._exception_prefix.find('%(asctime)') != -1:
             record.asctime = self.formatTime(record, self.datefmt)
 
         formatted_lines = []
         for line in lines:
-            pl = CONF.logging_exception_prefix % record.__dict__
+            pl = self._exception_prefix % record.__dict__
             fl = '%s%s' % (pl, line)
             formatted_lines.append(fl)
         return '\n'.join(formatted_lines)
@@ -553,6 +644,58 @@ class ColorHandler(logging.StreamHandler):
         return logging.StreamHandler.format(self, record)
 
 
+class AsyncHandler(logging.Handler):
+    """Pass records on to other handlers from a separate green thread.
+
+    The caller only merges the message with its arguments and queues the
+    record; formatting and writing happen when the writer green thread
+    runs.  Once max_pending records are queued the caller writes them
+    itself, so a writer that cannot keep up slows the callers down instead
+    of using more memory.  Whatever is left is written at exit.
+    """
+
+    def __init__(self, handlers, level=logging.NOTSET, max_pending=10000):
+        logging.Handler.__init__(self, level)
+        self.handlers = handlers
+        self.max_pending = max_pending
+        self._pending = collections.deque()
+        self._writer = None
+        atexit.register(self.flush)
+
+    def emit(self, record):
+        try:
+            # NOTE: arguments may change before the record is written
+            record.msg = record.getMessage()
+            record.args = None
+        except Exception:
+            self.handleError(record)
+            return
+        self._pending.append(record)
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+        elif self._writer is None:
+            self._writer = greenthread.spawn(self._write)
+
+    def _write(self):
+        self._writer = None
+        self.flush()
+
+    def flush(self):
+        while self._pending:
+            record = self._pending.popleft()
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        self.flush()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+
 class DeprecatedConfig(Exception):
     message = _("Fatal call to deprecated config: %(msg)s")
 
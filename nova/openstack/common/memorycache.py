@@ -18,6 +18,9 @@
 
 """Super simple fake memcache client."""
 
+import collections
+import heapq
+
 from oslo.config import cfg
 
 from nova.openstack.common import timeutils
@@ -26,6 +29,11 @@ memcache_opts = [
     cfg.ListOpt('memcached_servers',
                 default=None,
                 help='Memcached servers or None for in process cache.'),
+    cfg.IntOpt('memorycache_max_size',
+               default=0,
+               help='Maximum number of keys kept by the in process cache, '
+                    'least recently used keys are evicted first. '
+                    '0 means unbounded.'),
 ]
 
 CONF = cfg.CONF
@@ -33,49 +41,120 @@ CONF.register_opts(memcache_opts)
 
 
 def get_client(memcached_servers=None):
-    client_cls = Client
-
     if not memcached_servers:
         memcached_servers = CONF.memcached_servers
     if memcached_servers:
         try:
             import memcache
-            client_cls = memcache.Client
+            return memcache.Client(memcached_servers, debug=0)
         except ImportError:
             pass
 
-    return client_cls(memcached_servers, debug=0)
+    return Client(memcached_servers, debug=0,
+                  max_size=CONF.memorycache_max_size)
 
 
 class Client(object):
-    """Replicates a tiny subset of memcached client interface."""
+    """Replicates a tiny subset of memcached client interface.
 
-    def __init__(self, *args, **kwargs):
-        """Ignores the passed in args."""
-        self.cache = {}
+    Expiry times are kept on a heap next to the data, so a lookup only looks
+    at its own key and expired keys are purged lazily, a few at a time, as
+    the cache is written to. With max_size set the cache also behaves as an
+    LRU and evicts the least recently used key once it is full.
 
-    def get(self, key):
-        """Retrieves the value for a key or None.
+    Hit, miss, eviction and expiration counters are kept in self.stats.
+    """
 
-        This expunges expired keys during each get.
+    def __init__(self, *args, **kwargs):
+        """Ignores the passed in args except max_size."""
+        self.cache = collections.OrderedDict()
+        self.max_size = kwargs.get('max_size') or 0
+        self._expiries = []
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                      'expirations': 0}
+
+    def _purge_expired(self, now):
+        """Drop every key whose expiry has passed.
+
+        Heap entries left behind by keys that were overwritten or deleted
+        are skipped, so each entry is popped once and the cost is amortized
+        over the sets that pushed them.
         """
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            timeout, key = heapq.heappop(expiries)
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] == timeout:
+                del self.cache[key]
+                self.stats['expirations'] += 1
+
+    def _lookup(self, key, now):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] and now >= entry[0]:
+            del self.cache[key]
+            self.stats['expirations'] += 1
+            return None
+        if self.max_size:
+            # NOTE: re-insert to mark the key as most recently used.
+            del self.cache[key]
+            self.cache[key] = entry
+        return entry
 
-        now = timeutils.utcnow_ts()
-        for k in self.cache.keys():
-            (timeout, _value) = self.cache[k]
-            if timeout and now >= timeout:
-                del self.cache[k]
-
-        return self.cache.get(key, (0, None))[1]
+    def get(self, key):
+        """Retrieves the value for a key or None."""
+        entry = self._lookup(key, timeutils.utcnow_ts())
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry[1]
 
-    def set(self, key, value, time=0, min_compress_len=0):
-        """Sets the value for a key."""
+    def get_multi(self, keys):
+        """Retrieves a dict of the values for the keys that are present."""
+        now = timeutils.utcnow_ts()
+        result = {}
+        for key in keys:
+            entry = self._lookup(key, now)
+            if entry is None:
+                self.stats['misses'] += 1
+            else:
+                self.stats['hits'] += 1
+                result[key] = entry[1]
+        return result
+
+    def _store(self, key, value, time, now):
         timeout = 0
         if time != 0:
-            timeout = timeutils.utcnow_ts() + time
+            timeout = now + time
+            heapq.heappush(self._expiries, (timeout, key))
+        self.cache.pop(key, None)
         self.cache[key] = (timeout, value)
+        if self.max_size:
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key."""
+        now = timeutils.utcnow_ts()
+        self._purge_expired(now)
+        self._store(key, value, time, now)
         return True
 
+    def set_multi(self, mapping, time=0, key_prefix='', min_compress_len=0):
+        """Sets the values for all keys in mapping.
+
+        Returns the list of keys that were not stored, which is always
+        empty for the in process cache.
+        """
+        now = timeutils.utcnow_ts()
+        self._purge_expired(now)
+        for key, value in mapping.iteritems():
+            self._store(key_prefix + key, value, time, now)
+        return []
+
     def add(self, key, value, time=0, min_compress_len=0):
         """Sets the value for a key if it doesn't exist."""
         if self.get(key) is not None:
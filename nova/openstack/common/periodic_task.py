@@ -14,8 +14,11 @@
 #    under the License.
 
 import datetime
+import heapq
+import random
 import time
 
+from eventlet import greenpool
 from oslo.config import cfg
 
 from nova.openstack.common.gettextutils import _
@@ -28,6 +31,22 @@ periodic_opts = [
                 default=True,
                 help=('Some periodic tasks can be run in a separate process. '
                       'Should we run them here?')),
+    cfg.StrOpt('periodic_task_scheduler',
+               default='heap',
+               help='How periodic tasks are run: "heap" keeps tasks on a '
+                    'due-time heap and runs each one in its own greenthread, '
+                    '"serial" runs every due task one after another in the '
+                    'timer greenthread'),
+    cfg.FloatOpt('periodic_task_jitter',
+                 default=0.1,
+                 help='Fraction of a task\'s spacing added at random to each '
+                      'of its due times, so that many services do not run '
+                      'the same task in lockstep. Only used by the heap '
+                      'scheduler'),
+    cfg.IntOpt('periodic_task_pool_size',
+               default=8,
+               help='Maximum number of periodic tasks running at once. Only '
+                    'used by the heap scheduler'),
 ]
 
 CONF = cfg.CONF
@@ -150,11 +169,156 @@ class _PeriodicTasksMeta(type):
                 cls._periodic_last_run[name] = task._periodic_last_run
 
 
+class _TaskStats(object):
+    """Run-count, latency and overrun counters of one periodic task."""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+
+    def record(self, duration, spacing, failed):
+        self.runs += 1
+        if failed:
+            self.failures += 1
+        if spacing is not None and duration > spacing:
+            self.overruns += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+
+    def to_dict(self):
+        average = None
+        if self.runs:
+            average = self.total_duration / self.runs
+        return {'runs': self.runs,
+                'failures': self.failures,
+                'skipped': self.skipped,
+                'overruns': self.overruns,
+                'last_duration': self.last_duration,
+                'max_duration': self.max_duration,
+                'average_duration': average}
+
+
+class _HeapScheduler(object):
+    """Run the periodic tasks of one PeriodicTasks object off a heap.
+
+    Every enabled task has exactly one (due, name) entry on the heap.  Each
+    pass pops the due entries, pushes their next due time straight back and
+    hands the task to a bounded GreenPool, so a slow task no longer holds up
+    the others.  A task that is still running when it comes due again is
+    skipped for that cycle instead of being run twice.
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.heap = []
+        self.running = set()
+        self.pool = greenpool.GreenPool(CONF.periodic_task_pool_size)
+        self.stats = dict((name, _TaskStats())
+                          for name, _task in obj._periodic_tasks)
+
+        now = time.time()
+        for name, task in obj._periodic_tasks:
+            spacing = obj._periodic_spacing[name]
+            if spacing is None or obj._periodic_last_run[name] is None:
+                due = now
+            else:
+                due = self._next_due(now, spacing)
+            heapq.heappush(self.heap, (due, name))
+
+    def _next_due(self, now, spacing):
+        if spacing is None:
+            # NOTE: a task without spacing runs on every pass.
+            return now
+        return now + spacing + random.uniform(
+            0, spacing * CONF.periodic_task_jitter)
+
+    def run(self, context, raise_on_error=False):
+        tasks = dict(self.obj._periodic_tasks)
+        idle_for = DEFAULT_INTERVAL
+        now = time.time()
+        due_now = []
+        # NOTE: a task that is _nearly_ due is run early, as the serial
+        # scheduler does.
+        while self.heap and self.heap[0][0] - now <= 0.2:
+            due_now.append(heapq.heappop(self.heap)[1])
+
+        for name in due_now:
+            spacing = self.obj._periodic_spacing[name]
+            heapq.heappush(self.heap, (self._next_due(now, spacing), name))
+            if name in self.running:
+                LOG.warn(_('Skipping periodic task %(task)s because its '
+                           'previous run has not finished'), {'task': name})
+                self.stats[name].skipped += 1
+                continue
+
+            self.obj._periodic_last_run[name] = timeutils.utcnow()
+            if raise_on_error:
+                self._run_task(name, tasks[name], context, raise_on_error)
+            else:
+                self.running.add(name)
+                self.pool.spawn_n(self._run_task, name, tasks[name], context)
+
+        for due, name in self.heap:
+            if self.obj._periodic_spacing[name] is not None:
+                idle_for = min(idle_for, due - now)
+        return max(idle_for, 0)
+
+    def _run_task(self, name, task, context, raise_on_error=False):
+        full_task_name = '.'.join([self.obj.__class__.__name__, name])
+        LOG.debug(_("Running periodic task %(full_task_name)s"),
+                  {'full_task_name': full_task_name})
+        failed = False
+        start = time.time()
+        try:
+            task(self.obj, context)
+        except Exception as e:
+            failed = True
+            if raise_on_error:
+                raise
+            LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
+                          {'full_task_name': full_task_name, 'e': e})
+        finally:
+            self.running.discard(name)
+            self.stats[name].record(time.time() - start,
+                                    self.obj._periodic_spacing[name], failed)
+
+
 class PeriodicTasks(object):
     __metaclass__ = _PeriodicTasksMeta
 
     def run_periodic_tasks(self, context, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
+        """Tasks to be run at a periodic interval.
+
+        Returns the number of seconds until the next task is due.
+        """
+        if CONF.periodic_task_scheduler == 'serial':
+            return self._run_periodic_tasks_serial(context, raise_on_error)
+        return self._periodic_scheduler.run(context, raise_on_error)
+
+    @property
+    def _periodic_scheduler(self):
+        # NOTE: created on first use, PeriodicTasks has no __init__ of its
+        # own to hook into.
+        scheduler = self.__dict__.get('_periodic_heap_scheduler')
+        if scheduler is None:
+            scheduler = _HeapScheduler(self)
+            self._periodic_heap_scheduler = scheduler
+        return scheduler
+
+    def get_periodic_task_stats(self):
+        """Return the run counters of every periodic task, keyed by name."""
+        if CONF.periodic_task_scheduler == 'serial':
+            return {}
+        return dict((name, stats.to_dict()) for name, stats in
+                    self._periodic_scheduler.stats.iteritems())
+
+    def _run_periodic_tasks_serial(self, context, raise_on_error=False):
         idle_for = DEFAULT_INTERVAL
         for task_name, task in self._periodic_tasks:
             full_task_name = '.'.join([self.__class__.__name__, task_name])
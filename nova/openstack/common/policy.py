@@ -184,6 +184,68 @@ def check(rule, target, creds, exc=None, *args, **kwargs):
     return result
 
 
+class _RuleCompiler(object):
+    """
+    Turns named rules into plain callables, compiling each rule once.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.compiled = {}
+        self._pending = set()
+
+    def rule(self, name):
+        """Return the compiled callable for the named rule."""
+
+        if name in self.compiled:
+            return self.compiled[name]
+
+        if name in self._pending:
+            # A rule that refers to itself; resolve it at call time
+            compiled = self.compiled
+            return lambda target, creds: compiled[name](target, creds)
+
+        try:
+            check = self.rules[name]
+        except KeyError:
+            # We don't have any matching rule; fail closed
+            return _false
+
+        self._pending.add(name)
+        try:
+            func = check.compile(self)
+        finally:
+            self._pending.discard(name)
+        self.compiled[name] = func
+        return func
+
+
+def _true(target, creds):
+    return True
+
+
+def _false(target, creds):
+    return False
+
+
+def compile_rules(rules):
+    """
+    Compile every rule in a Rules object into a single Python closure.
+
+    The closures return the same results as calling the Check trees,
+    but "rule:" references are resolved once, at compile time, instead
+    of being looked up on every check.
+
+    :return: A dictionary mapping rule names to callables taking
+             (target, creds).
+    """
+
+    compiler = _RuleCompiler(rules)
+    for name in rules:
+        compiler.rule(name)
+    return compiler.compiled
+
+
 class BaseCheck(object):
     """
     Abstract base class for Check classes.
@@ -209,6 +271,15 @@ class BaseCheck(object):
 
         pass
 
+    def compile(self, compiler):
+        """
+        Return a callable taking (target, creds) that performs this
+        check.  Subclasses override this to flatten themselves into a
+        closure; by default the check object itself is used.
+        """
+
+        return self
+
 
 class FalseCheck(BaseCheck):
     """
@@ -225,6 +296,11 @@ class FalseCheck(BaseCheck):
 
         return False
 
+    def compile(self, compiler):
+        """Compile the check."""
+
+        return _false
+
 
 class TrueCheck(BaseCheck):
     """
@@ -241,6 +317,11 @@ class TrueCheck(BaseCheck):
 
         return True
 
+    def compile(self, compiler):
+        """Compile the check."""
+
+        return _true
+
 
 class Check(BaseCheck):
     """
@@ -292,6 +373,12 @@ class NotCheck(BaseCheck):
 
         return not self.rule(target, cred)
 
+    def compile(self, compiler):
+        """Compile the check."""
+
+        rule = self.rule.compile(compiler)
+        return lambda target, cred: not rule(target, cred)
+
 
 class AndCheck(BaseCheck):
     """
@@ -334,6 +421,18 @@ class AndCheck(BaseCheck):
         self.rules.append(rule)
         return self
 
+    def compile(self, compiler):
+        """Compile the check."""
+
+        rules = tuple(r.compile(compiler) for r in self.rules)
+
+        def _and(target, cred):
+            for rule in rules:
+                if not rule(target, cred):
+                    return False
+            return True
+        return _and
+
 
 class OrCheck(BaseCheck):
     """
@@ -376,6 +475,18 @@ class OrCheck(BaseCheck):
         self.rules.append(rule)
         return self
 
+    def compile(self, compiler):
+        """Compile the check."""
+
+        rules = tuple(r.compile(compiler) for r in self.rules)
+
+        def _or(target, cred):
+            for rule in rules:
+                if rule(target, cred):
+                    return True
+            return False
+        return _or
+
 
 def _parse_check(rule):
     """
@@ -733,6 +844,19 @@ class RuleCheck(Check):
             # We don't have any matching rule; fail closed
             return False
 
+    def compile(self, compiler):
+        """Inline the referenced rule."""
+
+        rule = compiler.rule(self.match)
+
+        def _rule(target, creds):
+            try:
+                return rule(target, creds)
+            except KeyError:
+                # Same as __call__: a missing key fails this rule only
+                return False
+        return _rule
+
 
 @register("role")
 class RoleCheck(Check):
@@ -741,6 +865,15 @@ class RoleCheck(Check):
 
         return self.match.lower() in [x.lower() for x in creds['roles']]
 
+    def compile(self, compiler):
+        """Compile the check."""
+
+        match = self.match.lower()
+
+        def _role(target, creds):
+            return match in [x.lower() for x in creds['roles']]
+        return _role
+
 
 @register('http')
 class HttpCheck(Check):
@@ -777,3 +910,20 @@ class GenericCheck(Check):
         if self.kind in creds:
             return match == unicode(creds[self.kind])
         return False
+
+    def compile(self, compiler):
+        """Compile the check, skipping the format when match is constant."""
+
+        kind = self.kind
+        match = self.match
+        constant = '%' not in match
+
+        def _generic(target, creds):
+            if constant:
+                value = match
+            else:
+                value = match % target
+            if kind in creds:
+                return value == unicode(creds[kind])
+            return False
+        return _generic
@@ -59,6 +59,13 @@ cfg.CONF.register_opts(amqp_opts)
 UNIQUE_ID = '_unique_id'
 LOG = logging.getLogger(__name__)
 
+# NOTE: Version of the reply format a caller understands, sent along with
+# every call as '_reply_version'.  Callers that send nothing are treated as
+# 2.0 and get each result followed by a separate 'ending' reply.  2.1 adds
+# single-message replies carrying both the result and the 'ending' flag.
+_REPLY_VERSION = '2.1'
+_COMBINED_REPLY_VERSION = '2.1'
+
 
 class Pool(pools.Pool):
     """Class that implements a Pool of Connections."""
@@ -224,11 +231,15 @@ class ReplyProxy(ConnectionContext):
 
 
 def msg_reply(conf, msg_id, reply_q, connection_pool, reply=None,
-              failure=None, ending=False, log_failure=True):
+              failure=None, ending=False, log_failure=True,
+              has_result=False):
     """Sends a reply or an error on the channel signified by msg_id.
 
     Failure should be a sys.exc_info() tuple.
 
+    If has_result is set along with ending, the reply is the final result
+    of the call and must be returned to the caller rather than dropped.
+
     """
     with ConnectionContext(conf, connection_pool) as conn:
         if failure:
@@ -238,6 +249,8 @@ def msg_reply(conf, msg_id, reply_q, connection_pool, reply=None,
         msg = {'result': reply, 'failure': failure}
         if ending:
             msg['ending'] = True
+            if has_result:
+                msg['has_result'] = True
         _add_unique_id(msg)
         # If a reply_q exists, add the msg_id to the reply and pass the
         # reply_q to direct_send() to use it as the response queue.
@@ -254,6 +267,7 @@ class RpcContext(rpc_common.CommonRpcContext):
     def __init__(self, **kwargs):
         self.msg_id = kwargs.pop('msg_id', None)
         self.reply_q = kwargs.pop('reply_q', None)
+        self.reply_version = kwargs.pop('reply_version', None)
         self.conf = kwargs.pop('conf')
         super(RpcContext, self).__init__(**kwargs)
 
@@ -262,6 +276,7 @@ class RpcContext(rpc_common.CommonRpcContext):
         values['conf'] = self.conf
         values['msg_id'] = self.msg_id
         values['reply_q'] = self.reply_q
+        values['reply_version'] = self.reply_version
         return self.__class__(**values)
 
     def reply(self, reply=None, failure=None, ending=False,
@@ -272,6 +287,24 @@ class RpcContext(rpc_common.CommonRpcContext):
             if ending:
                 self.msg_id = None
 
+    def reply_result(self, reply, connection_pool=None):
+        """Send the only result of a call and tell the caller it is done.
+
+        Callers that understand the combined reply format get both in one
+        message, which saves a publish and a pool checkout per call.
+        """
+        if (self.reply_version and
+                rpc_common.version_is_compatible(self.reply_version,
+                                                 _COMBINED_REPLY_VERSION)):
+            if self.msg_id:
+                msg_reply(self.conf, self.msg_id, self.reply_q,
+                          connection_pool, reply, ending=True,
+                          has_result=True)
+                self.msg_id = None
+        else:
+            self.reply(reply, None, connection_pool=connection_pool)
+            self.reply(ending=True, connection_pool=connection_pool)
+
 
 def unpack_context(conf, msg):
     """Unpack context from msg."""
@@ -285,6 +318,7 @@ def unpack_context(conf, msg):
             context_dict[key[9:]] = value
     context_dict['msg_id'] = msg.pop('_msg_id', None)
     context_dict['reply_q'] = msg.pop('_reply_q', None)
+    context_dict['reply_version'] = msg.pop('_reply_version', None)
     context_dict['conf'] = conf
     ctx = RpcContext.from_dict(context_dict)
     rpc_common._safe_log(LOG.debug, _('unpacked context: %s'), ctx.to_dict())
@@ -338,7 +372,7 @@ def _add_unique_id(msg):
     """Add unique_id for checking duplicate messages."""
     unique_id = uuid.uuid4().hex
     msg.update({UNIQUE_ID: unique_id})
-    LOG.debug(_('UNIQUE_ID is %s.') % (unique_id))
+    LOG.debug(_('UNIQUE_ID is %s.'), unique_id)
 
 
 class _ThreadPoolWithWait(object):
@@ -463,10 +497,10 @@ class ProxyCallback(_ThreadPoolWithWait):
             if inspect.isgenerator(rval):
                 for x in rval:
                     ctxt.reply(x, None, connection_pool=self.connection_pool)
+                # This final None tells multicall that it is done.
+                ctxt.reply(ending=True, connection_pool=self.connection_pool)
             else:
-                ctxt.reply(rval, None, connection_pool=self.connection_pool)
-            # This final None tells multicall that it is done.
-            ctxt.reply(ending=True, connection_pool=self.connection_pool)
+                ctxt.reply_result(rval, connection_pool=self.connection_pool)
         except rpc_common.ClientException as e:
             LOG.debug(_('Expected exception during message handling (%s)') %
                       e._exc_info[1])
@@ -488,6 +522,7 @@ class MulticallProxyWaiter(object):
         self._reply_proxy = connection_pool.reply_proxy
         self._done = False
         self._got_ending = False
+        self._got_result = False
         self._conf = conf
         self._dataqueue = queue.LightQueue()
         # Add this caller to the reply proxy's call_waiters
@@ -513,6 +548,9 @@ class MulticallProxyWaiter(object):
                                                              failure)
         elif data.get('ending', False):
             self._got_ending = True
+            if data.get('has_result', False):
+                self._got_result = True
+                result = data['result']
         else:
             result = data['result']
         return result
@@ -533,6 +571,8 @@ class MulticallProxyWaiter(object):
                     self.done()
             if self._got_ending:
                 self.done()
+                if self._got_result:
+                    yield result
                 raise StopIteration
             if isinstance(result, Exception):
                 self.done()
@@ -553,14 +593,15 @@ def multicall(conf, context, topic, msg, timeout, connection_pool):
     LOG.debug(_('Making synchronous call on %s ...'), topic)
     msg_id = uuid.uuid4().hex
     msg.update({'_msg_id': msg_id})
-    LOG.debug(_('MSG_ID is %s') % (msg_id))
+    LOG.debug(_('MSG_ID is %s'), msg_id)
     _add_unique_id(msg)
     pack_context(msg, context)
 
     with _reply_proxy_create_sem:
         if not connection_pool.reply_proxy:
             connection_pool.reply_proxy = ReplyProxy(conf, connection_pool)
-    msg.update({'_reply_q': connection_pool.reply_proxy.get_reply_q()})
+    msg.update({'_reply_q': connection_pool.reply_proxy.get_reply_q(),
+                '_reply_version': _REPLY_VERSION})
     wait_msg = MulticallProxyWaiter(conf, msg_id, timeout, connection_pool)
     with ConnectionContext(conf, connection_pool) as conn:
         conn.topic_send(topic, rpc_common.serialize_msg(msg), timeout)
@@ -261,6 +261,13 @@ class Connection(object):
 
 def _safe_log(log_func, msg, msg_data):
     """Sanitizes the msg_data field before logging."""
+    # NOTE: skip the deep copy when the message would not be logged
+    logger = getattr(log_func, '__self__', None)
+    level = getattr(logging, log_func.__name__.upper(), None)
+    if (level is not None and hasattr(logger, 'isEnabledFor') and
+            not logger.isEnabledFor(level)):
+        return
+
     SANITIZE = ['_context_auth_token', 'auth_token', 'new_pass']
 
     def _fix_passwords(d):
@@ -441,29 +448,39 @@ def client_exceptions(*exceptions):
     return outer
 
 
+_versions = {}
+
+
+def _parse_version(version):
+    """Return version as a (major, minor, revision) tuple of ints."""
+    parsed = _versions.get(version)
+    if parsed is None:
+        parts = version.split('.')
+        try:
+            rev = parts[2]
+        except IndexError:
+            rev = 0
+        parsed = (int(parts[0]), int(parts[1]), int(rev))
+        # NOTE: versions come from messages, don't let them pile up
+        if len(_versions) < 1024:
+            _versions[version] = parsed
+    return parsed
+
+
 def version_is_compatible(imp_version, version):
     """Determine whether versions are compatible.
 
     :param imp_version: The version implemented
     :param version: The version requested by an incoming message.
     """
-    version_parts = version.split('.')
-    imp_version_parts = imp_version.split('.')
-    try:
-        rev = version_parts[2]
-    except IndexError:
-        rev = 0
-    try:
-        imp_rev = imp_version_parts[2]
-    except IndexError:
-        imp_rev = 0
+    major, minor, rev = _parse_version(version)
+    imp_major, imp_minor, imp_rev = _parse_version(imp_version)
 
-    if int(version_parts[0]) != int(imp_version_parts[0]):  # Major
+    if major != imp_major:  # Major
         return False
-    if int(version_parts[1]) > int(imp_version_parts[1]):  # Minor
+    if minor > imp_minor:  # Minor
         return False
-    if (int(version_parts[1]) == int(imp_version_parts[1]) and
-            int(rev) > int(imp_rev)):  # Revision
+    if minor == imp_minor and rev > imp_rev:  # Revision
         return False
     return True
 
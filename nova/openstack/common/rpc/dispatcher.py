@@ -87,11 +87,39 @@ from nova.openstack.common.rpc import common as rpc_common
 from nova.openstack.common.rpc import serializer as rpc_serializer
 
 
+class _CallbackList(list):
+    """A list of callbacks that tells its dispatcher when it changes."""
+
+    def __init__(self, callbacks, changed):
+        super(_CallbackList, self).__init__(callbacks)
+        self.changed = changed
+
+
+def _notify_change(name):
+    def method(self, *args, **kwargs):
+        result = getattr(list, name)(self, *args, **kwargs)
+        self.changed()
+        return result
+    method.__name__ = name
+    return method
+
+
+for _name in ('__setitem__', '__delitem__', '__setslice__', '__delslice__',
+              '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop',
+              'remove', 'reverse', 'sort'):
+    setattr(_CallbackList, _name, _notify_change(_name))
+
+
 class RpcDispatcher(object):
     """Dispatch rpc messages according to the requested API version.
 
     This class can be used as the top level 'manager' for a service.  It
     contains a list of underlying managers that have an API_VERSION attribute.
+
+    The method serving a (namespace, version, method) is looked up once and
+    kept in a table, so that dispatching a message is a dict lookup.  The
+    table is cleared when the callbacks list changes; call invalidate()
+    after changing the callback objects themselves.
     """
 
     def __init__(self, callbacks, serializer=None):
@@ -110,6 +138,56 @@ class RpcDispatcher(object):
         self.serializer = serializer
         super(RpcDispatcher, self).__init__()
 
+    @property
+    def callbacks(self):
+        return self._callbacks
+
+    @callbacks.setter
+    def callbacks(self, callbacks):
+        self._callbacks = _CallbackList(callbacks, self.invalidate)
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the methods looked up so far."""
+        self._methods = {}
+        self._apis = None
+
+    def _get_apis(self):
+        """Return (namespace, version, proxy object) of every callback."""
+        if self._apis is None:
+            apis = []
+            for proxyobj in self._callbacks:
+                namespace = getattr(proxyobj, 'RPC_API_NAMESPACE', None)
+                version = getattr(proxyobj, 'RPC_API_VERSION', '1.0')
+                apis.append((namespace, version, proxyobj))
+            self._apis = apis
+        return self._apis
+
+    def _lookup(self, version, method, namespace):
+        """Return the bound method serving a message, or raise."""
+        had_compatible = False
+        for cb_namespace, rpc_api_version, proxyobj in self._get_apis():
+            # Check for namespace compatibility
+            if namespace != cb_namespace:
+                continue
+
+            # Check for version compatibility
+            is_compatible = rpc_common.version_is_compatible(rpc_api_version,
+                                                             version)
+            had_compatible = had_compatible or is_compatible
+
+            if not hasattr(proxyobj, method):
+                continue
+            if is_compatible:
+                func = getattr(proxyobj, method)
+                self._methods[(namespace, version, method)] = func
+                return func
+
+        if had_compatible:
+            raise AttributeError("No such RPC function '%s'" % method)
+        else:
+            raise rpc_common.UnsupportedRpcVersion(version=version)
+
     def _deserialize_args(self, context, kwargs):
         """Helper method called to deserialize args before dispatch.
 
@@ -144,35 +222,11 @@ class RpcDispatcher(object):
         if not version:
             version = '1.0'
 
-        had_compatible = False
-        for proxyobj in self.callbacks:
-            # Check for namespace compatibility
-            try:
-                cb_namespace = proxyobj.RPC_API_NAMESPACE
-            except AttributeError:
-                cb_namespace = None
-
-            if namespace != cb_namespace:
-                continue
-
-            # Check for version compatibility
-            try:
-                rpc_api_version = proxyobj.RPC_API_VERSION
-            except AttributeError:
-                rpc_api_version = '1.0'
+        func = self._methods.get((namespace, version, method))
+        if func is None:
+            func = self._lookup(version, method, namespace)
 
-            is_compatible = rpc_common.version_is_compatible(rpc_api_version,
-                                                             version)
-            had_compatible = had_compatible or is_compatible
-
-            if not hasattr(proxyobj, method):
-                continue
-            if is_compatible:
-                kwargs = self._deserialize_args(ctxt, kwargs)
-                result = getattr(proxyobj, method)(ctxt, **kwargs)
-                return self.serializer.serialize_entity(ctxt, result)
-
-        if had_compatible:
-            raise AttributeError("No such RPC function '%s'" % method)
-        else:
-            raise rpc_common.UnsupportedRpcVersion(version=version)
+        if type(self.serializer) is not rpc_serializer.NoOpSerializer:
+            kwargs = self._deserialize_args(ctxt, kwargs)
+        result = func(ctxt, **kwargs)
+        return self.serializer.serialize_entity(ctxt, result)
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import functools
 import itertools
 import socket
@@ -91,6 +92,26 @@ kombu_opts = [
                 help='use H/A queues in RabbitMQ (x-ha-policy: all).'
                      'You need to wipe RabbitMQ database when '
                      'changing this option.'),
+    cfg.IntOpt('rabbit_prefetch_count',
+               default=0,
+               help='Number of unacknowledged messages the broker sends '
+                    'each consumer. A message is acknowledged once a '
+                    'greenthread of the rpc_thread_pool_size pool takes '
+                    'it, so a busy consumer holds at most this many and '
+                    'the rest go to the other consumers of the queue. '
+                    '0 means no limit'),
+    cfg.IntOpt('rabbit_ack_batch_size',
+               default=1,
+               help='Acknowledge messages with one multiple ack every this '
+                    'many messages (capped to half rabbit_prefetch_count)'),
+    cfg.IntOpt('rabbit_ack_batch_interval',
+               default=100,
+               help='Milliseconds after which a partial batch of '
+                    'acknowledgements is sent anyway'),
+    cfg.IntOpt('rabbit_reply_publisher_cache_size',
+               default=64,
+               help='Number of reply queue publishers each connection '
+                    'keeps declared, least recently used first out'),
 
 ]
 
@@ -131,6 +152,8 @@ class ConsumerBase(object):
         self.kwargs = kwargs
         self.queue = None
         self.ack_on_error = kwargs.get('ack_on_error', True)
+        # NOTE: set by Connection.declare_consumer() to batch the acks
+        self.acker = None
         self.reconnect(channel)
 
     def reconnect(self, channel):
@@ -140,6 +163,12 @@ class ConsumerBase(object):
         self.queue = kombu.entity.Queue(**self.kwargs)
         self.queue.declare()
 
+    def _ack(self, message):
+        if self.acker is not None:
+            self.acker(message)
+        else:
+            message.ack()
+
     def _callback_handler(self, message, callback):
         """Call callback with deserialized message.
 
@@ -156,13 +185,13 @@ class ConsumerBase(object):
             if self.ack_on_error:
                 LOG.exception(_("Failed to process message"
                                 " ... skipping it."))
-                message.ack()
+                self._ack(message)
             else:
                 LOG.exception(_("Failed to process message"
                                 " ... will requeue."))
                 message.requeue()
         else:
-            message.ack()
+            self._ack(message)
 
     def consume(self, *args, **kwargs):
         """Actually declare the consumer on the amqp channel.  This will
@@ -349,6 +378,27 @@ class DirectPublisher(Publisher):
         super(DirectPublisher, self).__init__(channel, msg_id, msg_id,
                                               type='direct', **options)
 
+    def reconnect(self, channel):
+        super(DirectPublisher, self).reconnect(channel)
+        # NOTE: the Producer declared the exchange
+        self._declared = True
+
+    def send(self, msg, timeout=None):
+        """Send a message, declaring the exchange again if needed.
+
+        The exchange is auto_delete, it goes away with the reply queue of
+        its caller.  Publishing to a missing exchange makes the broker
+        close the channel, and the publish does not wait for that, so the
+        error would only hit a later operation on the channel.  A cached
+        publisher therefore declares it again (nowait, without a round
+        trip) before every later send.
+        """
+        if self._declared:
+            self._declared = False
+        else:
+            self.producer.exchange.declare(nowait=True)
+        super(DirectPublisher, self).send(msg, timeout)
+
 
 class TopicPublisher(Publisher):
     """Publisher class for 'topic'."""
@@ -426,6 +476,16 @@ class Connection(object):
         # max retry-interval = 30 seconds
         self.interval_max = 30
         self.memory_transport = False
+        # NOTE: publishers are kept per channel, building one declares its
+        # exchange on the broker.  The direct ones are per reply queue (or
+        # per msg_id with old callers), so they are kept in an LRU.
+        self.publishers = {}
+        self.direct_publishers = collections.OrderedDict()
+        # NOTE: acks are per channel, so a batch covers all consumers:
+        # the last delivery tag to ack, how many and since when.
+        self.unacked_tag = None
+        self.unacked = 0
+        self.unacked_since = None
 
         if server_params is None:
             server_params = {}
@@ -513,6 +573,7 @@ class Connection(object):
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
+        self._setup_channel()
         for consumer in self.consumers:
             consumer.reconnect(self.channel)
         LOG.info(_('Connected to AMQP server on %(hostname)s:%(port)d') %
@@ -595,10 +656,59 @@ class Connection(object):
         """Convenience call for bin/clear_rabbit_queues."""
         return self.channel
 
+    def _setup_channel(self):
+        """Set the new channel up: prefetch, no acks or publishers from
+        the previous one.
+        """
+        self._clear_publishers()
+        # NOTE: the broker redelivers what the old channel did not ack
+        self.unacked_tag = None
+        self.unacked = 0
+        self.unacked_since = None
+        if self.conf.rabbit_prefetch_count > 0:
+            self.channel.basic_qos(0, self.conf.rabbit_prefetch_count, False)
+
+    def ack_message(self, message):
+        """Ack message, batched with the next ones when
+        rabbit_ack_batch_size is above 1.
+        """
+        batch_size = self.conf.rabbit_ack_batch_size
+        if self.conf.rabbit_prefetch_count > 0:
+            # NOTE: the broker stops delivering at prefetch unacked
+            # messages, the batch has to be sent before that.
+            batch_size = min(batch_size,
+                             max(1, self.conf.rabbit_prefetch_count // 2))
+        # NOTE: the in-memory transport has no multiple acks
+        if batch_size <= 1 or self.memory_transport:
+            message.ack()
+            return
+        self.unacked_tag = message.delivery_tag
+        self.unacked += 1
+        if self.unacked_since is None:
+            self.unacked_since = time.time()
+        if self.unacked >= batch_size:
+            self.flush_acks()
+
+    def flush_acks(self):
+        """Send the pending batch of acks."""
+        if self.unacked:
+            tag = self.unacked_tag
+            self.unacked_tag = None
+            self.unacked = 0
+            self.unacked_since = None
+            self.channel.basic_ack(tag, multiple=True)
+
+    def _flush_acks_quietly(self):
+        try:
+            self.flush_acks()
+        except self.connection_errors:
+            pass
+
     def close(self):
         """Close/release this connection."""
         self.cancel_consumer_thread()
         self.wait_on_proxy_callbacks()
+        self._flush_acks_quietly()
         self.connection.release()
         self.connection = None
 
@@ -606,11 +716,13 @@ class Connection(object):
         """Reset a connection so it can be used again."""
         self.cancel_consumer_thread()
         self.wait_on_proxy_callbacks()
+        self._flush_acks_quietly()
         self.channel.close()
         self.channel = self.connection.channel()
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
+        self._setup_channel()
         self.consumers = []
 
     def declare_consumer(self, consumer_cls, topic, callback):
@@ -626,6 +738,7 @@ class Connection(object):
         def _declare_consumer():
             consumer = consumer_cls(self.conf, self.channel, topic, callback,
                                     self.consumer_num.next())
+            consumer.acker = self.ack_message
             self.consumers.append(consumer)
             return consumer
 
@@ -654,7 +767,23 @@ class Connection(object):
                     queue.consume(nowait=True)
                 queues_tail.consume(nowait=False)
                 info['do_consume'] = False
-            return self.connection.drain_events(timeout=timeout)
+
+            # NOTE: wake up in time to send a partial batch of acks
+            ack_wait = None
+            if self.unacked:
+                ack_wait = (self.unacked_since - time.time() +
+                            self.conf.rabbit_ack_batch_interval / 1000.0)
+                if ack_wait <= 0:
+                    self.flush_acks()
+                    ack_wait = None
+                elif timeout is not None and timeout <= ack_wait:
+                    ack_wait = None
+            if ack_wait is None:
+                return self.connection.drain_events(timeout=timeout)
+            try:
+                return self.connection.drain_events(timeout=ack_wait)
+            except socket.timeout:
+                self.flush_acks()
 
         for iteration in itertools.count(0):
             if limit and iteration >= limit:
@@ -685,11 +814,70 @@ class Connection(object):
                           "'%(topic)s': %(err_str)s") % log_info)
 
         def _publish():
-            publisher = cls(self.conf, self.channel, topic, **kwargs)
-            publisher.send(msg, timeout)
+            publisher = self._get_publisher(cls, topic, kwargs)
+            try:
+                publisher.send(msg, timeout)
+            except self.connection.channel_errors as exc:
+                # NOTE: the broker closed the channel (e.g. for an earlier
+                # publish to a missing exchange).  Open another one and
+                # send again through fresh publishers, rather than
+                # reconnecting.
+                LOG.warn(_("Channel error publishing to '%(topic)s': "
+                           "%(err_str)s, opening a new channel"),
+                         {'topic': topic, 'err_str': str(exc)})
+                self._reopen_channel()
+                publisher = self._get_publisher(cls, topic, kwargs)
+                publisher.send(msg, timeout)
 
         self.ensure(_error_callback, _publish)
 
+    def _reopen_channel(self):
+        """Replace a channel the broker closed, keeping the connection."""
+        try:
+            self.channel.close()
+        except Exception:
+            pass
+        self.channel = self.connection.channel()
+        self._setup_channel()
+        for consumer in self.consumers:
+            consumer.reconnect(self.channel)
+
+    def _clear_publishers(self):
+        """Forget the publishers of the previous channel.
+
+        They are built again, declaring their exchange on the new channel,
+        the next time they are used.
+        """
+        self.publishers.clear()
+        self.direct_publishers.clear()
+
+    def _get_publisher(self, cls, topic, kwargs):
+        """Return the publisher of cls for topic on the current channel."""
+        key = (cls, topic, tuple(sorted(kwargs.iteritems())))
+        try:
+            hash(key)
+        except TypeError:
+            return cls(self.conf, self.channel, topic, **kwargs)
+
+        if cls is DirectPublisher:
+            if not topic.startswith('reply_'):
+                # NOTE: the exchange of a msg_id (old style callers) goes
+                # away with its single reply, it is declared every time.
+                return cls(self.conf, self.channel, topic, **kwargs)
+            publishers = self.direct_publishers
+            publisher = publishers.pop(key, None)
+        else:
+            publishers = self.publishers
+            publisher = publishers.get(key)
+        if publisher is None:
+            publisher = cls(self.conf, self.channel, topic, **kwargs)
+        publishers[key] = publisher
+        if cls is DirectPublisher:
+            limit = self.conf.rabbit_reply_publisher_cache_size
+            while len(publishers) > limit:
+                publishers.popitem(last=False)
+        return publisher
+
     def declare_direct_consumer(self, topic, callback):
         """Create a 'direct' queue.
         In nova's use, this is generally a msg_id queue used for
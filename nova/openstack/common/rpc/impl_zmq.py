@@ -17,12 +17,15 @@
 import os
 import pprint
 import re
+import itertools
 import socket
 import sys
+import time
 import types
 import uuid
 
 import eventlet
+from eventlet import semaphore
 import greenlet
 from oslo.config import cfg
 
@@ -72,7 +75,11 @@ zmq_opts = [
 
     cfg.StrOpt('rpc_zmq_host', default=socket.gethostname(),
                help='Name of this node. Must be a valid hostname, FQDN, or '
-                    'IP address. Must match "host" option, if running Nova.')
+                    'IP address. Must match "host" option, if running Nova.'),
+
+    cfg.IntOpt('rpc_zmq_socket_idle_timeout', default=60,
+               help='Seconds an outgoing socket may stay unused before it '
+                    'is closed')
 ]
 
 
@@ -81,6 +88,8 @@ CONF.register_opts(zmq_opts)
 
 ZMQ_CTX = None  # ZeroMQ Context, must be global.
 matchmaker = None  # memoized matchmaker object
+client_pool = None  # outgoing sockets of this process
+reply_waiter = None  # reply socket of this process
 
 
 def _serialize(data):
@@ -211,24 +220,118 @@ class ZmqClient(object):
 
     def __init__(self, addr):
         self.outq = ZmqSocket(addr, zmq.PUSH, bind=False)
+        # NOTE: pooled clients are shared by greenthreads, the frames of
+        # two messages must not interleave.
+        self.lock = semaphore.Semaphore()
+        self.last_used = time.time()
 
     def cast(self, msg_id, topic, data, envelope):
         msg_id = msg_id or 0
 
         if not envelope:
-            self.outq.send(map(bytes,
-                           (msg_id, topic, 'cast', _serialize(data))))
-            return
+            frames = map(bytes, (msg_id, topic, 'cast', _serialize(data)))
+        else:
+            rpc_envelope = rpc_common.serialize_msg(data[1], envelope)
+            zmq_msg = itertools.chain.from_iterable(rpc_envelope.items())
+            frames = map(bytes, itertools.chain(
+                    (msg_id, topic, 'impl_zmq_v2', data[0]), zmq_msg))
 
-        rpc_envelope = rpc_common.serialize_msg(data[1], envelope)
-        zmq_msg = reduce(lambda x, y: x + y, rpc_envelope.items())
-        self.outq.send(map(bytes,
-                       (msg_id, topic, 'impl_zmq_v2', data[0]) + zmq_msg))
+        # The frames are handed to zmq as they are, without a copy.
+        with self.lock:
+            self.outq.send(frames, copy=False)
 
     def close(self):
         self.outq.close()
 
 
+class ZmqClientPool(object):
+    """The outgoing PUSH sockets of this process, by address.
+
+    Casts reuse the socket already connected to their address, instead
+    of connecting one per message.  Sockets unused for
+    rpc_zmq_socket_idle_timeout seconds are closed.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.clients = {}
+        self.last_sweep = time.time()
+
+    def get(self, addr):
+        now = time.time()
+        if now - self.last_sweep >= CONF.rpc_zmq_socket_idle_timeout:
+            self._sweep(now)
+        client = self.clients.get(addr)
+        if client is None:
+            client = self.clients[addr] = ZmqClient(addr)
+        client.last_used = now
+        return client
+
+    def discard(self, addr, client):
+        """Close client, which may be broken, and forget it."""
+        if self.clients.get(addr) is client:
+            del self.clients[addr]
+        client.close()
+
+    def _sweep(self, now):
+        self.last_sweep = now
+        for addr, client in self.clients.items():
+            if (now - client.last_used >= CONF.rpc_zmq_socket_idle_timeout
+                    and not client.lock.locked()):
+                del self.clients[addr]
+                client.close()
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+        self.clients = {}
+
+
+class ZmqReplyWaiter(object):
+    """The one SUB socket receiving the replies to the calls of this
+    process.
+
+    Each call subscribes its msg_id and gets a queue; a greenthread
+    receives the replies and puts each in the queue of its msg_id.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.queues = {}
+        self.sock = ZmqSocket("ipc://%s/zmq_topic_zmq_replies.%s" %
+                              (CONF.rpc_zmq_ipc_dir, CONF.rpc_zmq_host),
+                              zmq.SUB, bind=False)
+        self.thread = eventlet.spawn(self._receive)
+
+    def register(self, msg_id):
+        """Return the queue the replies to msg_id will be put in."""
+        replies = eventlet.queue.LightQueue()
+        self.queues[msg_id] = replies
+        self.sock.subscribe(msg_id)
+        return replies
+
+    def unregister(self, msg_id):
+        self.queues.pop(msg_id, None)
+        self.sock.unsubscribe(msg_id)
+
+    @excutils.forever_retry_uncaught_exceptions
+    def _receive(self):
+        while True:
+            try:
+                msg = self.sock.recv()
+            except greenlet.GreenletExit:
+                return
+            replies = self.queues.get(msg[0])
+            if replies is None:
+                LOG.debug(_("No call waiting for reply %s"), msg[0])
+                continue
+            replies.put(msg)
+
+    def close(self):
+        self.thread.kill()
+        self.sock.close()
+
+
 class RpcContext(rpc_common.CommonRpcContext):
     """Context that supports replying to a rpc.call."""
     def __init__(self, **kwargs):
@@ -456,13 +559,15 @@ class ZmqProxy(ZmqBaseReactor):
                     CONF.rpc_zmq_topic_backlog)
                 self.sockets.append(out_sock)
 
+                # NOTE: messages for the topic are queued from here on,
+                # the other topics need not wait for the pause below.
+                waiter.send(True)
+
                 # It takes some time for a pub socket to open,
                 # before we can have any faith in doing a send() to it.
                 if sock_type == zmq.PUB:
                     eventlet.sleep(.5)
 
-                waiter.send(True)
-
                 while(True):
                     data = self.topic_proxy[topic].get()
                     out_sock.send(data, copy=False)
@@ -624,16 +729,21 @@ def _cast(addr, context, topic, msg, timeout=None, envelope=False,
     payload = [RpcContext.marshal(context), msg]
 
     with Timeout(timeout_cast, exception=rpc_common.Timeout):
+        pool = _get_client_pool()
         try:
-            conn = ZmqClient(addr)
+            conn = pool.get(addr)
 
             # assumes cast can't return an exception
             conn.cast(_msg_id, topic, payload, envelope)
         except zmq.ZMQError:
+            if 'conn' in vars():
+                pool.discard(addr, conn)
             raise RPCException("Cast failed. ZMQ Socket Exception")
-        finally:
+        except rpc_common.Timeout:
+            # NOTE: the socket may be left in the middle of a message
             if 'conn' in vars():
-                conn.close()
+                pool.discard(addr, conn)
+            raise
 
 
 def _call(addr, context, topic, msg, timeout=None,
@@ -660,25 +770,20 @@ def _call(addr, context, topic, msg, timeout=None,
         }
     }
 
-    LOG.debug(_("Creating queue socket for reply waiter"))
+    LOG.debug(_("Subscribing reply waiter to %s"), msg_id)
 
     # Messages arriving async.
-    # TODO(ewindisch): have reply consumer with dynamic subscription mgmt
     with Timeout(timeout, exception=rpc_common.Timeout):
         try:
-            msg_waiter = ZmqSocket(
-                "ipc://%s/zmq_topic_zmq_replies.%s" %
-                (CONF.rpc_zmq_ipc_dir,
-                 CONF.rpc_zmq_host),
-                zmq.SUB, subscribe=msg_id, bind=False
-            )
+            msg_waiter = _get_reply_waiter()
+            replies = msg_waiter.register(msg_id)
 
             LOG.debug(_("Sending cast"))
             _cast(addr, context, topic, payload, envelope)
 
             LOG.debug(_("Cast sent; Waiting reply"))
             # Blocks until receives reply
-            msg = msg_waiter.recv()
+            msg = replies.get()
             LOG.debug(_("Received message: %s"), msg)
             LOG.debug(_("Unpacking response"))
 
@@ -698,8 +803,8 @@ def _call(addr, context, topic, msg, timeout=None,
         except (IndexError, KeyError):
             raise RPCException(_("RPC Message Invalid."))
         finally:
-            if 'msg_waiter' in vars():
-                msg_waiter.close()
+            if 'replies' in vars():
+                msg_waiter.unregister(msg_id)
 
     # It seems we don't need to do all of the following,
     # but perhaps it would be useful for multicall?
@@ -712,6 +817,20 @@ def _call(addr, context, topic, msg, timeout=None,
     return responses[-1]
 
 
+def _routing_key(msg):
+    """Return the instance uuid a message is about, if there is one."""
+    args = msg.get('args') if isinstance(msg, dict) else None
+    if not isinstance(args, dict):
+        return None
+    for name in ('instance_uuid', 'uuid'):
+        if isinstance(args.get(name), basestring):
+            return args[name]
+    instance = args.get('instance')
+    if isinstance(instance, dict):
+        return instance.get('uuid')
+    return None
+
+
 def _multi_send(method, context, topic, msg, timeout=None,
                 envelope=False, _msg_id=None):
     """Wraps the sending of messages.
@@ -721,7 +840,7 @@ def _multi_send(method, context, topic, msg, timeout=None,
     conf = CONF
     LOG.debug(_("%(msg)s") % {'msg': ' '.join(map(pformat, (topic, msg)))})
 
-    queues = _get_matchmaker().queues(topic)
+    queues = _get_matchmaker().queues(topic, routing_key=_routing_key(msg))
     LOG.debug(_("Sending message(s) to: %s"), queues)
 
     # Don't stack if we have no matchmaker results
@@ -786,6 +905,17 @@ def notify(conf, context, topic, msg, envelope):
 
 def cleanup():
     """Clean up resources in use by implementation."""
+    # NOTE: the context cannot be terminated while sockets are open
+    global client_pool
+    if client_pool:
+        client_pool.close()
+    client_pool = None
+
+    global reply_waiter
+    if reply_waiter:
+        reply_waiter.close()
+    reply_waiter = None
+
     global ZMQ_CTX
     if ZMQ_CTX:
         ZMQ_CTX.term()
@@ -805,6 +935,22 @@ def _get_ctxt():
     return ZMQ_CTX
 
 
+# NOTE: a forked worker must not use the sockets of its parent, it gets
+# its own (and leaves those to the parent).
+def _get_client_pool():
+    global client_pool
+    if client_pool is None or client_pool.pid != os.getpid():
+        client_pool = ZmqClientPool()
+    return client_pool
+
+
+def _get_reply_waiter():
+    global reply_waiter
+    if reply_waiter is None or reply_waiter.pid != os.getpid():
+        reply_waiter = ZmqReplyWaiter()
+    return reply_waiter
+
+
 def _get_matchmaker(*args, **kwargs):
     global matchmaker
     if not matchmaker:
@@ -58,6 +58,15 @@ class Exchange(object):
     def run(self, key):
         raise NotImplementedError()
 
+    def route(self, key, routing_key):
+        """Like run(), for a message that carries a routing key.
+
+        routing_key identifies what the message is about (an instance
+        uuid, say). Exchanges with host affinity override this, the
+        rest ignore the routing key.
+        """
+        return self.run(key)
+
 
 class Binding(object):
     """A binding on which to perform a lookup."""
@@ -133,14 +142,17 @@ class MatchMakerBase(object):
     #def add_negate_binding(self, binding, rule, last=True):
     #    self.bindings.append((binding, rule, True, last))
 
-    def queues(self, key):
+    def queues(self, key, routing_key=None):
         workers = []
 
         # bit is for negate bindings - if we choose to implement it.
         # last stops processing rules if this matches.
         for (binding, exchange, bit, last) in self.bindings:
             if binding.test(key):
-                workers.extend(exchange.run(key))
+                if routing_key is None:
+                    workers.extend(exchange.run(key))
+                else:
+                    workers.extend(exchange.route(key, routing_key))
 
                 # Support last.
                 if last:
@@ -18,8 +18,13 @@ The MatchMaker classes should except a Topic or Fanout exchange key and
 return keys for direct exchanges, per (approximate) AMQP parlance.
 """
 
+import bisect
+import hashlib
 import itertools
 import json
+import os
+import struct
+import time
 
 from oslo.config import cfg
 
@@ -35,6 +40,13 @@ matchmaker_opts = [
                deprecated_group='DEFAULT',
                default='/etc/oslo/matchmaker_ring.json',
                help='Matchmaker ring file (JSON)'),
+    cfg.IntOpt('hash_replicas',
+               default=100,
+               help='Virtual nodes per host on the consistent hash ring'),
+    cfg.IntOpt('ringfile_check_interval',
+               default=5,
+               help='Seconds between checks of the ring file for changes '
+                    'by MatchMakerConsistentHash. 0 disables reloading'),
 ]
 
 CONF = cfg.CONF
@@ -106,3 +118,174 @@ class MatchMakerRing(mm.MatchMakerBase):
         self.add_binding(mm.FanoutBinding(), FanoutRingExchange(ring))
         self.add_binding(mm.DirectBinding(), mm.DirectExchange())
         self.add_binding(mm.TopicBinding(), RoundRobinRingExchange(ring))
+
+
+def _hash(key):
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return struct.unpack('>I', hashlib.md5(key).digest()[:4])[0]
+
+
+class HashRing(object):
+    """Consistent hash ring with `replicas` virtual nodes per host.
+
+    Adding or removing one of N hosts only moves about 1/N of the keys.
+    """
+    def __init__(self, hosts, replicas=100):
+        self.hosts = sorted(set(hosts))
+        points = []
+        for host in self.hosts:
+            for replica in xrange(replicas):
+                points.append((_hash('%s-%d' % (host, replica)), host))
+        points.sort()
+        self._points = [point for point, host in points]
+        self._owners = [host for point, host in points]
+
+    def get_host(self, key):
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key))
+        if index == len(self._points):
+            index = 0
+        return self._owners[index]
+
+
+class ConsistentHashRingExchange(RingExchange):
+    """A Topic Exchange sending messages with a routing key to a fixed host.
+
+    Messages that carry a routing key (see route()) always land on the same
+    host of the topic while membership is unchanged.  Messages without one
+    are sent round robin, like RoundRobinRingExchange.
+
+    Membership comes from the ring file, re-read when it changes, or is
+    set with add_host()/remove_host().
+    """
+    def __init__(self, ring=None):
+        super(ConsistentHashRingExchange, self).__init__(ring)
+        self._reloadable = ring is None
+        self._checked_at = time.time()
+        self._mtime = None
+        if self._reloadable:
+            self._mtime = os.path.getmtime(CONF.matchmaker_ring.ringfile)
+        self.hash_rings = {}
+        for topic in self.ring.keys():
+            self._rebuild(topic)
+
+    def _rebuild(self, topic):
+        hosts = self.ring.get(topic)
+        if not hosts:
+            self.ring.pop(topic, None)
+            self.ring0.pop(topic, None)
+            self.hash_rings.pop(topic, None)
+            return
+        self.ring0[topic] = itertools.cycle(hosts)
+        self.hash_rings[topic] = HashRing(
+            hosts, CONF.matchmaker_ring.hash_replicas)
+
+    def _maybe_reload(self):
+        interval = CONF.matchmaker_ring.ringfile_check_interval
+        if not self._reloadable or not interval:
+            return
+        now = time.time()
+        if now - self._checked_at < interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(CONF.matchmaker_ring.ringfile)
+            if mtime == self._mtime:
+                return
+            with open(CONF.matchmaker_ring.ringfile, 'r') as fh:
+                ring = json.load(fh)
+        except (IOError, OSError, ValueError) as e:
+            LOG.warn(_("Failed to reload ringfile, keeping the current "
+                       "ring: %s") % e)
+            return
+        LOG.info(_("Reloaded ringfile %s") % CONF.matchmaker_ring.ringfile)
+        self._mtime = mtime
+        for topic in set(self.ring) | set(ring):
+            if self.ring.get(topic) != ring.get(topic):
+                self.ring[topic] = ring.get(topic)
+                self._rebuild(topic)
+
+    def add_host(self, topic, host):
+        hosts = self.ring.setdefault(topic, [])
+        if host not in hosts:
+            hosts.append(host)
+            self._rebuild(topic)
+
+    def remove_host(self, topic, host):
+        hosts = self.ring.get(topic, [])
+        if host in hosts:
+            hosts.remove(host)
+            self._rebuild(topic)
+
+    def has_host(self, topic, host):
+        return host in self.ring.get(topic, [])
+
+    def hosts(self, topic):
+        self._maybe_reload()
+        return self.ring.get(topic, [])
+
+    def run(self, key):
+        self._maybe_reload()
+        if not self._ring_has(key):
+            LOG.warn(
+                _("No key defining hosts for topic '%s', "
+                  "see ringfile") % (key, )
+            )
+            return []
+        host = next(self.ring0[key])
+        return [(key + '.' + host, host)]
+
+    def route(self, key, routing_key):
+        self._maybe_reload()
+        if not self._ring_has(key):
+            LOG.warn(
+                _("No key defining hosts for topic '%s', "
+                  "see ringfile") % (key, )
+            )
+            return []
+        host = self.hash_rings[key].get_host(routing_key)
+        return [(key + '.' + host, host)]
+
+
+class FanoutConsistentHashExchange(mm.Exchange):
+    """Fanout Exchange over the hosts of a ConsistentHashRingExchange."""
+    def __init__(self, topic_exchange):
+        super(FanoutConsistentHashExchange, self).__init__()
+        self.topic_exchange = topic_exchange
+
+    def run(self, key):
+        # Assume starts with "fanout~", strip it for lookup.
+        nkey = key.split('fanout~')[1:][0]
+        hosts = self.topic_exchange.hosts(nkey)
+        if not hosts:
+            LOG.warn(
+                _("No key defining hosts for topic '%s', "
+                  "see ringfile") % (nkey, )
+            )
+        return [(key + '.' + host, host) for host in hosts]
+
+
+class MatchMakerConsistentHash(mm.MatchMakerBase):
+    """Match Maker routing each routing key to a fixed host of a topic.
+
+    Hosts are loaded from the ring file like MatchMakerRing; ack_alive()
+    and expire() add and remove hosts at runtime.
+    """
+    def __init__(self, ring=None):
+        super(MatchMakerConsistentHash, self).__init__()
+        self.topic_exchange = ConsistentHashRingExchange(ring)
+        self.add_binding(mm.FanoutBinding(),
+                         FanoutConsistentHashExchange(self.topic_exchange))
+        self.add_binding(mm.DirectBinding(), mm.DirectExchange())
+        self.add_binding(mm.TopicBinding(), self.topic_exchange)
+
+    def ack_alive(self, key, host):
+        self.topic_exchange.add_host(key, host)
+
+    def is_alive(self, topic, host):
+        return self.topic_exchange.has_host(topic, host)
+
+    def expire(self, topic, host):
+        self.topic_exchange.remove_host(topic, host)
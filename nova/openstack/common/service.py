@@ -135,8 +135,13 @@ class ServiceWrapper(object):
         self.service = service
         self.workers = workers
         self.children = set()
+        self.indexes = {}
         self.forktimes = []
 
+    def free_index(self):
+        """Return the lowest worker index no running child holds."""
+        return min(set(xrange(self.workers)) - set(self.indexes.values()))
+
 
 class ProcessLauncher(object):
     def __init__(self):
@@ -205,8 +210,13 @@ class ProcessLauncher(object):
 
         wrap.forktimes.append(time.time())
 
+        # NOTE: a respawned child takes over the index of the one it
+        # replaces, so services may key per worker state on it.
+        index = wrap.free_index()
         pid = os.fork()
         if pid == 0:
+            wrap.service.worker_index = index
+            wrap.service.worker_count = wrap.workers
             # NOTE(johannes): All exceptions are caught to ensure this
             # doesn't fallback into the loop spawning children. It would
             # be bad for a child to spawn more children.
@@ -231,6 +241,7 @@ class ProcessLauncher(object):
         LOG.info(_('Started child %d'), pid)
 
         wrap.children.add(pid)
+        wrap.indexes[pid] = index
         self.children[pid] = wrap
 
         return pid
@@ -268,6 +279,7 @@ class ProcessLauncher(object):
 
         wrap = self.children.pop(pid)
         wrap.children.remove(pid)
+        wrap.indexes.pop(pid, None)
         return wrap
 
     def wait(self):
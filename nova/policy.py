@@ -17,7 +17,9 @@
 
 """Policy Engine For Nova."""
 
+import collections
 import os.path
+import time
 
 from oslo.config import cfg
 
@@ -34,6 +36,14 @@ policy_opts = [
     cfg.StrOpt('policy_default_rule',
                default='default',
                help=_('Rule checked when requested rule is not found')),
+    cfg.IntOpt('policy_check_interval',
+               default=5,
+               help=_('Seconds between checks of the policy file for '
+                      'changes. 0 checks on every policy enforcement')),
+    cfg.IntOpt('policy_cache_size',
+               default=1024,
+               help=_('Number of policy decisions remembered per rule, '
+                      'roles and project/user match. 0 disables the cache')),
     ]
 
 CONF = cfg.CONF
@@ -41,25 +51,44 @@ CONF.register_opts(policy_opts)
 
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+_LAST_CHECK = 0
+
+# Compiled form of the rules currently set in the common policy module,
+# and the names of the rules whose outcome only depends on the roles,
+# is_admin and whether the target's project/user are the caller's.
+_COMPILED_FROM = None
+_COMPILED = {}
+_CACHEABLE = frozenset()
+_DECISIONS = collections.OrderedDict()
+
+_OWNER_KEYS = ('project_id', 'user_id')
 
 
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _LAST_CHECK
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _LAST_CHECK = 0
+    _compile(None)
     policy.reset()
 
 
 def init():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _LAST_CHECK
     if not _POLICY_PATH:
         _POLICY_PATH = CONF.policy_file
         if not os.path.exists(_POLICY_PATH):
             _POLICY_PATH = CONF.find_file(_POLICY_PATH)
         if not _POLICY_PATH:
             raise exception.ConfigNotFound(path=CONF.policy_file)
+    now = time.time()
+    if _POLICY_CACHE and now - _LAST_CHECK < CONF.policy_check_interval:
+        return
+    _LAST_CHECK = now
     utils.read_cached_file(_POLICY_PATH, _POLICY_CACHE,
                            reload_func=_set_rules)
 
@@ -69,6 +98,105 @@ def _set_rules(data):
     policy.set_rules(policy.Rules.load_json(data, default_rule))
 
 
+def _is_cacheable(rules, name, seen=None):
+    """Whether a rule only looks at roles, is_admin and ownership."""
+    if seen is None:
+        seen = set()
+    if name in seen:
+        return True
+    seen.add(name)
+    try:
+        check = rules[name]
+    except KeyError:
+        return True
+
+    pending = [check]
+    while pending:
+        check = pending.pop()
+        if isinstance(check, (policy.AndCheck, policy.OrCheck)):
+            pending.extend(check.rules)
+        elif isinstance(check, policy.NotCheck):
+            pending.append(check.rule)
+        elif isinstance(check, policy.RuleCheck):
+            if not _is_cacheable(rules, check.match, seen):
+                return False
+        elif isinstance(check, policy.GenericCheck):
+            if (check.kind not in _OWNER_KEYS or
+                    check.match != '%%(%s)s' % check.kind):
+                return False
+        elif not isinstance(check, (policy.TrueCheck, policy.FalseCheck,
+                                    policy.RoleCheck, IsAdminCheck)):
+            return False
+    return True
+
+
+def _compile(rules):
+    global _COMPILED_FROM
+    global _COMPILED
+    global _CACHEABLE
+    _COMPILED_FROM = rules
+    _DECISIONS.clear()
+    if not rules:
+        _COMPILED = {}
+        _CACHEABLE = frozenset()
+        return
+    _COMPILED = policy.compile_rules(rules)
+    _CACHEABLE = frozenset(name for name in rules
+                           if _is_cacheable(rules, name))
+
+
+def _owner_match(target, key, value):
+    if key not in target:
+        return None
+    return ('%%(%s)s' % key) % target == unicode(value)
+
+
+def _check(context, action, target, credentials=None):
+    """Evaluate the compiled rule for action.
+
+    Decisions for rules that only depend on the caller's roles, is_admin
+    and whether it owns the target are remembered in a bounded LRU.
+    """
+    rules = policy._rules
+    if rules is not _COMPILED_FROM:
+        _compile(rules)
+    if not rules:
+        # No rules to reference means we're going to fail closed
+        return False
+
+    name = action
+    if name not in _COMPILED:
+        name = rules.default_rule
+        if name not in _COMPILED:
+            return False
+    func = _COMPILED[name]
+
+    key = None
+    if CONF.policy_cache_size and name in _CACHEABLE:
+        key = (name,
+               tuple(sorted(set(r.lower() for r in context.roles))),
+               context.is_admin,
+               _owner_match(target, 'project_id', context.project_id),
+               _owner_match(target, 'user_id', context.user_id))
+        result = _DECISIONS.pop(key, None)
+        if result is not None:
+            _DECISIONS[key] = result
+            return result
+
+    if credentials is None:
+        credentials = context.to_dict()
+    try:
+        result = func(target, credentials)
+    except KeyError:
+        result = False
+
+    if key is not None:
+        _DECISIONS[key] = result
+        while len(_DECISIONS) > CONF.policy_cache_size:
+            _DECISIONS.popitem(last=False)
+    return result
+
+
 def enforce(context, action, target, do_raise=True):
     """Verifies that the action is valid on the target in this context.
 
@@ -93,14 +221,10 @@ def enforce(context, action, target, do_raise=True):
     """
     init()
 
-    credentials = context.to_dict()
-
-    # Add the exception arguments if asked to do a raise
-    extra = {}
-    if do_raise:
-        extra.update(exc=exception.PolicyNotAuthorized, action=action)
-
-    return policy.check(action, target, credentials, **extra)
+    result = _check(context, action, target)
+    if do_raise and result is False:
+        raise exception.PolicyNotAuthorized(action=action)
+    return result
 
 
 def check_is_admin(context):
@@ -113,7 +237,7 @@ def check_is_admin(context):
     credentials = context.to_dict()
     target = credentials
 
-    return policy.check('context_is_admin', target, credentials)
+    return _check(context, 'context_is_admin', target, credentials)
 
 
 @policy.register('is_admin')
@@ -131,3 +255,9 @@ class IsAdminCheck(policy.Check):
         """Determine whether is_admin matches the requested value."""
 
         return creds['is_admin'] == self.expected
+
+    def compile(self, compiler):
+        """Compile the check."""
+
+        expected = self.expected
+        return lambda target, creds: creds['is_admin'] == expected
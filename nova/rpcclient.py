@@ -84,6 +84,9 @@ class RPCClient(object):
     def call(self, ctxt, method, **kwargs):
         return self._invoke(self.proxy.call, ctxt, method, **kwargs)
 
+    def multicall(self, ctxt, method, **kwargs):
+        return self._invoke(self.proxy.multicall, ctxt, method, **kwargs)
+
     def can_send_version(self, version):
         return self.proxy.can_send_version(version)
 
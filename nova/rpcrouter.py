@@ -0,0 +1,125 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Spread the host queue of a multi-worker service over its workers.
+
+If every worker consumed '<topic>.<host>', two casts about the same
+android could run at the same time in two processes, or in the wrong
+order.  Instead every worker consumes its own '<topic>.<host>.<index>'
+queue, and worker 0 alone consumes '<topic>.<host>' through a
+WorkerRouter.  The router casts each message on to the worker queue its
+routing key hashes to, in the order the messages arrived, so the
+messages about one key are always handled, in order, by the same worker.
+"""
+
+import zlib
+
+import eventlet
+from eventlet import queue
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova.openstack.common import rpc
+
+LOG = logging.getLogger(__name__)
+
+
+def worker_topic(topic, index):
+    """Return the queue name of worker index for topic."""
+    return '%s.%d' % (topic, index)
+
+
+def pick_worker(key, workers):
+    """Return the index of the worker handling key.
+
+    crc32 rather than hash(), so every process and every host picks the
+    same worker for a key.
+    """
+    return (zlib.crc32(key) & 0xffffffff) % workers
+
+
+def declare_worker_queues(topic, workers):
+    """Declare the queues of all the workers of topic.
+
+    A broker drops a cast to a topic no queue is bound to yet, and the
+    other workers may not have declared theirs when worker 0 starts
+    routing.  The queues are declared through a connection of their own,
+    which is closed without consuming from them.  Brokerless drivers
+    (zmq, fake) have nothing to declare.
+    """
+    conn = rpc.create_connection(new=True)
+    try:
+        declare = getattr(conn, 'declare_topic_consumer', None)
+        if declare is None:
+            return
+        for index in xrange(workers):
+            declare(worker_topic(topic, index))
+    finally:
+        conn.close()
+
+
+class WorkerRouter(object):
+    """Route the messages of a host queue to the workers of the host.
+
+    route(method, kwargs, pick) splits the arguments of a message by
+    worker and returns a {worker index: kwargs} dict, calling pick(key)
+    for the worker of each routing key.  Messages it returns nothing for,
+    and calls, whose reply has to come from here, are dispatched in this
+    worker.
+    """
+
+    def __init__(self, topic, workers, dispatcher, route):
+        self.topic = topic
+        self.workers = workers
+        self.dispatcher = dispatcher
+        self.route = route
+        self._queue = queue.LightQueue()
+        self._sender = None
+
+    def declare_queues(self):
+        """Declare the worker queues, before consuming the host queue."""
+        declare_worker_queues(self.topic, self.workers)
+
+    def _pick(self, key):
+        return pick_worker(key, self.workers)
+
+    def dispatch(self, ctxt, version, method, namespace, **kwargs):
+        routes = None
+        if not getattr(ctxt, 'msg_id', None):
+            routes = self.route(method, kwargs, self._pick)
+        if not routes:
+            return self.dispatcher.dispatch(ctxt, version, method, namespace,
+                                            **kwargs)
+
+        # NOTE: the consumer spawns one greenthread per message, in order,
+        # and they get here before their first switch.  Queueing rather
+        # than casting here keeps that order on the worker queues.
+        for index in sorted(routes):
+            msg = {'method': method, 'namespace': namespace,
+                   'args': routes[index]}
+            if version is not None:
+                msg['version'] = version
+            self._queue.put((ctxt, worker_topic(self.topic, index), msg))
+        if self._sender is None:
+            self._sender = eventlet.spawn(self._send)
+
+    def _send(self):
+        while True:
+            ctxt, topic, msg = self._queue.get()
+            try:
+                rpc.cast(ctxt, topic, msg)
+            except Exception:
+                LOG.exception(_('Failed to route %(method)s to %(topic)s'),
+                              {'method': msg['method'], 'topic': topic})
@@ -33,6 +33,7 @@ from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import rpc
 from nova.openstack.common import service
+from nova import rpcrouter
 from nova import servicegroup
 from nova import utils
 from nova import version
@@ -143,6 +144,9 @@ class Service(service.Service):
         self.periodic_interval_max = periodic_interval_max
         self.saved_args, self.saved_kwargs = args, kwargs
         self.backdoor_port = None
+        # NOTE: set by the ProcessLauncher in each forked worker
+        self.worker_index = 0
+        self.worker_count = 1
         self.conductor_api = conductor.API(use_local=db_allowed)
         self.conductor_api.wait_until_ready(context.get_admin_context())
 
@@ -176,7 +180,22 @@ class Service(service.Service):
         self.conn.create_consumer(self.topic, rpc_dispatcher, fanout=False)
 
         node_topic = '%s.%s' % (self.topic, self.host)
-        self.conn.create_consumer(node_topic, rpc_dispatcher, fanout=False)
+        route = getattr(self.manager, 'route_message', None)
+        if self.worker_count > 1 and route is not None:
+            # Each worker takes the messages routed to it; worker 0 also
+            # routes the messages sent to the host.
+            if self.worker_index == 0:
+                router = rpcrouter.WorkerRouter(node_topic, self.worker_count,
+                                                rpc_dispatcher, route)
+                router.declare_queues()
+                self.conn.create_consumer(node_topic, router, fanout=False)
+            worker_topic = rpcrouter.worker_topic(node_topic,
+                                                  self.worker_index)
+            self.conn.create_consumer(worker_topic, rpc_dispatcher,
+                                      fanout=False)
+        else:
+            self.conn.create_consumer(node_topic, rpc_dispatcher,
+                                      fanout=False)
 
         self.conn.create_consumer(self.topic, rpc_dispatcher, fanout=True)
 
@@ -273,6 +292,11 @@ class Service(service.Service):
         except Exception:
             pass
 
+        try:
+            self.manager.cleanup_host()
+        except Exception:
+            LOG.exception(_('Service error occurred during cleanup_host'))
+
         super(Service, self).stop()
 
     def periodic_tasks(self, raise_on_error=False):
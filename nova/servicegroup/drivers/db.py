@@ -26,6 +26,7 @@ from nova import utils
 
 CONF = cfg.CONF
 CONF.import_opt('service_down_time', 'nova.service')
+CONF.import_opt('heartbeat_aggregate', 'nova.conductor.api', group='conductor')
 
 LOG = logging.getLogger(__name__)
 
@@ -87,13 +88,14 @@ class DbDriver(api.ServiceGroupDriver):
     def _report_state(self, service):
         """Update the state of this service in the datastore."""
         ctxt = context.get_admin_context()
-        state_catalog = {}
         try:
-            report_count = service.service_ref['report_count'] + 1
-            state_catalog['report_count'] = report_count
-
-            service.service_ref = self.conductor_api.service_update(ctxt,
-                    service.service_ref, state_catalog)
+            if CONF.conductor.heartbeat_aggregate:
+                # NOTE: fire and forget, the conductor batches the write
+                # and keeps report_count itself.
+                self.conductor_api.service_heartbeat(ctxt,
+                                                     service.service_ref)
+            else:
+                self._update_state(ctxt, service)
 
             # TODO(termie): make this pattern be more elegant.
             if getattr(service, 'model_disconnected', False):
@@ -105,3 +107,11 @@ class DbDriver(api.ServiceGroupDriver):
             if not getattr(service, 'model_disconnected', False):
                 service.model_disconnected = True
                 LOG.exception(_('model server went away'))
+
+    def _update_state(self, ctxt, service):
+        state_catalog = {}
+        report_count = service.service_ref['report_count'] + 1
+        state_catalog['report_count'] = report_count
+
+        service.service_ref = self.conductor_api.service_update(ctxt,
+                service.service_ref, state_catalog)
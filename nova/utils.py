@@ -24,6 +24,7 @@ import datetime
 import functools
 import hashlib
 import inspect
+import itertools
 import os
 import pyclbr
 import random
@@ -749,6 +750,16 @@ def convert_to_list_dict(lst, label):
     return [{label: x} for x in lst]
 
 
+def batches(iterable, size):
+    """Yield lists of up to size consecutive items of iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 def timefunc(func):
     """Decorator that logs how long a particular function took to execute."""
     @functools.wraps(func)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare concurrent android transitions on one agent.
+
+'blocking' models the old AndroidManager: every transition holds one RPC
+worker greenthread (GreenPool of rpc_thread_pool_size) for its whole
+duration.  'engine' registers the step with TransitionEngine and frees the
+worker immediately.  Both report how many transitions completed and the
+peak number in flight.
+
+    python tools/benchmarks/android_transitions.py --count 5000
+"""
+
+import optparse
+import os
+import sys
+import time
+
+import eventlet
+from eventlet import greenpool
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from nova.android.agent import engine
+
+
+class Counter(object):
+    def __init__(self):
+        self.inflight = 0
+        self.peak = 0
+        self.done = 0
+
+    def begin(self):
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+
+    def finish(self):
+        self.inflight -= 1
+        self.done += 1
+
+
+def run_blocking(count, duration, pool_size):
+    counter = Counter()
+    pool = greenpool.GreenPool(pool_size)
+
+    def handler():
+        counter.begin()
+        eventlet.sleep(duration)
+        counter.finish()
+
+    start = time.time()
+    for i in xrange(count):
+        pool.spawn_n(handler)
+    pool.waitall()
+    return counter, time.time() - start
+
+
+def run_engine(count, duration, pool_size):
+    counter = Counter()
+    pool = greenpool.GreenPool(pool_size)
+    eng = engine.TransitionEngine(pool_size=pool_size)
+
+    def handler(key):
+        counter.begin()
+        eng.schedule(key, duration, counter.finish)
+
+    start = time.time()
+    for i in xrange(count):
+        pool.spawn_n(handler, i)
+    pool.waitall()
+    while counter.done < count:
+        eventlet.sleep(0.01)
+    elapsed = time.time() - start
+    eng.stop()
+    return counter, elapsed
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--count', type='int', default=5000,
+                      help='transitions to drive')
+    parser.add_option('--duration', type='float', default=1.0,
+                      help='seconds each transition takes')
+    parser.add_option('--pool-size', type='int', default=64,
+                      help='rpc_thread_pool_size of the agent')
+    options, args = parser.parse_args()
+
+    for name, func in (('blocking', run_blocking), ('engine', run_engine)):
+        counter, elapsed = func(options.count, options.duration,
+                                options.pool_size)
+        print('%-8s done=%d peak_inflight=%d elapsed=%.2fs rate=%.1f/s' %
+              (name, counter.done, counter.peak, elapsed,
+               counter.done / elapsed))
+
+
+if __name__ == '__main__':
+    main()
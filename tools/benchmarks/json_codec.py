@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time the two serialization passes of a conductor reply.
+
+The payload is what android_get_all/service_get_all_by send back: a list
+of Instance (or Service) rows.  'walk' converts each row through
+dict(row.iteritems()) and the generic to_primitive walk, as before rows
+had their own to_primitive(); 'row' uses the model fast path.  The
+serialize_msg() pass is then timed with the stdlib json module and with
+the backend jsonutils picked.
+
+    python tools/benchmarks/json_codec.py --rows 200 --rounds 200
+"""
+
+import datetime
+import optparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from nova.db.sqlalchemy import models
+from nova.openstack.common import jsonutils
+from nova.openstack.common.rpc import common as rpc_common
+
+
+def make_instances(count):
+    now = datetime.datetime.utcnow()
+    return [models.Instance(id=i, user_id='user', project_id='project',
+                            android_state='active', task_state=None,
+                            launched_at=now, terminated_at=None,
+                            display_name='android-%d' % i,
+                            uuid=str(uuid.uuid4()), progress=100,
+                            verdor='vendor-1', host='agent-%d' % (i % 16),
+                            created_at=now, updated_at=now,
+                            deleted_at=None, deleted=0)
+            for i in xrange(count)]
+
+
+def make_services(count):
+    now = datetime.datetime.utcnow()
+    return [models.Service(id=i, host='agent-%d' % i, binary='nova-android',
+                           topic='android', report_count=i * 10,
+                           disabled=False, disabled_reason=None,
+                           created_at=now, updated_at=now, deleted_at=None,
+                           deleted=0)
+            for i in xrange(count)]
+
+
+def walk(rows):
+    return jsonutils.to_primitive([dict(row.iteritems()) for row in rows])
+
+
+def timed(name, rounds, func, *args):
+    start = time.time()
+    for i in xrange(rounds):
+        result = func(*args)
+    elapsed = time.time() - start
+    print('%-28s %8.1f us/round' % (name, elapsed * 1e6 / rounds))
+    return result
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--rows', type='int', default=200)
+    parser.add_option('--rounds', type='int', default=200)
+    options, args = parser.parse_args()
+
+    backend = jsonutils.get_backend()
+    for name, rows in (('instances', make_instances(options.rows)),
+                       ('services', make_services(options.rows))):
+        print('%d %s, dumps backend %s' % (options.rows, name, backend))
+        walked = timed('to_primitive (walk)', options.rounds, walk, rows)
+        primitive = timed('to_primitive (row)', options.rounds,
+                          jsonutils.to_primitive, rows)
+        assert walked == primitive
+
+        msg = {'result': primitive, 'failure': None}
+        jsonutils.set_backend('json')
+        timed('serialize_msg (json)', options.rounds,
+              rpc_common.serialize_msg, msg)
+        jsonutils.set_backend(backend)
+        timed('serialize_msg (%s)' % backend, options.rounds,
+              rpc_common.serialize_msg, msg)
+
+
+if __name__ == '__main__':
+    main()
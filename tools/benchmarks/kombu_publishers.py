@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Exchange declarations per message of impl_kombu publishing.
+
+Sends casts, fanouts and replies over kombu's in-memory transport
+(fake_rabbit), once by building a publisher per message as
+publisher_send() used to, and once through publisher_send() and its
+publisher cache.  Replies go in turn to --reply-queues reply queues,
+whose publishers are cached (with more of them than
+rabbit_reply_publisher_cache_size, the LRU evicts publishers), and to
+--msg-ids msg_id queues (old style callers), whose are not.
+
+    python tools/benchmarks/kombu_publishers.py --messages 20000
+"""
+
+import optparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+import kombu.entity
+from oslo.config import cfg
+
+from nova.openstack.common.rpc import common as rpc_common
+from nova.openstack.common.rpc import impl_kombu
+
+DECLARES = [0]
+
+
+def count_declares():
+    declare = kombu.entity.Exchange.declare
+
+    def counting_declare(self, *args, **kwargs):
+        DECLARES[0] += 1
+        return declare(self, *args, **kwargs)
+    kombu.entity.Exchange.declare = counting_declare
+
+
+def make_sends(conn, reply_queues, msg_ids):
+    return [(impl_kombu.TopicPublisher, 'conductor', conn.topic_send),
+            (impl_kombu.FanoutPublisher, 'conductor', conn.fanout_send)] + \
+           [(impl_kombu.DirectPublisher, reply_q, conn.direct_send)
+            for reply_q in reply_queues] + \
+           [(impl_kombu.DirectPublisher, msg_id, conn.direct_send)
+            for msg_id in msg_ids]
+
+
+def run(name, messages, func):
+    DECLARES[0] = 0
+    start = time.time()
+    for i in xrange(messages):
+        func(i)
+    elapsed = time.time() - start
+    print('%-8s %8d messages %8.2f us/message %6.3f declares/message' %
+          (name, messages, elapsed * 1e6 / messages,
+           float(DECLARES[0]) / messages))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--messages', type='int', default=20000)
+    parser.add_option('--reply-queues', type='int', default=16)
+    parser.add_option('--msg-ids', type='int', default=16)
+    options, args = parser.parse_args()
+
+    cfg.CONF([], project='nova')
+    cfg.CONF.set_override('fake_rabbit', True)
+    count_declares()
+    conn = impl_kombu.Connection(cfg.CONF)
+    reply_queues = ['reply_%s' % uuid.uuid4().hex
+                    for i in xrange(options.reply_queues)]
+    msg_ids = [uuid.uuid4().hex for i in xrange(options.msg_ids)]
+    sends = make_sends(conn, reply_queues, msg_ids)
+    msg = rpc_common.serialize_msg({'method': 'service_heartbeat',
+                                    'args': {'service_id': 1}})
+
+    def legacy(i):
+        cls, topic, send = sends[i % len(sends)]
+        cls(cfg.CONF, conn.channel, topic).send(msg)
+
+    def cached(i):
+        cls, topic, send = sends[i % len(sends)]
+        send(topic, msg)
+
+    run('legacy', options.messages, legacy)
+    run('cached', options.messages, cached)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Logging overhead of one RPC call.
+
+Replays the log calls amqp makes for a call() and its reply (sending,
+MSG_ID, UNIQUE_ID, unpacked context, received message) through the
+previous path, where LoggerAdapter built the extra data and _safe_log()
+deep copied the message before the level check, and through the current
+one.  Each is run with DEBUG off, with DEBUG written to /dev/null, and
+with DEBUG written to /dev/null through the log_async handler.
+
+    python tools/benchmarks/log_overhead.py --calls 20000
+"""
+
+import copy
+import logging
+import optparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova import context
+from nova.openstack.common import log
+from nova.openstack.common.rpc import common as rpc_common
+
+LOG = log.getLogger('nova.openstack.common.rpc.amqp')
+
+
+def legacy_safe_log(log_func, msg, msg_data):
+    return log_func(msg, copy.deepcopy(msg_data))
+
+
+def legacy_call(ctxt, message):
+    debug = lambda *args, **kwargs: logging.LoggerAdapter.debug(LOG, *args,
+                                                                **kwargs)
+    debug('Making synchronous call on %s ...', 'conductor')
+    debug('MSG_ID is %s' % uuid.uuid4().hex)
+    debug('UNIQUE_ID is %s.' % uuid.uuid4().hex)
+    legacy_safe_log(debug, 'unpacked context: %s', ctxt.to_dict())
+    legacy_safe_log(debug, 'received %s', message)
+
+
+def fast_call(ctxt, message):
+    LOG.debug('Making synchronous call on %s ...', 'conductor')
+    LOG.debug('MSG_ID is %s', uuid.uuid4().hex)
+    LOG.debug('UNIQUE_ID is %s.', uuid.uuid4().hex)
+    rpc_common._safe_log(LOG.debug, 'unpacked context: %s', ctxt.to_dict())
+    rpc_common._safe_log(LOG.debug, 'received %s', message)
+
+
+def configure(level, use_async):
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    handler.setFormatter(log.ContextFormatter())
+    if use_async:
+        handler = log.AsyncHandler([handler])
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+
+def timed(name, calls, func, *args):
+    start = time.time()
+    for i in xrange(calls):
+        func(*args)
+    elapsed = time.time() - start
+    print('%-28s %8.2f us/call' % (name, elapsed * 1e6 / calls))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--calls', type='int', default=20000)
+    options, args = parser.parse_args()
+
+    cfg.CONF([], project='nova')
+    ctxt = context.RequestContext('user', 'project', is_admin=False,
+                                  roles=['member'])
+    message = {'method': 'android_get_all_by_filters',
+               'args': {'filters': {'host': 'agent-1'}, 'limit': 100,
+                        'marker': None, 'columns': None},
+               'namespace': 'android', 'version': '1.0',
+               '_msg_id': uuid.uuid4().hex,
+               '_unique_id': uuid.uuid4().hex}
+
+    for name, level, use_async in (
+            ('debug off', logging.INFO, False),
+            ('debug', logging.DEBUG, False),
+            ('debug, log_async', logging.DEBUG, True)):
+        handler = configure(level, use_async)
+        timed('legacy, %s' % name, options.calls, legacy_call, ctxt, message)
+        timed('fast, %s' % name, options.calls, fast_call, ctxt, message)
+        handler.flush()
+
+
+if __name__ == '__main__':
+    main()
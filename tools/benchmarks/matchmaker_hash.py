@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lookup cost and key movement of MatchMakerConsistentHash.
+
+Times queues() for round robin (MatchMakerRing) and consistent hash
+routing over --hosts agents, then adds and removes one agent and reports
+the fraction of --keys routing keys that moved to another host (ideally
+about 1/hosts) and the spread of keys over hosts.
+
+    python tools/benchmarks/matchmaker_hash.py --hosts 50 --keys 100000
+"""
+
+import collections
+import optparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova.openstack.common.rpc import matchmaker_ring
+
+TOPIC = 'android'
+
+
+def timed(name, count, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print('%-24s %8d lookups %8.2f us/lookup' %
+          (name, count, elapsed * 1e6 / count))
+
+
+def placement(matchmaker, keys):
+    return dict((key, matchmaker.queues(TOPIC, routing_key=key)[0][1])
+                for key in keys)
+
+
+def moved(before, after):
+    changed = sum(1 for key in before if before[key] != after[key])
+    return changed / float(len(before))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--hosts', type='int', default=50)
+    parser.add_option('--keys', type='int', default=100000)
+    parser.add_option('--replicas', type='int', default=100)
+    options, args = parser.parse_args()
+
+    cfg.CONF([], project='nova')
+    cfg.CONF.set_override('hash_replicas', options.replicas,
+                          group='matchmaker_ring')
+    hosts = ['agent-%d' % i for i in xrange(options.hosts)]
+    keys = [str(uuid.uuid4()) for i in xrange(options.keys)]
+
+    round_robin = matchmaker_ring.MatchMakerRing({TOPIC: list(hosts)})
+    hashed = matchmaker_ring.MatchMakerConsistentHash({TOPIC: list(hosts)})
+
+    def lookup_round_robin():
+        for key in keys:
+            round_robin.queues(TOPIC)
+
+    def lookup_hashed():
+        for key in keys:
+            hashed.queues(TOPIC, routing_key=key)
+
+    timed('round robin', len(keys), lookup_round_robin)
+    timed('consistent hash', len(keys), lookup_hashed)
+
+    before = placement(hashed, keys)
+    load = collections.Counter(before.itervalues())
+    print('keys per host: min %d max %d ideal %d' %
+          (min(load.values()), max(load.values()),
+           len(keys) // len(hosts)))
+
+    hashed.ack_alive(TOPIC, 'agent-new')
+    after_add = placement(hashed, keys)
+    hashed.expire(TOPIC, 'agent-new')
+    hashed.expire(TOPIC, hosts[0])
+    after_remove = placement(hashed, keys)
+    print('moved on add:    %.4f (ideal %.4f)' %
+          (moved(before, after_add), 1.0 / (len(hosts) + 1)))
+    print('moved on remove: %.4f (ideal %.4f)' %
+          (moved(before, after_remove), 1.0 / len(hosts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Microbenchmark for the in process memorycache.Client.
+
+Fills the cache with --keys entries (half of them expiring) and times
+set, get, get_multi and an LRU bounded fill.  The old full-scan get is
+timed over a small number of lookups for comparison, since every one of
+its lookups walks the whole cache.
+
+    python tools/benchmarks/memorycache.py --keys 100000
+"""
+
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
+
+
+class ScanClient(object):
+    """The previous get(): expunge every expired key on each lookup."""
+
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, key):
+        now = timeutils.utcnow_ts()
+        for k in self.cache.keys():
+            (timeout, _value) = self.cache[k]
+            if timeout and now >= timeout:
+                del self.cache[k]
+        return self.cache.get(key, (0, None))[1]
+
+    def set(self, key, value, time=0):
+        timeout = 0
+        if time != 0:
+            timeout = timeutils.utcnow_ts() + time
+        self.cache[key] = (timeout, value)
+
+
+def timed(name, count, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print('%-22s %8d ops %8.3fs %10.2f us/op' %
+          (name, count, elapsed, elapsed * 1e6 / count))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--keys', type='int', default=100000)
+    parser.add_option('--scan-lookups', type='int', default=100)
+    options, args = parser.parse_args()
+
+    keys = ['token-%d' % i for i in xrange(options.keys)]
+    client = memorycache.Client()
+
+    def fill():
+        for i, key in enumerate(keys):
+            client.set(key, key, time=600 if i % 2 else 0)
+
+    def lookup():
+        for key in keys:
+            client.get(key)
+
+    def lookup_multi():
+        for i in xrange(0, len(keys), 100):
+            client.get_multi(keys[i:i + 100])
+
+    timed('set', len(keys), fill)
+    timed('get', len(keys), lookup)
+    timed('get_multi (100/call)', len(keys), lookup_multi)
+
+    bounded = memorycache.Client(max_size=len(keys) // 10)
+
+    def fill_bounded():
+        for key in keys:
+            bounded.set(key, key, time=600)
+
+    timed('set (lru max_size/10)', len(keys), fill_bounded)
+    print('stats %s' % client.stats)
+    print('lru stats %s' % bounded.stats)
+
+    scan = ScanClient()
+    for i, key in enumerate(keys):
+        scan.set(key, key, time=600 if i % 2 else 0)
+
+    def scan_lookup():
+        for key in keys[:options.scan_lookups]:
+            scan.get(key)
+
+    timed('get (full scan, old)', options.scan_lookups, scan_lookup)
+
+
+if __name__ == '__main__':
+    main()
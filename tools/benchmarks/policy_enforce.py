@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time nova.policy.enforce() against the previous evaluation path.
+
+The previous path stat()s policy.json, builds context.to_dict() and walks
+the Check tree on every call.  Both run over etc/nova/policy.json.
+
+    python tools/benchmarks/policy_enforce.py --calls 1000000
+"""
+
+import optparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                    os.pardir, os.pardir))
+sys.path.insert(0, ROOT)
+
+from oslo.config import cfg
+
+from nova import context
+from nova.openstack.common import policy as common_policy
+from nova import policy
+from nova import utils
+
+ACTIONS = ('compute_extension:admin_actions:pause',
+           'compute_extension:accounts',
+           'compute:get_all',
+           'compute_extension:v3:os-services')
+
+
+def legacy_enforce(cache, ctxt, action, target):
+    utils.read_cached_file(cfg.CONF.policy_file, cache,
+                           reload_func=policy._set_rules)
+    credentials = ctxt.to_dict()
+    return common_policy.check(action, target, credentials)
+
+
+def timed(name, calls, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print('%-10s %9d calls %8.2fs %8.2f us/call' %
+          (name, calls, elapsed, elapsed * 1e6 / calls))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--calls', type='int', default=1000000)
+    options, args = parser.parse_args()
+
+    cfg.CONF([], project='nova')
+    cfg.CONF.set_override('policy_file',
+                          os.path.join(ROOT, 'etc', 'nova', 'policy.json'))
+    ctxt = context.RequestContext('user', 'project', is_admin=False,
+                                  roles=['member'])
+    targets = ({'project_id': 'project', 'user_id': 'user'},
+               {'project_id': 'other', 'user_id': 'other'})
+    calls = options.calls
+
+    def run_legacy():
+        cache = {}
+        for i in xrange(calls):
+            legacy_enforce(cache, ctxt, ACTIONS[i % 4], targets[i % 2])
+
+    def run_enforce():
+        for i in xrange(calls):
+            policy.enforce(ctxt, ACTIONS[i % 4], targets[i % 2],
+                           do_raise=False)
+
+    timed('legacy', calls, run_legacy)
+    timed('enforce', calls, run_enforce)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time RpcDispatcher.dispatch() against the previous lookup loop.
+
+The callbacks are laid out like the conductor's: the base API (namespace
+'baseapi'), then a manager that hands unknown attributes to its plugin
+through __getattr__.  Messages go to a manager method, a plugin method
+and a base API method in turn.
+
+    python tools/benchmarks/rpc_dispatch.py --calls 200000
+"""
+
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from nova.openstack.common.rpc import common as rpc_common
+from nova.openstack.common.rpc import dispatcher
+
+
+class BaseAPI(object):
+    RPC_API_NAMESPACE = 'baseapi'
+    RPC_API_VERSION = '1.3'
+
+    def ping(self, context, arg):
+        return arg
+
+
+class Plugin(object):
+    def android_get_by_uid(self, context, uuid):
+        return uuid
+
+
+class Manager(object):
+    RPC_API_VERSION = '1.59'
+
+    def __init__(self):
+        self.plugin = Plugin()
+
+    def __getattr__(self, key):
+        plugin = self.__dict__.get('plugin', None)
+        return getattr(plugin, key)
+
+    def service_get_all_by(self, context, topic=None):
+        return topic
+
+
+def legacy_dispatch(callbacks, ctxt, version, method, namespace, **kwargs):
+    if not version:
+        version = '1.0'
+
+    had_compatible = False
+    for proxyobj in callbacks:
+        try:
+            cb_namespace = proxyobj.RPC_API_NAMESPACE
+        except AttributeError:
+            cb_namespace = None
+
+        if namespace != cb_namespace:
+            continue
+
+        try:
+            rpc_api_version = proxyobj.RPC_API_VERSION
+        except AttributeError:
+            rpc_api_version = '1.0'
+
+        version_parts = version.split('.')
+        imp_version_parts = rpc_api_version.split('.')
+        is_compatible = (
+            int(version_parts[0]) == int(imp_version_parts[0]) and
+            int(version_parts[1]) <= int(imp_version_parts[1]))
+        had_compatible = had_compatible or is_compatible
+
+        if not hasattr(proxyobj, method):
+            continue
+        if is_compatible:
+            return getattr(proxyobj, method)(ctxt, **kwargs)
+
+    if had_compatible:
+        raise AttributeError("No such RPC function '%s'" % method)
+    else:
+        raise rpc_common.UnsupportedRpcVersion(version=version)
+
+
+MESSAGES = (('1.59', 'service_get_all_by', None, {'topic': 'android'}),
+            ('1.0', 'android_get_by_uid', None, {'uuid': 'uuid'}),
+            ('1.3', 'ping', 'baseapi', {'arg': 'arg'}))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--calls', type='int', default=200000)
+    options, args = parser.parse_args()
+
+    callbacks = [BaseAPI(), Manager()]
+    rpc_dispatcher = dispatcher.RpcDispatcher(callbacks)
+    calls = options.calls
+
+    def run_legacy():
+        for i in xrange(calls):
+            version, method, namespace, kwargs = MESSAGES[i % 3]
+            legacy_dispatch(callbacks, None, version, method, namespace,
+                            **kwargs)
+
+    def run_dispatch():
+        for i in xrange(calls):
+            version, method, namespace, kwargs = MESSAGES[i % 3]
+            rpc_dispatcher.dispatch(None, version, method, namespace,
+                                    **kwargs)
+
+    for name, func in (('legacy', run_legacy), ('dispatch', run_dispatch)):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        print('%-10s %9d calls %8.2f us/call' %
+              (name, calls, elapsed * 1e6 / calls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Count broker publishes per rpc.call on the shared AMQP code path.
+
+Like impl_fake, messages never leave the process: an in-memory connection
+hands every published message straight to the consumer registered for its
+queue and counts the publish.  The run is repeated with callers that
+advertise the 2.0 reply format (result and 'ending' in two messages) and
+2.1 (one combined message).
+
+    python tools/benchmarks/rpc_replies.py --calls 2000
+"""
+
+import optparse
+import os
+import sys
+import time
+
+import eventlet
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+# NOTE: imported for the rpc options it registers.
+from nova.openstack.common import rpc  # noqa
+from nova.openstack.common.rpc import amqp
+from nova.openstack.common.rpc import common as rpc_common
+from nova.openstack.common.rpc import dispatcher
+
+TOPIC = 'bench'
+
+
+class InMemoryConnection(object):
+    pool = None
+    consumers = {}
+    publishes = 0
+    checkouts = 0
+
+    def __init__(self, conf, server_params=None):
+        pass
+
+    def reset(self):
+        # NOTE: called each time a pooled connection is handed back.
+        InMemoryConnection.checkouts += 1
+
+    def close(self):
+        pass
+
+    def declare_direct_consumer(self, topic, callback):
+        self.consumers[topic] = callback
+
+    def consume_in_thread(self):
+        pass
+
+    def _deliver(self, queue, msg):
+        InMemoryConnection.publishes += 1
+        eventlet.spawn_n(self.consumers[queue],
+                         rpc_common.deserialize_msg(msg))
+
+    def topic_send(self, topic, msg, timeout=None):
+        self._deliver(topic, msg)
+
+    def direct_send(self, msg_id, msg):
+        self._deliver(msg_id, msg)
+
+
+class Endpoint(object):
+    RPC_API_VERSION = '1.0'
+
+    def echo(self, context, value):
+        return value
+
+
+def run(calls, reply_version):
+    amqp._REPLY_VERSION = reply_version
+    conf = cfg.CONF
+    pool = amqp.get_connection_pool(conf, InMemoryConnection)
+    InMemoryConnection.consumers[TOPIC] = amqp.ProxyCallback(
+        conf, dispatcher.RpcDispatcher([Endpoint()]), pool)
+    InMemoryConnection.publishes = 0
+    InMemoryConnection.checkouts = 0
+    ctxt = rpc_common.CommonRpcContext(user='bench', project='bench')
+
+    start = time.time()
+    for i in xrange(calls):
+        msg = {'method': 'echo', 'args': {'value': i}, 'version': '1.0'}
+        result = amqp.call(conf, ctxt, TOPIC, msg, None, pool)
+        assert result == i
+    elapsed = time.time() - start
+    print('reply format %s: %.2f publishes/call %.2f checkouts/call '
+          '%.1f us/call' %
+          (reply_version, InMemoryConnection.publishes / float(calls),
+           InMemoryConnection.checkouts / float(calls),
+           elapsed * 1e6 / calls))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--calls', type='int', default=2000)
+    options, args = parser.parse_args()
+    cfg.CONF([], project='nova')
+    for reply_version in ('2.0', '2.1'):
+        run(options.calls, reply_version)
+
+
+if __name__ == '__main__':
+    main()
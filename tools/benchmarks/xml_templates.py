@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time xmlutil template serialization against the previous path.
+
+The previous path is Template._serialize(), which works out the children
+and patches of every rendered element while it renders; serialize() now
+runs a render plan compiled once per template, and serialize_iter()
+streams the collection in batches.  Each template is rendered every way
+and the XML documents must be byte for byte the same.
+
+    python tools/benchmarks/xml_templates.py --items 2000 --rounds 20
+"""
+
+import datetime
+import optparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from lxml import etree
+
+from nova.api.openstack import common
+from nova.api.openstack.compute.plugins.v3 import services
+from nova.api.openstack import xmlutil
+
+
+class ServiceStatusTemplate(xmlutil.TemplateBuilder):
+    """A slave adding an attribute and a child to every service."""
+
+    def construct(self):
+        root = xmlutil.TemplateElement('services')
+        elem = xmlutil.SubTemplateElement(root, 'service',
+                                          selector='services')
+        elem.set('state')
+        status = xmlutil.SubTemplateElement(elem, 'status')
+        status.text = 'status'
+        return xmlutil.SlaveTemplate(root, 1)
+
+
+def make_services(count):
+    now = str(datetime.datetime.utcnow())
+    return {'services': [{'id': i, 'binary': 'nova-android',
+                          'topic': 'android', 'host': 'agent-%d' % i,
+                          'disabled': i % 7 == 0, 'updated_at': now,
+                          'disabled_reason': None,
+                          'state': 'up', 'status': 'enabled'}
+                         for i in xrange(count)]}
+
+
+def make_metadata(count):
+    return {'metadata': dict(('key-%d' % i, 'value-%d' % i)
+                             for i in xrange(count))}
+
+
+def legacy_serialize(tmpl, obj):
+    elem = tmpl._serialize(None, obj, tmpl._siblings(), tmpl._nsmap())
+    return etree.tostring(elem, **tmpl.serialize_options)
+
+
+def timed(name, rounds, func, *args):
+    start = time.time()
+    for i in xrange(rounds):
+        result = func(*args)
+    elapsed = time.time() - start
+    print('%-24s %10.1f us/round' % (name, elapsed * 1e6 / rounds))
+    return result
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--items', type='int', default=2000)
+    parser.add_option('--rounds', type='int', default=20)
+    options, args = parser.parse_args()
+
+    services_detail = services.ServicesDetailTemplate()
+    services_status = services.ServicesDetailTemplate()
+    services_status.attach(ServiceStatusTemplate())
+
+    cases = (('services', services_detail, make_services(options.items)),
+             ('services+slave', services_status,
+              make_services(options.items)),
+             ('metadata', common.MetadataTemplate(),
+              make_metadata(options.items)))
+
+    for name, tmpl, obj in cases:
+        print('%s, %d items' % (name, options.items))
+        legacy = timed('legacy', options.rounds, legacy_serialize, tmpl, obj)
+        compiled = timed('compiled', options.rounds, tmpl.serialize, obj)
+        assert legacy == compiled, 'output differs for %s' % name
+
+        key = obj.keys()[0]
+        streamed = timed('streamed', options.rounds,
+                         lambda: ''.join(tmpl.serialize_iter(obj, key)))
+        assert legacy == streamed, 'streamed output differs for %s' % name
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Throughput of impl_zmq casts and call replies over ipc:// sockets.
+
+Casts go to a PULL socket, once through a new ZmqClient per message as
+_cast() used to, and once through the ZmqClientPool.  For calls, an echo
+greenthread publishes a reply for every request on the reply PUB socket,
+and the caller waits for it on a SUB socket of its own per call, as
+_call() used to (replies that beat the new subscription are counted as
+lost), or through the ZmqReplyWaiter.
+
+    python tools/benchmarks/zmq_sockets.py --messages 10000
+"""
+
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+import eventlet
+from oslo.config import cfg
+
+from nova.openstack.common.rpc import impl_zmq
+
+zmq = impl_zmq.zmq
+
+
+def receiver(sock, count, done):
+    for i in xrange(count):
+        sock.recv()
+    done.send()
+
+
+def echo(in_sock, out_sock):
+    while True:
+        msg_id, topic, style, payload = in_sock.recv()
+        out_sock.send([msg_id, topic, style, payload])
+
+
+def timed(name, count, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print('%-16s %8d messages %10.0f messages/s' %
+          (name, count, count / elapsed))
+
+
+def bench_casts(addr, messages, payload):
+    sink = impl_zmq.ZmqSocket(addr, zmq.PULL, bind=True)
+
+    def run(cast):
+        done = eventlet.event.Event()
+        eventlet.spawn_n(receiver, sink, messages, done)
+        for i in xrange(messages):
+            cast()
+        done.wait()
+
+    def legacy():
+        client = impl_zmq.ZmqClient(addr)
+        try:
+            client.cast(None, 'android', payload, False)
+        finally:
+            client.close()
+
+    pool = impl_zmq.ZmqClientPool()
+
+    def pooled():
+        pool.get(addr).cast(None, 'android', payload, False)
+
+    timed('cast, legacy', messages, lambda: run(legacy))
+    timed('cast, pooled', messages, lambda: run(pooled))
+    pool.close()
+    sink.close()
+
+
+def bench_calls(addr, reply_addr, calls, payload):
+    requests = impl_zmq.ZmqSocket(addr, zmq.PULL, bind=True)
+    replies = impl_zmq.ZmqSocket(reply_addr, zmq.PUB, bind=True)
+    echo_thread = eventlet.spawn(echo, requests, replies)
+    pool = impl_zmq.ZmqClientPool()
+    waiter = impl_zmq.ZmqReplyWaiter()
+    # NOTE: give the SUB socket time to connect to the PUB one
+    eventlet.sleep(.5)
+
+    lost = [0]
+
+    def legacy():
+        for i in xrange(calls):
+            msg_id = uuid.uuid4().hex
+            sub = impl_zmq.ZmqSocket(reply_addr, zmq.SUB, bind=False,
+                                     subscribe=msg_id)
+            try:
+                pool.get(addr).cast(msg_id, 'android', payload, False)
+                # NOTE: a reply sent before the new socket's subscription
+                # reached the PUB socket is lost.
+                with eventlet.Timeout(.1, False):
+                    sub.recv()
+                    continue
+                lost[0] += 1
+            finally:
+                sub.close()
+
+    def shared():
+        for i in xrange(calls):
+            msg_id = uuid.uuid4().hex
+            queue = waiter.register(msg_id)
+            try:
+                pool.get(addr).cast(msg_id, 'android', payload, False)
+                queue.get()
+            finally:
+                waiter.unregister(msg_id)
+
+    timed('call, legacy', calls, legacy)
+    print('%-16s %8d replies lost' % ('call, legacy', lost[0]))
+    timed('call, shared', calls, shared)
+    echo_thread.kill()
+    waiter.close()
+    pool.close()
+    requests.close()
+    replies.close()
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--messages', type='int', default=10000)
+    parser.add_option('--calls', type='int', default=2000)
+    options, args = parser.parse_args()
+
+    ipc_dir = tempfile.mkdtemp()
+    cfg.CONF([], project='nova')
+    cfg.CONF.set_override('rpc_zmq_ipc_dir', ipc_dir)
+    cfg.CONF.set_override('rpc_zmq_host', 'bench')
+    payload = [{'user_id': 'user', 'project_id': 'project'},
+               {'method': 'active_android',
+                'args': {'instance': {'uuid': str(uuid.uuid4()),
+                                      'host': 'bench'}}}]
+    try:
+        bench_casts('ipc://%s/zmq_topic_android.bench' % ipc_dir,
+                    options.messages, payload)
+        bench_calls('ipc://%s/zmq_topic_android.calls' % ipc_dir,
+                    'ipc://%s/zmq_topic_zmq_replies.bench' % ipc_dir,
+                    options.calls, payload)
+    finally:
+        impl_zmq.cleanup()
+        shutil.rmtree(ipc_dir)
+
+
+if __name__ == '__main__':
+    main()